@@ -0,0 +1,342 @@
+"""In-process load and latency benchmark for the GoGarvis API.
+
+Drives the FastAPI app through httpx's ASGI transport (no network, no
+uvicorn) against a local MongoDB or mongomock-motor, with a stub LLM, using
+weighted request mixes. Reports throughput and p50/p95/p99 latency per route
+and can save results as JSON baselines to compare between commits.
+
+    python benchmark.py --mix mixed --requests 2000 --concurrency 16
+    python benchmark.py --mongomock --save before-change
+    python benchmark.py --mongomock --compare benchmarks/before-change.json
+
+Use a dedicated database: the benchmark seeds it and writes to it.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).parent
+BASELINE_DIR = BACKEND_DIR / "benchmarks"
+
+# ============== Request Mixes ==============
+# Each operation issues one request; BenchState records its latency under a route label.
+
+async def op_list_documents(client, state):
+    await state.get(client, "GET /documents", "/api/documents")
+
+async def op_list_glossary(client, state):
+    await state.get(client, "GET /glossary", "/api/glossary")
+
+async def op_list_pigpen(client, state):
+    await state.get(client, "GET /pigpen", "/api/pigpen")
+
+async def op_list_components(client, state):
+    await state.get(client, "GET /architecture/components", "/api/architecture/components")
+
+async def op_list_brands(client, state):
+    await state.get(client, "GET /brands", "/api/brands")
+
+async def op_dashboard(client, state):
+    await state.get(client, "GET /dashboard/stats", "/api/dashboard/stats")
+
+async def op_get_document(client, state):
+    doc_id = state.rng.choice(state.doc_ids)
+    await state.get(client, "GET /documents/{doc_id}", f"/api/documents/{doc_id}")
+
+async def op_update_term(client, state):
+    term_id = state.rng.choice(state.term_ids)
+    await state.send(client, "PUT /glossary/{term_id}", "PUT", f"/api/glossary/{term_id}",
+                     json={"definition": f"Benchmark definition {uuid.uuid4().hex[:8]}"})
+
+async def op_create_term(client, state):
+    await state.send(client, "POST /glossary", "POST", "/api/glossary",
+                     json={"term": f"BENCH-{uuid.uuid4().hex[:10]}", "definition": "Benchmark term", "category": "Benchmark"})
+
+async def op_audit_log(client, state):
+    await state.get(client, "GET /audit-log", "/api/audit-log?limit=100")
+
+async def op_versions(client, state):
+    term_id = state.rng.choice(state.term_ids)
+    await state.get(client, "GET /versions/{content_type}/{content_id}", f"/api/versions/glossary/{term_id}")
+
+async def op_upload(client, state):
+    body = f"Benchmark upload {uuid.uuid4().hex}\n".encode() * 64
+    await state.send(client, "POST /chat/upload", "POST", "/api/chat/upload",
+                     files={"files": ("bench.txt", body, "text/plain")})
+
+async def op_chat(client, state):
+    session_id = state.rng.choice(state.chat_sessions)
+    await state.send(client, "POST /chat", "POST", "/api/chat",
+                     json={"message": "How does MOSE route operators?", "session_id": session_id})
+
+CATALOG_READS = [
+    (20, op_list_documents), (15, op_list_glossary), (15, op_list_pigpen),
+    (5, op_list_components), (5, op_list_brands), (10, op_dashboard), (10, op_get_document),
+]
+EDITOR_WRITES = [(8, op_update_term), (2, op_create_term)]
+AUDIT_QUERIES = [(6, op_audit_log), (4, op_versions)]
+
+MIXES = {
+    "read-heavy": CATALOG_READS + [(w // 2, op) for w, op in AUDIT_QUERIES],
+    "editor": CATALOG_READS[:3] + [(w * 4, op) for w, op in EDITOR_WRITES] + AUDIT_QUERIES,
+    "mixed": CATALOG_READS + EDITOR_WRITES + AUDIT_QUERIES + [(3, op_upload), (3, op_chat)],
+    "chat": [(5, op_upload), (15, op_chat), (5, op_list_documents)],
+}
+
+# ============== Harness ==============
+
+class StubLlmChat:
+    """Stands in for emergentintegrations' LlmChat with a fixed latency"""
+
+    latency = 0.0
+
+    def __init__(self, api_key, session_id, system_message):
+        self.session_id = session_id
+
+    def with_model(self, provider, model):
+        return self
+
+    async def send_message(self, message):
+        await asyncio.sleep(self.latency)
+        return "GARVIS benchmark response."
+
+
+class BenchState:
+    def __init__(self, rng, auth_headers):
+        self.rng = rng
+        self.auth_headers = auth_headers
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.doc_ids = []
+        self.term_ids = []
+        self.chat_sessions = [str(uuid.uuid4()) for _ in range(8)]
+
+    async def send(self, client, label, method, url, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, headers=self.auth_headers, **kwargs)
+            failed = response.status_code >= 400
+        except Exception:
+            failed = True
+        self.latencies[label].append(time.perf_counter() - started)
+        if failed:
+            self.errors[label] += 1
+
+    async def get(self, client, label, url):
+        await self.send(client, label, "GET", url)
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(pct / 100 * len(sorted_values))
+    return sorted_values[max(0, min(len(sorted_values), rank) - 1)]
+
+
+def summarize(latencies, errors, elapsed):
+    routes = {}
+    for label, values in sorted(latencies.items()):
+        values = sorted(values)
+        routes[label] = {
+            "count": len(values),
+            "errors": errors.get(label, 0),
+            "throughput_rps": round(len(values) / elapsed, 2),
+            "p50_ms": round(percentile(values, 50) * 1000, 3),
+            "p95_ms": round(percentile(values, 95) * 1000, 3),
+            "p99_ms": round(percentile(values, 99) * 1000, 3),
+        }
+    all_values = sorted(v for values in latencies.values() for v in values)
+    overall = {
+        "count": len(all_values),
+        "errors": sum(errors.values()),
+        "throughput_rps": round(len(all_values) / elapsed, 2),
+        "p50_ms": round(percentile(all_values, 50) * 1000, 3),
+        "p95_ms": round(percentile(all_values, 95) * 1000, 3),
+        "p99_ms": round(percentile(all_values, 99) * 1000, 3),
+    }
+    return routes, overall
+
+
+def load_server(use_mongomock: bool, llm_latency_ms: float):
+    """Import server.py with benchmark-safe settings and a stub LLM"""
+    workdir = Path(tempfile.mkdtemp(prefix="gogarvis-bench-"))
+    os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    os.environ.setdefault("DB_NAME", "gogarvis_bench")
+    os.environ.setdefault("EMERGENT_LLM_KEY", "benchmark")
+    os.environ.setdefault("UPLOAD_DIR", str(workdir / "uploads"))
+    os.environ.setdefault("SPEC_INDEX_PATH", str(workdir / "spec_index.sqlite3"))
+    # Measure the API, not the per-user budgets of a single benchmark user
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+    sys.path.insert(0, str(BACKEND_DIR))
+
+    import server
+
+    if use_mongomock:
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            raise SystemExit("--mongomock requires mongomock-motor (pip install mongomock-motor)")
+        server.client = AsyncMongoMockClient()
+        server.db = server.client[os.environ["DB_NAME"]]
+        server.document_content = server.DocumentContentStore(server.db, server.DOCUMENT_CONTENT_INLINE_MAX_BYTES)
+
+    StubLlmChat.latency = llm_latency_ms / 1000
+    server.LlmChat = StubLlmChat
+    return server
+
+
+async def prepare(server, rng):
+    """Seed catalog data and create an editor session for write routes"""
+    from seed import SEED_SETS, sync_collection
+
+    db = server.db
+    now = datetime.now(timezone.utc).isoformat()
+    await asyncio.gather(*(
+        sync_collection(db, collection, key, id_field, rows, defaults, now)
+        for collection, key, id_field, rows, defaults in SEED_SETS
+    ))
+    await server.prepare_database()
+
+    user_id = f"user_bench_{uuid.uuid4().hex[:8]}"
+    token = f"session_bench_{uuid.uuid4().hex}"
+    await db.users.insert_one({
+        "user_id": user_id, "email": f"{user_id}@bench.local", "name": "Benchmark Editor",
+        "role": "editor", "created_at": now,
+    })
+    await db.user_sessions.insert_one({
+        "user_id": user_id, "session_token": token,
+        "expires_at": (datetime.now(timezone.utc) + timedelta(days=1)).isoformat(), "created_at": now,
+    })
+
+    state = BenchState(rng, {"Authorization": f"Bearer {token}"})
+    state.doc_ids = [d["doc_id"] async for d in db.documents.find({"is_active": True}, {"_id": 0, "doc_id": 1})]
+    state.term_ids = [t["term_id"] async for t in db.glossary_terms.find({"is_active": True}, {"_id": 0, "term_id": 1})]
+    return state
+
+
+async def run_benchmark(server, mix, total_requests, concurrency, warmup, seed):
+    from httpx import ASGITransport, AsyncClient
+
+    rng = random.Random(seed)
+    state = await prepare(server, rng)
+    weights, ops = zip(*MIXES[mix])
+
+    async with AsyncClient(transport=ASGITransport(app=server.app), base_url="http://bench") as client:
+        for op in rng.choices(ops, weights, k=warmup):
+            await op(client, state)
+        state.latencies.clear()
+        state.errors.clear()
+
+        schedule = rng.choices(ops, weights, k=total_requests)
+        position = 0
+
+        async def worker():
+            nonlocal position
+            while position < len(schedule):
+                op = schedule[position]
+                position += 1
+                await op(client, state)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return summarize(state.latencies, state.errors, elapsed), elapsed
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, text=True).strip()
+    except Exception:
+        return None
+
+
+def print_report(routes, overall, elapsed):
+    print(f"\n{'route':<44}{'count':>7}{'err':>6}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for label, r in list(routes.items()) + [("TOTAL", overall)]:
+        print(f"{label:<44}{r['count']:>7}{r['errors']:>6}{r['throughput_rps']:>10.1f}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}")
+    print(f"\nElapsed {elapsed:.2f}s")
+
+
+def compare(result, baseline, threshold_pct):
+    """Print per-route deltas against a baseline; return routes whose p95 regressed"""
+    regressions = []
+    print(f"\nCompared with {baseline.get('commit') or 'baseline'} ({baseline.get('created_at')})")
+    print(f"{'route':<44}{'p50 Δ%':>10}{'p95 Δ%':>10}{'rps Δ%':>10}")
+    for label, current in list(result["routes"].items()) + [("TOTAL", result["overall"])]:
+        previous = baseline["overall"] if label == "TOTAL" else baseline["routes"].get(label)
+        if not previous:
+            print(f"{label:<44}{'new':>10}")
+            continue
+
+        def delta(key):
+            return (current[key] - previous[key]) / previous[key] * 100 if previous[key] else 0.0
+
+        print(f"{label:<44}{delta('p50_ms'):>+10.1f}{delta('p95_ms'):>+10.1f}{delta('throughput_rps'):>+10.1f}")
+        if delta("p95_ms") > threshold_pct:
+            regressions.append(label)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="In-process GoGarvis API benchmark")
+    parser.add_argument("--mix", choices=sorted(MIXES), default="mixed")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--llm-latency-ms", type=float, default=50.0, help="latency of the stub LLM")
+    parser.add_argument("--mongomock", action="store_true", help="use mongomock-motor instead of MONGO_URL")
+    parser.add_argument("--save", metavar="NAME", help="save results to benchmarks/NAME.json")
+    parser.add_argument("--compare", metavar="FILE", help="baseline JSON to compare against")
+    parser.add_argument("--fail-threshold", type=float, default=None,
+                        help="exit 1 if any route's p95 regressed by more than this percentage")
+    args = parser.parse_args(argv)
+
+    server = load_server(args.mongomock, args.llm_latency_ms)
+    (routes, overall), elapsed = asyncio.run(
+        run_benchmark(server, args.mix, args.requests, args.concurrency, args.warmup, args.seed)
+    )
+    print_report(routes, overall, elapsed)
+
+    result = {
+        "commit": git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "backend": "mongomock" if args.mongomock else "mongodb",
+        "config": {k: getattr(args, k) for k in ("mix", "requests", "concurrency", "warmup", "seed", "llm_latency_ms")},
+        "elapsed_s": round(elapsed, 3),
+        "routes": routes,
+        "overall": overall,
+    }
+
+    if args.save:
+        BASELINE_DIR.mkdir(exist_ok=True)
+        path = BASELINE_DIR / f"{args.save}.json"
+        path.write_text(json.dumps(result, indent=2) + "\n")
+        print(f"Saved {path}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        regressions = compare(result, baseline, args.fail_threshold if args.fail_threshold is not None else float("inf"))
+        if regressions:
+            print(f"\np95 regressions over {args.fail_threshold}%: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,246 @@
+"""Live content change feed fanned out from one MongoDB change stream.
+
+ChangeFeedHub watches the catalog collections with a single database-level
+change stream (one cursor per worker, totally ordered across collections)
+and fans each change out to SSE subscribers, each with its own bounded queue
+and content-type filter.
+
+Event ids are the change stream's resume tokens. The most recent events are
+kept in a ring buffer so a reconnecting client (EventSource sends
+Last-Event-ID) is replayed from memory; when its id is older than the buffer,
+or was issued by another worker, the client is caught up from MongoDB with a
+short-lived stream resumed from that token.
+
+A subscriber whose queue overflows, or whose resume point is gone, receives a
+"reset" event and should refetch what it displays.
+
+Listeners run for every change. Each worker uses them to invalidate its
+response cache for writes made by the other workers.
+
+Change streams need a replica set or mongos.
+"""
+import asyncio
+import json
+import logging
+from collections import deque
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, List, Optional
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+OPERATIONS = ["insert", "update", "replace", "delete"]
+RETRY_MIN_SECONDS = 1.0
+RETRY_MAX_SECONDS = 30.0
+# Resuming from this token is impossible (history rolled off the oplog, etc.)
+UNRESUMABLE_CODES = {280, 286}  # ChangeStreamFatalError, ChangeStreamHistoryLost
+
+
+def format_event(event: dict) -> str:
+    return f"id: {event['id']}\nevent: change\ndata: {json.dumps(event)}\n\n"
+
+
+class Subscriber:
+    def __init__(self, content_types: Optional[set], queue_size: int):
+        self.content_types = content_types
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        # Set when the client has missed events and must be sent a reset
+        self.reset_reason: Optional[str] = None
+
+    def wants(self, event: dict) -> bool:
+        return self.content_types is None or event["content_type"] in self.content_types
+
+    def offer(self, event: dict):
+        if self.reset_reason or not self.wants(event):
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Never block the hub on a slow client; it gets a reset instead
+            self.reset_reason = "overflow"
+
+    def reset(self, reason: str):
+        self.reset_reason = reason
+        try:
+            self.queue.put_nowait(None)  # wake an idle consumer
+        except asyncio.QueueFull:
+            pass
+
+
+class ChangeFeedHub:
+    def __init__(self, db, content_types: Dict[str, dict], buffer_size: int = 1000, queue_size: int = 100,
+                 on_reset: Optional[Callable[[str], None]] = None):
+        self.db = db
+        # collection -> (content_type, id_field), from the server's CONTENT_TYPES registry
+        self.by_collection = {spec["collection"]: (content_type, spec["id_field"]) for content_type, spec in content_types.items()}
+        self.buffer: deque = deque(maxlen=buffer_size)
+        self.queue_size = queue_size
+        self.subscribers = set()
+        # Called with the collections a change (or a lost resume point) affects
+        self.listeners: List[Callable[[Iterable[str]], None]] = []
+        # Called with the reason whenever a subscriber is sent a reset
+        self.on_reset = on_reset
+        self.resume_token = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def pipeline(self) -> list:
+        id_fields = sorted({id_field for _, id_field in self.by_collection.values()})
+        projection = {
+            "ns.coll": 1,
+            "operationType": 1,
+            "clusterTime": 1,
+            "fullDocument.is_active": 1,
+            # Names of the updated fields, without their (possibly large) values
+            "fields": {"$map": {"input": {"$objectToArray": {"$ifNull": ["$updateDescription.updatedFields", {}]}}, "in": "$$this.k"}},
+        }
+        projection.update({f"fullDocument.{id_field}": 1 for id_field in id_fields})
+        return [
+            {"$match": {"ns.coll": {"$in": list(self.by_collection)}, "operationType": {"$in": OPERATIONS}}},
+            {"$project": projection},
+        ]
+
+    def watch(self, resume_after=None, **kwargs):
+        return self.db.watch(self.pipeline(), full_document="updateLookup", resume_after=resume_after, **kwargs)
+
+    def to_event(self, change: dict) -> dict:
+        collection = change["ns"]["coll"]
+        content_type, id_field = self.by_collection[collection]
+        document = change.get("fullDocument") or {}
+        cluster_time = change.get("clusterTime")
+        return {
+            "id": change["_id"]["_data"],
+            "content_type": content_type,
+            "collection": collection,
+            # Hard deletes (dataset purges) only carry the Mongo _id
+            "content_id": document.get(id_field),
+            "operation": change["operationType"],
+            "fields": change.get("fields", []),
+            "is_active": document.get("is_active"),
+            "timestamp": datetime.fromtimestamp(cluster_time.time, timezone.utc).isoformat() if cluster_time else None,
+        }
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        delay = RETRY_MIN_SECONDS
+        while True:
+            try:
+                async with self.watch(self.resume_token) as stream:
+                    delay = RETRY_MIN_SECONDS
+                    async for change in stream:
+                        self.resume_token = stream.resume_token
+                        self.publish(self.to_event(change))
+            except asyncio.CancelledError:
+                raise
+            except PyMongoError as e:
+                if isinstance(e, OperationFailure) and e.code in UNRESUMABLE_CODES:
+                    # Changes were missed: start from now and tell everyone to refetch
+                    self.resume_token = None
+                    self.reset_all("resume_lost")
+                logger.error(f"Change feed interrupted, retrying in {delay:.0f}s: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RETRY_MAX_SECONDS)
+
+    def notify(self, collections: Iterable[str]):
+        for listener in self.listeners:
+            try:
+                listener(collections)
+            except Exception as e:
+                logger.error(f"Change feed listener failed: {e}")
+
+    def publish(self, event: dict):
+        self.buffer.append(event)
+        self.notify([event["collection"]])
+        for subscriber in self.subscribers:
+            subscriber.offer(event)
+
+    def reset_all(self, reason: str):
+        self.buffer.clear()
+        self.notify(list(self.by_collection))
+        for subscriber in self.subscribers:
+            subscriber.reset(reason)
+
+    def replay_after(self, event_id: str) -> Optional[List[dict]]:
+        """Buffered events after event_id, or None if it is not in the buffer"""
+        events = list(self.buffer)
+        for index, event in enumerate(events):
+            if event["id"] == event_id:
+                return events[index + 1:]
+        return None
+
+    async def catch_up(self, event_id: str) -> Optional[List[dict]]:
+        """Read the changes after event_id straight from MongoDB; None when the
+        token cannot be resumed or the client is further behind than the buffer"""
+        events = []
+        try:
+            async with self.watch({"_data": event_id}, max_await_time_ms=100) as stream:
+                while len(events) <= self.buffer.maxlen:
+                    change = await stream.try_next()
+                    if change is None:
+                        return events
+                    events.append(self.to_event(change))
+        except PyMongoError as e:
+            logger.info(f"Change feed client could not resume: {e}")
+        return None
+
+    def _reset_message(self, reason: str) -> str:
+        if self.on_reset:
+            self.on_reset(reason)
+        # Point the client's Last-Event-ID at the present so its next reconnect resumes from here
+        latest = f"id: {self.buffer[-1]['id']}\n" if self.buffer else ""
+        return f"{latest}event: reset\ndata: {json.dumps({'reason': reason})}\n\n"
+
+    async def stream(self, content_types: Optional[set], last_event_id: Optional[str], keepalive_seconds: float):
+        """SSE messages for one client: its backlog since last_event_id, then live changes"""
+        subscriber = Subscriber(content_types, self.queue_size)
+        # Subscribe before reading the backlog so nothing falls in between
+        self.subscribers.add(subscriber)
+        try:
+            yield ": connected\n\n"
+            already_sent = set()
+            if last_event_id:
+                backlog = self.replay_after(last_event_id)
+                if backlog is None:
+                    backlog = await self.catch_up(last_event_id)
+                if backlog is None:
+                    yield self._reset_message("resume_lost")
+                else:
+                    # Events published since subscribing are in both the backlog and the queue
+                    already_sent = {event["id"] for event in backlog}
+                    for event in backlog:
+                        if subscriber.wants(event):
+                            yield format_event(event)
+            while True:
+                if subscriber.reset_reason:
+                    while not subscriber.queue.empty():
+                        subscriber.queue.get_nowait()
+                    reason, subscriber.reset_reason = subscriber.reset_reason, None
+                    yield self._reset_message(reason)
+                    continue
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), keepalive_seconds)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if event is None:
+                    continue
+                if event["id"] in already_sent:
+                    already_sent.discard(event["id"])
+                    continue
+                yield format_event(event)
+        finally:
+            self.subscribers.discard(subscriber)
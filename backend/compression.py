@@ -0,0 +1,135 @@
+"""Response compression negotiated from Accept-Encoding.
+
+CompressionMiddleware compresses complete (single-message) text and JSON
+responses above a size threshold with brotli when the client accepts it and
+the brotli package is installed, otherwise gzip. Streams (SSE), file
+downloads (anything advertising Accept-Ranges, whose ranges refer to the raw
+bytes), partial content and responses that already carry a
+Content-Encoding pass through untouched, so cached bodies that were
+compressed ahead of time (see response_cache.py) are not compressed twice.
+Every compressible response carries Vary: Accept-Encoding, whether or not
+this particular one was compressed.
+"""
+import asyncio
+import gzip
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+# Bodies larger than this are compressed on a worker thread, off the event loop
+THREAD_THRESHOLD = 64 * 1024
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "application/xml", "image/svg+xml")
+NEVER_COMPRESS_TYPES = ("text/event-stream",)
+
+
+def accepted_encodings(accept_encoding: str) -> dict:
+    """Map each encoding in an Accept-Encoding header to its q-value"""
+    encodings = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        encodings[name.strip().lower()] = q
+    return encodings
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick "br" or "gzip" for a request, or None to send identity"""
+    if not accept_encoding:
+        return None
+    encodings = accepted_encodings(accept_encoding)
+    wildcard = encodings.get("*", 0.0)
+    candidates = (["br"] if brotli is not None else []) + ["gzip"]
+    scored = [(encodings.get(name, wildcard), -rank, name) for rank, name in enumerate(candidates)]
+    q, _, name = max(scored)
+    return name if q > 0 else None
+
+
+def compress(body: bytes, encoding: str, level: str = "fast") -> bytes:
+    """Compress with a fast setting per request, or the best one for cached bodies"""
+    if encoding == "br":
+        return brotli.compress(body, quality=4 if level == "fast" else 8)
+    return gzip.compress(body, compresslevel=6 if level == "fast" else 9)
+
+
+async def compress_async(body: bytes, encoding: str, level: str = "fast") -> bytes:
+    if len(body) < THREAD_THRESHOLD:
+        return compress(body, encoding, level)
+    return await asyncio.to_thread(compress, body, encoding, level)
+
+
+def is_compressible(content_type: str) -> bool:
+    content_type = content_type.lower()
+    return content_type.startswith(COMPRESSIBLE_TYPES) and not content_type.startswith(NEVER_COMPRESS_TYPES)
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = 1024):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding"))
+        start_message = None
+
+        async def send_wrapper(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                # Hold the headers until we know whether the body gets compressed
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or start_message is None:
+                await send(message)
+                return
+
+            held, start_message = start_message, None
+            headers = MutableHeaders(raw=held["headers"])
+            body = message.get("body", b"")
+            compressible = (
+                is_compressible(headers.get("content-type", ""))
+                and "content-encoding" not in headers
+                and "accept-ranges" not in headers
+            )
+            # Caches must key every variant of a negotiable response on
+            # Accept-Encoding, including identity ones and bodiless 304s
+            if compressible or (held["status"] == 304 and "accept-ranges" not in headers):
+                headers.add_vary_header("Accept-Encoding")
+            if (
+                encoding is None
+                or not compressible
+                or message.get("more_body", False)
+                or held["status"] in (204, 206, 304)
+                or len(body) < self.minimum_size
+            ):
+                await send(held)
+                await send(message)
+                return
+
+            compressed = await compress_async(body, encoding)
+            headers["content-encoding"] = encoding
+            headers["content-length"] = str(len(compressed))
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                # The compressed bytes differ from the representation the strong ETag names
+                headers["etag"] = f"W/{etag}"
+            await send(held)
+            await send({"type": "http.response.body", "body": compressed, "more_body": False})
+
+        await self.app(scope, receive, send_wrapper)
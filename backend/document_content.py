@@ -0,0 +1,126 @@
+"""Document content storage: inline when small, chunked by hash when large.
+
+Content up to inline_max_bytes stays in the document row. Larger content is
+split into fixed-size chunks in the document_content collection, keyed by
+the SHA-256 of its UTF-8 bytes, and the row keeps only content_hash and
+content_size. List queries and the working set then stay small, and only
+get_document, the content endpoint (which reads just the chunks a Range
+covers), export and the spec index load the text.
+
+Version snapshots copy the row, so they reference the hash instead of
+duplicating the text, and identical content is stored once. Chunks are
+never deleted: old versions may still point at them.
+"""
+import hashlib
+from datetime import datetime, timezone
+from typing import Optional
+
+from pymongo import UpdateOne
+
+COLLECTION = "document_content"
+CHUNK_SIZE = 255 * 1024
+OFFLOAD_MIGRATION = "offload_inline_content"
+
+
+def update_operators(fields: dict, unset: dict) -> dict:
+    """An update document for $set fields plus an optional (non-empty) $unset"""
+    return {"$set": fields, "$unset": unset} if unset else {"$set": fields}
+
+
+class DocumentContentStore:
+    def __init__(self, db, inline_max_bytes: int, chunk_size: int = CHUNK_SIZE):
+        self.db = db
+        self.chunks = db[COLLECTION]
+        # 0 keeps all content inline
+        self.inline_max_bytes = inline_max_bytes
+        self.chunk_size = chunk_size
+
+    def offloads(self, data: bytes) -> bool:
+        return self.inline_max_bytes > 0 and len(data) > self.inline_max_bytes
+
+    async def put(self, data: bytes, sha256: str, session=None):
+        """Store content chunks unless they are already there; safe to race"""
+        count = -(-len(data) // self.chunk_size)
+        if await self.chunks.count_documents({"sha256": sha256}, session=session) == count:
+            return
+        await self.chunks.bulk_write(
+            [
+                UpdateOne({"sha256": sha256, "n": n}, {"$setOnInsert": {"data": data[n * self.chunk_size:(n + 1) * self.chunk_size]}}, upsert=True)
+                for n in range(count)
+            ],
+            ordered=False,
+            session=session,
+        )
+
+    async def prepare(self, fields: dict, write: bool = True, pending: Optional[dict] = None) -> dict:
+        """Rewrite row fields in place so large content is referenced by hash,
+        storing it first unless write is False (dry runs). With pending, the
+        content is collected there ({sha256: data}) for the caller to put()
+        once the row is sure to be written.
+
+        Returns the $unset that drops the representation being replaced.
+        """
+        if "content" not in fields:
+            # Already a reference, e.g. a version snapshot being restored
+            return {"content": ""} if "content_hash" in fields else {}
+        data = fields["content"].encode()
+        if not self.offloads(data):
+            return {"content_hash": "", "content_size": ""}
+        sha256 = hashlib.sha256(data).hexdigest()
+        if pending is not None:
+            pending[sha256] = data
+        elif write:
+            await self.put(data, sha256)
+        del fields["content"]
+        fields.update(content_hash=sha256, content_size=len(data))
+        return {"content": ""}
+
+    async def read(self, sha256: str, start: int, end: int) -> bytes:
+        """Bytes [start, end] of stored content, fetching only the chunks they span"""
+        if end < start:
+            return b""
+        first, last = start // self.chunk_size, end // self.chunk_size
+        cursor = self.chunks.find({"sha256": sha256, "n": {"$gte": first, "$lte": last}}, {"_id": 0, "data": 1}).sort("n", 1)
+        chunks = [chunk["data"] async for chunk in cursor]
+        if len(chunks) != last - first + 1:
+            raise FileNotFoundError(f"Document content {sha256} is incomplete")
+        offset = start - first * self.chunk_size
+        return b"".join(chunks)[offset:offset + end - start + 1]
+
+    async def inline(self, row: dict) -> dict:
+        """Put a row's content back in place of its reference (in place)"""
+        sha256: Optional[str] = row.pop("content_hash", None)
+        size = row.pop("content_size", 0)
+        if sha256 and "content" not in row:
+            row["content"] = (await self.read(sha256, 0, size - 1)).decode()
+        return row
+
+    async def offload_inline_content(self) -> int:
+        """Move existing inline content over the threshold out of its rows.
+
+        Scans every document with inline content, so a marker in the migrations
+        collection records the threshold it last ran with; later boots skip the
+        scan unless the threshold has been lowered since.
+        """
+        if not self.inline_max_bytes:
+            # Writes keep everything inline from now on, so a later threshold must rescan
+            await self.db.migrations.delete_one({"_id": OFFLOAD_MIGRATION})
+            return 0
+        done = await self.db.migrations.find_one({"_id": OFFLOAD_MIGRATION})
+        if done and done["inline_max_bytes"] <= self.inline_max_bytes:
+            return 0
+        moved = 0
+        async for row in self.db.documents.find({"content": {"$type": "string"}}, {"_id": 1, "content": 1}):
+            if not self.offloads(row["content"].encode()):
+                continue
+            fields = {"content": row["content"]}
+            unset = await self.prepare(fields)
+            # The content guard skips rows edited since we read them
+            result = await self.db.documents.update_one({"_id": row["_id"], "content": row["content"]}, update_operators(fields, unset))
+            moved += result.modified_count
+        await self.db.migrations.update_one(
+            {"_id": OFFLOAD_MIGRATION},
+            {"$set": {"inline_max_bytes": self.inline_max_bytes, "completed_at": datetime.now(timezone.utc).isoformat()}},
+            upsert=True,
+        )
+        return moved
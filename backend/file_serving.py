@@ -0,0 +1,185 @@
+"""HTTP file serving with byte ranges, strong ETags and cache headers.
+
+Starlette's FileResponse (0.37) ignores Range headers, so PDF viewers would
+always download whole specs. FileRangeResponse serves either the full file or
+a single byte range, using the ASGI zero-copy extension (sendfile) when the
+server offers it and streaming fixed-size chunks otherwise.
+"""
+import asyncio
+import hashlib
+from pathlib import Path
+from urllib.parse import quote
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+import anyio
+from fastapi import HTTPException, Request
+from starlette.responses import Response
+
+CHUNK_SIZE = 64 * 1024
+
+
+def sha256_file(path: Path) -> str:
+    """Hash a file in chunks (blocking, run off the event loop)"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# path -> (mtime_ns, size, sha256); files are rehashed only when they change
+_file_hashes: Dict[str, Tuple[int, int, str]] = {}
+
+
+async def hashed_file_stat(path: Path) -> Tuple[int, str]:
+    """Return (size, sha256) for a file, reusing the hash while it is unchanged"""
+    stat = await asyncio.to_thread(path.stat)
+    cached = _file_hashes.get(str(path))
+    if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+        return stat.st_size, cached[2]
+    digest = await asyncio.to_thread(sha256_file, path)
+    _file_hashes[str(path)] = (stat.st_mtime_ns, stat.st_size, digest)
+    return stat.st_size, digest
+
+
+def parse_byte_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Parse a Range header into an inclusive (start, end) pair.
+
+    Returns None when the whole file should be sent: no header, a malformed
+    or invalid one (such as bytes=500-100), or several ranges (which servers
+    may answer with the full body).
+    Raises 416 when the range cannot be satisfied.
+    """
+    if not range_header or not range_header.startswith("bytes="):
+        return None
+    specs = range_header[len("bytes="):].split(",")
+    if len(specs) != 1:
+        return None
+    start_text, _, end_text = specs[0].strip().partition("-")
+    try:
+        if start_text == "":
+            # Suffix range: the last N bytes
+            length = int(end_text)
+            start, end = max(0, size - length), size - 1
+            if length <= 0:
+                start = size
+        else:
+            start = int(start_text)
+            end = min(int(end_text), size - 1) if end_text else size - 1
+    except ValueError:
+        return None
+    if start_text != "" and end_text and int(end_text) < start:
+        # last-byte-pos before first-byte-pos: invalid, so ignored (RFC 9110 14.1.1)
+        return None
+    if start >= size or start > end:
+        raise HTTPException(status_code=416, detail="Requested range not satisfiable", headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+
+class FileRangeResponse(Response):
+    """Send bytes [start, end] of a file without loading it into memory"""
+
+    def __init__(self, path: Path, start: int, end: int, status_code: int, headers: dict, media_type: str):
+        super().__init__(status_code=status_code, headers=headers, media_type=media_type)
+        self.path = path
+        self.start = start
+        self.count = end - start + 1
+        self.headers["content-length"] = str(self.count)
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"] == "HEAD" or self.count == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        if "http.response.zerocopysend" in scope.get("extensions", {}):
+            with open(self.path, "rb") as f:
+                await send({"type": "http.response.zerocopysend", "file": f, "offset": self.start, "count": self.count, "more_body": False})
+            return
+        async with await anyio.open_file(self.path, "rb") as f:
+            await f.seek(self.start)
+            remaining = self.count
+            while remaining > 0:
+                chunk = await f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+        if remaining > 0:
+            # The file shrank while we were sending it; close the body cleanly
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+def content_disposition(filename: str, disposition: str = "inline") -> str:
+    """A latin-1 safe Content-Disposition: an ASCII fallback name plus the
+    UTF-8 name in RFC 5987 form, so non-ASCII filenames survive"""
+    # Control characters (CR/LF above all) would split the header
+    filename = "".join(char for char in filename if char.isprintable())
+    fallback = filename.encode("ascii", "replace").decode("ascii").replace("?", "_").replace('"', "").replace("\\", "")
+    if fallback == filename:
+        return f'{disposition}; filename="{fallback}"'
+    return f"{disposition}; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename, safe='')}"
+
+
+def _cache_headers(sha256: str, filename: str, cache_control: str) -> Tuple[str, dict]:
+    etag = f'"{sha256}"'
+    return etag, {
+        "ETag": etag,
+        "Cache-Control": cache_control,
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": content_disposition(filename),
+    }
+
+
+def _requested_range(request: Request, etag: str, size: int) -> Optional[Tuple[int, int]]:
+    # If-Range only allows a partial response when the client's copy is current
+    if_range = request.headers.get("if-range")
+    if if_range is not None and if_range != etag:
+        return None
+    return parse_byte_range(request.headers.get("range"), size)
+
+
+def _not_modified(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    return if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]
+
+
+def file_response(request: Request, path: Path, size: int, sha256: str, media_type: str, filename: str, cache_control: str) -> Response:
+    """Serve a file on disk, honoring If-None-Match, Range and If-Range"""
+    etag, headers = _cache_headers(sha256, filename, cache_control)
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    byte_range = _requested_range(request, etag, size)
+    if byte_range is None:
+        return FileRangeResponse(path, 0, size - 1, 200, headers, media_type)
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return FileRangeResponse(path, start, end, 206, headers, media_type)
+
+
+def bytes_response(request: Request, data: bytes, sha256: str, media_type: str, filename: str, cache_control: str) -> Response:
+    """Serve in-memory bytes with the same caching and range semantics"""
+    etag, headers = _cache_headers(sha256, filename, cache_control)
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    byte_range = _requested_range(request, etag, len(data))
+    if byte_range is None:
+        return Response(content=data, headers=headers, media_type=media_type)
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{len(data)}"
+    return Response(content=data[start:end + 1], status_code=206, headers=headers, media_type=media_type)
+
+
+async def ranged_response(request: Request, size: int, sha256: str, read_range: Callable[[int, int], Awaitable[bytes]],
+                          media_type: str, filename: str, cache_control: str) -> Response:
+    """Serve stored bytes, reading only the requested range via read_range(start, end)"""
+    etag, headers = _cache_headers(sha256, filename, cache_control)
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    byte_range = _requested_range(request, etag, size)
+    if byte_range is None:
+        return Response(content=await read_range(0, size - 1), headers=headers, media_type=media_type)
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return Response(content=await read_range(start, end), status_code=206, headers=headers, media_type=media_type)
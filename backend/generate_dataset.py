@@ -0,0 +1,418 @@
+"""Generate a large synthetic dataset for local scale testing.
+
+Builds on the seed data shapes (DOCUMENTS, GLOSSARY, COMPONENTS,
+PIGPEN_OPERATORS, BRAND_PROFILES) and bulk-inserts configurable volumes with
+skewed, production-like distributions:
+
+- a few hot documents/terms attract most edits (Zipf popularity)
+- a few power users perform most changes
+- timestamps spread over --days, denser in recent weeks and working hours
+- document content and chat message lengths are log-normal
+- chat sessions have a long-tailed number of turns
+
+    python generate_dataset.py --documents 100000 --audit 1000000 \\
+        --versions 5000000 --chat-messages 500000
+    python generate_dataset.py --purge
+
+Every generated row carries `synthetic: true`, so --purge removes exactly the
+generated data and leaves seeded and user-created content alone. Running it
+again without --purge adds more rows: numbered keys (user ids, TAI-Ds,
+filenames) continue after the highest one already generated. Use a
+dedicated database.
+"""
+import argparse
+import asyncio
+import bisect
+import itertools
+import math
+import os
+import random
+import re
+import time
+import uuid
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+load_dotenv(Path(__file__).parent / ".env")
+
+from indexes import ensure_indexes
+from revisions import stamp_missing_revisions
+from seed import BRAND_PROFILES, COMPONENTS, DOCUMENTS, GLOSSARY, PIGPEN_OPERATORS
+
+SYNTHETIC_COLLECTIONS = [
+    "documents", "glossary_terms", "components", "pigpen_operators", "brand_profiles", "users",
+    "audit_log", "content_versions", "chat_history",
+]
+
+WORDS = sorted({
+    word.strip(".,;:()&-").lower()
+    for row in DOCUMENTS + GLOSSARY + PIGPEN_OPERATORS + COMPONENTS + BRAND_PROFILES
+    for value in row.values() if isinstance(value, str)
+    for word in value.split()
+    if len(word.strip(".,;:()&-")) > 2
+})
+DOC_CATEGORIES = sorted({d["category"] for d in DOCUMENTS})
+TERM_CATEGORIES = sorted({t["category"] for t in GLOSSARY})
+OPERATOR_CATEGORIES = sorted({o["category"] for o in PIGPEN_OPERATORS})
+COMPONENT_LAYERS = sorted({c["layer"] for c in COMPONENTS})
+COMPONENT_STATUSES = [("active", 80), ("standby", 15), ("deprecated", 5)]
+FONTS = ["JetBrains Mono", "Manrope", "Inter", "IBM Plex Sans", "Space Grotesk", "Source Serif"]
+
+# Relative frequency of audit actions and version change types
+AUDIT_ACTIONS = [("update", 70), ("create", 15), ("delete", 5), ("rollback", 2), ("login", 6), ("logout", 2)]
+CHANGE_TYPES = [("update", 80), ("create", 14), ("delete", 4), ("rollback", 2)]
+USER_ROLES = [("viewer", 70), ("editor", 25), ("admin", 5)]
+
+
+class ZipfSampler:
+    """Draw ranks 0..n-1 with probability proportional to 1 / (rank + 1) ** s"""
+
+    def __init__(self, n: int, s: float, rng: random.Random):
+        self.rng = rng
+        self.cumulative = list(itertools.accumulate(1 / (rank + 1) ** s for rank in range(n)))
+
+    def sample(self) -> int:
+        return bisect.bisect_left(self.cumulative, self.rng.random() * self.cumulative[-1])
+
+
+def weighted(rng: random.Random, choices):
+    values, weights = zip(*choices)
+    return rng.choices(values, weights)[0]
+
+
+class Generator:
+    def __init__(self, seed: int, days: int):
+        self.rng = random.Random(seed)
+        self.now = datetime.now(timezone.utc)
+        self.days = days
+        self.users = []
+        # content_type -> [(content_id, title)]; shuffled, then popularity follows list rank
+        self.content = {"document": [], "glossary": [], "component": [], "pigpen": [], "brand": []}
+        self.samplers = {}
+
+    def timestamp(self) -> str:
+        """A past timestamp, skewed towards recent days and working hours"""
+        age_days = min(self.rng.expovariate(3 / self.days), self.days)
+        moment = self.now - timedelta(days=age_days)
+        hour = min(max(int(self.rng.gauss(14, 3.5)), 0), 23)
+        moment = moment.replace(hour=hour, minute=self.rng.randrange(60), second=self.rng.randrange(60))
+        return min(moment, self.now).isoformat()
+
+    def sentence(self, words: int) -> str:
+        return " ".join(self.rng.choices(WORDS, k=max(words, 1))).capitalize() + "."
+
+    def paragraph_text(self, mean_words: float) -> str:
+        target = int(self.rng.lognormvariate(math.log(mean_words), 0.8))
+        sentences, total = [], 0
+        while total < target:
+            length = self.rng.randint(8, 24)
+            sentences.append(self.sentence(length))
+            total += length
+        return " ".join(sentences)
+
+    def user(self, index: int) -> dict:
+        user_id = f"user_syn_{index:07d}"
+        return {
+            "user_id": user_id,
+            "email": f"{user_id}@synthetic.local",
+            "name": f"Synthetic User {index}",
+            "picture": None,
+            "role": weighted(self.rng, USER_ROLES),
+            "created_at": self.timestamp(),
+            "synthetic": True,
+        }
+
+    def document(self, index: int) -> dict:
+        template = self.rng.choice(DOCUMENTS)
+        created = self.timestamp()
+        return {
+            "doc_id": str(uuid.uuid4()),
+            "filename": f"synthetic_{index:07d}_{template['filename'].split('_', 1)[1]}",
+            "title": f"{template['title']} #{index}",
+            "category": self.rng.choice(DOC_CATEGORIES),
+            "description": self.sentence(self.rng.randint(8, 20)),
+            "content": self.paragraph_text(400) if self.rng.random() < 0.6 else "",
+            "is_active": self.rng.random() > 0.05,
+            "created_at": created,
+            "updated_at": max(created, self.timestamp()),
+            "synthetic": True,
+        }
+
+    def glossary_term(self, index: int) -> dict:
+        template = self.rng.choice(GLOSSARY)
+        created = self.timestamp()
+        return {
+            "term_id": str(uuid.uuid4()),
+            "term": f"{template['term']} {index}",
+            "definition": self.paragraph_text(25),
+            "category": self.rng.choice(TERM_CATEGORIES),
+            "is_active": self.rng.random() > 0.05,
+            "created_at": created,
+            "updated_at": max(created, self.timestamp()),
+            "synthetic": True,
+        }
+
+    def component(self, index: int) -> dict:
+        template = self.rng.choice(COMPONENTS)
+        created = self.timestamp()
+        return {
+            "component_id": str(uuid.uuid4()),
+            "name": f"{template['name']} {index}",
+            "description": self.sentence(self.rng.randint(8, 20)),
+            "status": weighted(self.rng, COMPONENT_STATUSES),
+            "layer": self.rng.choice(COMPONENT_LAYERS),
+            "key_functions": [self.sentence(self.rng.randint(1, 3))[:-1] for _ in range(self.rng.randint(2, 5))],
+            "is_active": self.rng.random() > 0.05,
+            "created_at": created,
+            "updated_at": max(created, self.timestamp()),
+            "synthetic": True,
+        }
+
+    def brand(self, index: int) -> dict:
+        created = self.timestamp()
+        return {
+            "brand_id": str(uuid.uuid4()),
+            "name": f"Synthetic Brand {index}",
+            "description": self.sentence(self.rng.randint(6, 14)),
+            "primary_color": f"#{self.rng.randrange(0x1000000):06X}",
+            "secondary_color": f"#{self.rng.randrange(0x1000000):06X}",
+            "font_heading": self.rng.choice(FONTS),
+            "font_body": self.rng.choice(FONTS),
+            "logo_url": None,
+            "style_guidelines": self.paragraph_text(40),
+            "is_active": self.rng.random() > 0.05,
+            "created_at": created,
+            "updated_at": max(created, self.timestamp()),
+            "synthetic": True,
+        }
+
+    def operator(self, index: int) -> dict:
+        template = self.rng.choice(PIGPEN_OPERATORS)
+        created = self.timestamp()
+        return {
+            **template,
+            "operator_id": str(uuid.uuid4()),
+            "tai_d": f"SYN-{index:06d}",
+            "name": f"{template['name']} {index}",
+            "category": self.rng.choice(OPERATOR_CATEGORIES),
+            "decision_weight": weighted(self.rng, [(1, 30), (2, 30), (3, 25), (4, 10), (5, 5)]),
+            "is_canonical": False,
+            "is_active": self.rng.random() > 0.05,
+            "created_at": created,
+            "updated_at": max(created, self.timestamp()),
+            "synthetic": True,
+        }
+
+    def pick_user(self) -> dict:
+        return self.users[self.samplers["user"].sample()]
+
+    def pick_content(self):
+        content_type = weighted(self.rng, [("document", 48), ("glossary", 33), ("component", 3), ("pigpen", 14), ("brand", 2)])
+        items = self.content[content_type]
+        content_id, title = items[self.samplers[content_type].sample()]
+        return content_type, content_id, title
+
+    def audit_entry(self, index: int) -> dict:
+        user = self.pick_user()
+        action = weighted(self.rng, AUDIT_ACTIONS)
+        if action in ("login", "logout"):
+            content_type, content_id, title, details = "auth", user["user_id"], user["name"], {}
+        else:
+            content_type, content_id, title = self.pick_content()
+            details = {"changes": self.rng.sample(["title", "description", "content", "definition", "category"], k=self.rng.randint(1, 3))}
+        return {
+            "log_id": str(uuid.uuid4()),
+            "user_id": user["user_id"],
+            "user_name": user["name"],
+            "user_email": user["email"],
+            "action": action,
+            "content_type": content_type,
+            "content_id": content_id,
+            "content_title": title,
+            "details": details,
+            "timestamp": self.timestamp(),
+            "synthetic": True,
+        }
+
+    def version(self, index: int) -> dict:
+        user = self.pick_user()
+        content_type, content_id, title = self.pick_content()
+        change_type = weighted(self.rng, CHANGE_TYPES)
+        if content_type == "document":
+            data = {"doc_id": content_id, "title": title, "description": self.sentence(12), "content": self.paragraph_text(150)}
+        elif content_type == "glossary":
+            data = {"term_id": content_id, "term": title, "definition": self.paragraph_text(25)}
+        elif content_type == "component":
+            data = {"component_id": content_id, "name": title, "description": self.sentence(12), "status": "active"}
+        elif content_type == "brand":
+            data = {"brand_id": content_id, "name": title, "description": self.sentence(10), "style_guidelines": self.paragraph_text(40)}
+        else:
+            data = {"operator_id": content_id, "name": title, "capabilities": self.sentence(4), "role": self.sentence(3)}
+        return {
+            "version_id": str(uuid.uuid4()),
+            "content_id": content_id,
+            "content_type": content_type,
+            "data": data,
+            "changed_by": user["user_id"],
+            "changed_by_name": user["name"],
+            "change_type": change_type,
+            "change_summary": f"{change_type.capitalize()}d {content_type}: {title}",
+            "timestamp": self.timestamp(),
+            "synthetic": True,
+        }
+
+    def chat_messages(self, total: int):
+        """Yield chat turns grouped into sessions with long-tailed lengths"""
+        produced = 0
+        while produced < total:
+            session_id = str(uuid.uuid4())
+            started = datetime.fromisoformat(self.timestamp())
+            turns = max(1, int(self.rng.paretovariate(1.3)))
+            for turn in range(turns):
+                if produced >= total:
+                    return
+                role = "user" if turn % 2 == 0 else "assistant"
+                moment = started + timedelta(seconds=turn * self.rng.randint(5, 120))
+                yield {
+                    "session_id": session_id,
+                    "role": role,
+                    "content": self.paragraph_text(20 if role == "user" else 180),
+                    "file_ids": [],
+                    "timestamp": min(moment, self.now).isoformat(),
+                    "synthetic": True,
+                }
+                produced += 1
+
+
+async def bulk_insert(collection, rows, total: int, batch_size: int, writers: int) -> float:
+    """Insert rows in unordered batches with at most `writers` batches in flight"""
+    started = time.perf_counter()
+    pending = set()
+    inserted = 0
+
+    async def drain(limit: int):
+        nonlocal pending
+        while len(pending) > limit:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                task.result()
+
+    for batch in iter(lambda: list(itertools.islice(rows, batch_size)), []):
+        await drain(writers - 1)
+        pending.add(asyncio.create_task(collection.insert_many(batch, ordered=False)))
+        inserted += len(batch)
+        print(f"  {collection.name}: {inserted}/{total}", end="\r", flush=True)
+    await drain(0)
+    elapsed = time.perf_counter() - started
+    print(f"  {collection.name}: {inserted} rows in {elapsed:.1f}s ({inserted / elapsed if elapsed else 0:.0f}/s)")
+    return elapsed
+
+
+async def next_index(collection, field: str, prefix: str) -> int:
+    """One past the highest number in generated `field` values that start with
+    prefix, so a re-run adds rows instead of colliding with unique keys"""
+    last = await collection.find_one(
+        {"synthetic": True, field: {"$regex": f"^{re.escape(prefix)}"}}, {"_id": 0, field: 1}, sort=[(field, -1)]
+    )
+    number = re.match(r"\d+", last[field][len(prefix):]) if last else None
+    return int(number.group()) + 1 if number else 0
+
+
+async def generate(db, args):
+    gen = Generator(args.seed, args.days)
+    counts = {
+        "users": args.users, "documents": args.documents, "glossary_terms": args.glossary,
+        "components": args.components, "pigpen_operators": args.operators, "brand_profiles": args.brands,
+        "audit_log": args.audit,
+        "content_versions": args.versions, "chat_history": args.chat_messages,
+    }
+    print("Generating: " + ", ".join(f"{name}={count}" for name, count in counts.items()))
+
+    # (collection, content type, id field, title field, row factory, count, numbered unique field and its prefix)
+    entities = [
+        ("documents", "document", "doc_id", "title", gen.document, args.documents, "filename", "synthetic_"),
+        ("glossary_terms", "glossary", "term_id", "term", gen.glossary_term, args.glossary, None, None),
+        ("components", "component", "component_id", "name", gen.component, args.components, None, None),
+        ("pigpen_operators", "pigpen", "operator_id", "name", gen.operator, args.operators, "tai_d", "SYN-"),
+        ("brand_profiles", "brand", "brand_id", "name", gen.brand, args.brands, None, None),
+    ]
+
+    first_user = await next_index(db.users, "user_id", "user_syn_")
+    gen.users = [gen.user(first_user + i) for i in range(max(args.users, 1))]
+    await bulk_insert(db.users, iter(gen.users[:args.users]), args.users, args.batch_size, args.writers)
+    for collection, content_type, id_field, title_field, make, count, numbered_field, prefix in entities:
+        first = await next_index(db[collection], numbered_field, prefix) if numbered_field else 0
+        def rows(make=make, count=count, first=first, id_field=id_field, title_field=title_field, content_type=content_type):
+            for i in range(first, first + count):
+                row = make(i)
+                gen.content[content_type].append((row[id_field], row[title_field]))
+                yield row
+        await bulk_insert(db[collection], rows(), count, args.batch_size, args.writers)
+
+    # Audit/version history references the existing canonical content too
+    for collection, content_type, id_field, title_field, *_ in entities:
+        async for doc in db[collection].find({"synthetic": {"$ne": True}}, {"_id": 0, id_field: 1, title_field: 1}):
+            gen.content[content_type].append((doc[id_field], doc[title_field]))
+    for content_type, items in gen.content.items():
+        if not items:
+            items.append((str(uuid.uuid4()), f"Missing {content_type}"))
+        gen.rng.shuffle(items)
+        gen.samplers[content_type] = ZipfSampler(len(items), args.skew, gen.rng)
+    gen.samplers["user"] = ZipfSampler(len(gen.users), args.skew, gen.rng)
+
+    await bulk_insert(db.audit_log, (gen.audit_entry(i) for i in range(args.audit)), args.audit, args.batch_size, args.writers)
+    await bulk_insert(db.content_versions, (gen.version(i) for i in range(args.versions)), args.versions, args.batch_size, args.writers)
+    await bulk_insert(db.chat_history, gen.chat_messages(args.chat_messages), args.chat_messages, args.batch_size, args.writers)
+
+    print("Assigning sync revisions...")
+    await stamp_missing_revisions(db, [entity[0] for entity in entities])
+    print("Ensuring indexes...")
+    await ensure_indexes(db)
+
+
+async def purge(db):
+    results = await asyncio.gather(*(db[name].delete_many({"synthetic": True}) for name in SYNTHETIC_COLLECTIONS))
+    for name, result in zip(SYNTHETIC_COLLECTIONS, results):
+        print(f"  {name}: {result.deleted_count} synthetic rows removed")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a large synthetic GoGarvis dataset")
+    parser.add_argument("--documents", type=int, default=10_000)
+    parser.add_argument("--glossary", type=int, default=5_000)
+    parser.add_argument("--components", type=int, default=50)
+    parser.add_argument("--operators", type=int, default=500)
+    parser.add_argument("--brands", type=int, default=20)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--audit", type=int, default=100_000)
+    parser.add_argument("--versions", type=int, default=200_000)
+    parser.add_argument("--chat-messages", type=int, default=50_000)
+    parser.add_argument("--days", type=int, default=365, help="history time span")
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent for hot content and power users")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--writers", type=int, default=4, help="concurrent insert_many calls")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--purge", action="store_true", help="remove all synthetic rows and exit")
+    args = parser.parse_args(argv)
+
+    async def run():
+        client = AsyncIOMotorClient(os.environ["MONGO_URL"])
+        db = client[os.environ["DB_NAME"]]
+        try:
+            started = time.perf_counter()
+            if args.purge:
+                await purge(db)
+            else:
+                await generate(db, args)
+            print(f"Done in {time.perf_counter() - started:.1f}s")
+        finally:
+            client.close()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""Audit log and version history entries.
+
+Every content write records what changed and who changed it: the API routes,
+bulk import, batch mutations and seed.py all build their content_versions
+and audit_log documents here. `user` is anything with user_id, name and
+email (the server's User model, or seed.py's SEED_USER).
+"""
+import uuid
+from datetime import datetime, timezone
+
+
+def audit_entry(user, action: str, content_type: str, content_id: str, content_title: str, details: dict = {}) -> dict:
+    """An audit_log document in the AuditLogEntry shape (no model round trip)"""
+    return {
+        "log_id": str(uuid.uuid4()),
+        "user_id": user.user_id,
+        "user_name": user.name,
+        "user_email": user.email,
+        "action": action,
+        "content_type": content_type,
+        "content_id": content_id,
+        "content_title": content_title,
+        "details": details,
+        "timestamp": datetime.now(timezone.utc).isoformat()
+    }
+
+
+def version_entry(user, content_type: str, content_id: str, data: dict, change_type: str, change_summary: str) -> dict:
+    """A content_versions document in the ContentVersion shape"""
+    return {
+        "version_id": str(uuid.uuid4()),
+        "content_id": content_id,
+        "content_type": content_type,
+        "data": data,
+        "changed_by": user.user_id,
+        "changed_by_name": user.name,
+        "change_type": change_type,
+        "change_summary": change_summary,
+        "timestamp": datetime.now(timezone.utc).isoformat()
+    }
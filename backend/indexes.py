@@ -0,0 +1,190 @@
+"""Declarative MongoDB index registry.
+
+INDEXES lists every index the API relies on; ensure_indexes applies it
+idempotently (the server does this at startup, seed.py after seeding).
+CANONICAL_QUERIES holds the query shape behind each hot route, and
+verify_query_plans explains each one and reports any collection scan.
+
+    python indexes.py            # create missing indexes
+    python indexes.py --verify   # also explain canonical queries, exit 1 on COLLSCAN
+
+The server runs the same check at startup when VERIFY_QUERY_PLANS=1.
+"""
+import asyncio
+import logging
+from typing import Dict, List
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+logger = logging.getLogger(__name__)
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "documents": [
+        IndexModel([("doc_id", ASCENDING)], unique=True),
+        IndexModel([("revision", ASCENDING)]),
+        IndexModel([("is_active", ASCENDING), ("category", ASCENDING)]),
+    ],
+    "document_content": [
+        IndexModel([("sha256", ASCENDING), ("n", ASCENDING)], unique=True),
+    ],
+    "glossary_terms": [
+        IndexModel([("term_id", ASCENDING)], unique=True),
+        IndexModel([("revision", ASCENDING)]),
+        IndexModel([("is_active", ASCENDING), ("category", ASCENDING)]),
+    ],
+    "components": [
+        IndexModel([("component_id", ASCENDING)], unique=True),
+        IndexModel([("revision", ASCENDING)]),
+        IndexModel([("is_active", ASCENDING), ("layer", ASCENDING)]),
+    ],
+    "pigpen_operators": [
+        IndexModel([("operator_id", ASCENDING)], unique=True),
+        IndexModel([("revision", ASCENDING)]),
+        IndexModel([("tai_d", ASCENDING)], unique=True),
+        IndexModel([("is_active", ASCENDING), ("decision_weight", DESCENDING), ("tai_d", ASCENDING)]),
+        IndexModel([("is_active", ASCENDING), ("category", ASCENDING), ("decision_weight", DESCENDING), ("tai_d", ASCENDING)]),
+    ],
+    "brand_profiles": [
+        IndexModel([("brand_id", ASCENDING)], unique=True),
+        IndexModel([("revision", ASCENDING)]),
+        IndexModel([("is_active", ASCENDING)]),
+    ],
+    "users": [
+        IndexModel([("user_id", ASCENDING)], unique=True),
+        IndexModel([("email", ASCENDING)], unique=True),
+    ],
+    "user_sessions": [
+        IndexModel([("session_token", ASCENDING)], unique=True),
+        IndexModel([("user_id", ASCENDING)]),
+    ],
+    "audit_log": [
+        IndexModel([("timestamp", DESCENDING)]),
+        IndexModel([("user_id", ASCENDING), ("timestamp", DESCENDING)]),
+        IndexModel([("content_type", ASCENDING), ("timestamp", DESCENDING)]),
+    ],
+    "content_versions": [
+        IndexModel([("version_id", ASCENDING)], unique=True),
+        IndexModel([("content_type", ASCENDING), ("content_id", ASCENDING), ("timestamp", DESCENDING)]),
+    ],
+    "chat_history": [
+        IndexModel([("session_id", ASCENDING), ("timestamp", ASCENDING)]),
+        IndexModel([("file_ids", ASCENDING)]),
+    ],
+    "chat_files": [
+        IndexModel([("file_id", ASCENDING)], unique=True),
+        IndexModel([("uploaded_at", ASCENDING)]),
+        IndexModel([("user_id", ASCENDING), ("uploaded_at", ASCENDING)]),
+        IndexModel([("storage_key", ASCENDING)]),
+    ],
+    "upload_jobs": [
+        IndexModel([("job_id", ASCENDING)], unique=True),
+        IndexModel([("status", ASCENDING), ("updated_at", ASCENDING)]),
+        IndexModel([("file_id", ASCENDING)]),
+    ],
+    "rate_limits": [
+        # Buckets idle long enough to be full again are dropped
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+    ],
+}
+
+# (route, collection, filter, sort) for the queries behind hot routes
+CANONICAL_QUERIES = [
+    ("GET /documents", "documents", {"is_active": True}, None),
+    ("GET /documents/{doc_id}", "documents", {"doc_id": "x", "is_active": True}, None),
+    ("GET /documents/{doc_id}/content", "document_content", {"sha256": "x", "n": {"$gte": 0, "$lte": 1}}, [("n", 1)]),
+    ("GET /glossary", "glossary_terms", {"is_active": True}, None),
+    ("GET /architecture/components", "components", {"is_active": True}, [("layer", 1)]),
+    ("GET /pigpen", "pigpen_operators", {"is_active": True}, [("decision_weight", -1), ("tai_d", 1)]),
+    ("GET /pigpen?category", "pigpen_operators", {"is_active": True, "category": "x"}, [("decision_weight", -1), ("tai_d", 1)]),
+    ("POST /pigpen", "pigpen_operators", {"tai_d": "x"}, None),
+    ("GET /brands", "brand_profiles", {"is_active": True}, None),
+    ("GET /sync", "documents", {"revision": {"$gt": 0}}, [("revision", 1)]),
+    ("GET /sync", "glossary_terms", {"revision": {"$gt": 0}}, [("revision", 1)]),
+    ("GET /sync", "components", {"revision": {"$gt": 0}}, [("revision", 1)]),
+    ("GET /sync", "pigpen_operators", {"revision": {"$gt": 0}}, [("revision", 1)]),
+    ("GET /sync", "brand_profiles", {"revision": {"$gt": 0}}, [("revision", 1)]),
+    ("GET /audit-log", "audit_log", {}, [("timestamp", -1)]),
+    ("GET /audit-log?user_id", "audit_log", {"user_id": "x"}, [("timestamp", -1)]),
+    ("GET /audit-log?content_type", "audit_log", {"content_type": "x"}, [("timestamp", -1)]),
+    ("GET /versions/{type}/{id}", "content_versions", {"content_type": "x", "content_id": "x"}, [("timestamp", -1)]),
+    ("POST /multi-get/version", "content_versions", {"version_id": {"$in": ["x"]}}, None),
+    ("auth session lookup", "user_sessions", {"session_token": "x"}, None),
+    ("auth user lookup", "users", {"user_id": "x"}, None),
+    ("POST /auth/session", "users", {"email": "x"}, None),
+    ("GET /chat/history/{session_id}", "chat_history", {"session_id": "x"}, [("timestamp", 1)]),
+    ("POST /chat attachments", "chat_files", {"file_id": {"$in": ["x"]}}, None),
+    ("GET /chat/upload/jobs/{id}", "upload_jobs", {"job_id": "x"}, None),
+    ("upload janitor orphans", "chat_files", {"uploaded_at": {"$lt": "x"}}, None),
+    ("upload janitor references", "chat_history", {"file_ids": {"$in": ["x"]}}, None),
+    ("upload janitor user quota", "chat_files", {"user_id": "x"}, [("uploaded_at", 1)]),
+    ("upload janitor unrecorded blobs", "chat_files", {"storage_key": {"$in": ["x"]}}, None),
+]
+
+
+class QueryPlanError(RuntimeError):
+    pass
+
+
+async def ensure_indexes(db) -> None:
+    """Create every registered index; existing ones are left untouched"""
+    async def apply(collection: str, models: List[IndexModel]):
+        try:
+            await db[collection].create_indexes(models)
+        except Exception as e:
+            # e.g. duplicate data blocking a unique index; keep serving, but say so
+            logger.error(f"Could not create indexes on {collection}: {e}")
+
+    await asyncio.gather(*(apply(collection, models) for collection, models in INDEXES.items()))
+
+
+def _plan_stages(plan: dict):
+    yield plan.get("stage")
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            yield from _plan_stages(plan[key])
+    for child in plan.get("inputStages", []):
+        yield from _plan_stages(child)
+
+
+async def verify_query_plans(db) -> List[str]:
+    """Explain every canonical query; raise QueryPlanError listing any COLLSCAN"""
+    problems = []
+    for route, collection, query_filter, sort in CANONICAL_QUERIES:
+        command = {"find": collection, "filter": query_filter}
+        if sort:
+            command["sort"] = dict(sort)
+        explain = await db.command("explain", command, verbosity="queryPlanner")
+        winning_plan = explain["queryPlanner"]["winningPlan"]
+        if "COLLSCAN" in _plan_stages(winning_plan):
+            problems.append(f"{route}: COLLSCAN on {collection} for filter {query_filter} sort {sort}")
+    if problems:
+        raise QueryPlanError("Canonical queries without index support:\n" + "\n".join(problems))
+    return [route for route, *_ in CANONICAL_QUERIES]
+
+
+if __name__ == "__main__":
+    import os
+    import sys
+    from pathlib import Path
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / ".env")
+
+    async def main():
+        client = AsyncIOMotorClient(os.environ["MONGO_URL"])
+        db = client[os.environ["DB_NAME"]]
+        try:
+            await ensure_indexes(db)
+            print(f"Ensured indexes on {len(INDEXES)} collections")
+            if "--verify" in sys.argv:
+                try:
+                    verified = await verify_query_plans(db)
+                except QueryPlanError as e:
+                    print(e)
+                    exit(1)
+                print(f"All {len(verified)} canonical queries use an index")
+        finally:
+            client.close()
+
+    asyncio.run(main())
@@ -0,0 +1,173 @@
+"""Garbage collection for uploaded chat files.
+
+Removes uploads that no chat message references once they are older than a
+grace period, then enforces per-user and global disk quotas by deleting the
+oldest unreferenced files first. Files a conversation still uses are never
+deleted for quota; whatever cannot be reclaimed is reported as over quota.
+Finally, blobs that have no chat_files row at all (left behind by crashed
+uploads) are swept from storage once they are past the grace period.
+Blobs and metadata are removed in batches.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone, timedelta
+from typing import Awaitable, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+FILE_PROJECTION = {"_id": 0, "file_id": 1, "storage_key": 1, "path": 1, "size": 1}
+
+
+async def _delete_batch(db, delete_blob: Callable[[dict], Awaitable[bool]], file_docs: List[dict], report: dict, reason: str):
+    """Delete blobs concurrently, then their metadata with one query"""
+    if not file_docs:
+        return
+    results = await asyncio.gather(*(delete_blob(d) for d in file_docs), return_exceptions=True)
+    deletable = []
+    for file_doc, result in zip(file_docs, results):
+        if isinstance(result, Exception):
+            # Keep the metadata so the next run retries the blob
+            logger.error(f"Janitor could not delete blob for {file_doc['file_id']}: {result}")
+            report["errors"] += 1
+            continue
+        if not result:
+            report["missing_blobs"] += 1
+        deletable.append(file_doc["file_id"])
+        report["reclaimed_bytes"] += file_doc.get("size", 0)
+    await db.chat_files.delete_many({"file_id": {"$in": deletable}})
+    report[reason] += len(deletable)
+
+
+async def _collect_orphans(db, delete_blob, cutoff: str, batch_size: int, report: dict):
+    cursor = db.chat_files.find({"uploaded_at": {"$lt": cutoff}}, FILE_PROJECTION).batch_size(batch_size)
+    batch = []
+    async for file_doc in cursor:
+        batch.append(file_doc)
+        if len(batch) >= batch_size:
+            await _delete_orphans_in(db, delete_blob, batch, report)
+            batch = []
+    await _delete_orphans_in(db, delete_blob, batch, report)
+
+
+async def _unreferenced(db, file_docs: List[dict]) -> List[dict]:
+    """The files no chat message attaches"""
+    file_ids = [d["file_id"] for d in file_docs]
+    referenced = set(await db.chat_history.distinct("file_ids", {"file_ids": {"$in": file_ids}}))
+    return [d for d in file_docs if d["file_id"] not in referenced]
+
+
+async def _delete_orphans_in(db, delete_blob, file_docs: List[dict], report: dict):
+    if not file_docs:
+        return
+    await _delete_batch(db, delete_blob, await _unreferenced(db, file_docs), report, "orphans_deleted")
+
+
+async def _enforce_quota(db, delete_blob, owner: str, query: dict, excess: int, batch_size: int, report: dict):
+    """Delete the oldest unreferenced files matching query until excess bytes
+    are reclaimed, reporting the owner as over quota if they run out"""
+    cursor = db.chat_files.find(query, FILE_PROJECTION).sort("uploaded_at", 1).batch_size(batch_size)
+    batch = []
+    async for file_doc in cursor:
+        batch.append(file_doc)
+        if len(batch) < batch_size:
+            continue
+        excess = await _delete_for_quota(db, delete_blob, batch, excess, report)
+        batch = []
+        if excess <= 0:
+            return
+    excess = await _delete_for_quota(db, delete_blob, batch, excess, report)
+    if excess > 0:
+        report["over_quota"].append({"owner": owner, "bytes": excess})
+
+
+async def _delete_for_quota(db, delete_blob, file_docs: List[dict], excess: int, report: dict) -> int:
+    if not file_docs or excess <= 0:
+        return excess
+    victims = []
+    for file_doc in await _unreferenced(db, file_docs):
+        if excess <= 0:
+            break
+        victims.append(file_doc)
+        excess -= file_doc.get("size", 0)
+    await _delete_batch(db, delete_blob, victims, report, "quota_deleted")
+    return excess
+
+
+async def _sweep_unrecorded_blobs(db, storage, modified_before: float, batch_size: int, report: dict):
+    """Delete stored blobs that no chat_files row points at"""
+    keys = await storage.list_keys(modified_before)
+    for start in range(0, len(keys), batch_size):
+        batch = keys[start:start + batch_size]
+        recorded = set(await db.chat_files.distinct("storage_key", {"storage_key": {"$in": batch}}))
+        # Async uploads are staged under their file_id until their job has run
+        recorded |= set(await db.upload_jobs.distinct("file_id", {"file_id": {"$in": batch}, "status": {"$in": ["queued", "processing"]}}))
+        for key in batch:
+            if key in recorded:
+                continue
+            try:
+                await storage.delete(key)
+            except Exception as e:
+                logger.error(f"Janitor could not delete unrecorded blob {key}: {e}")
+                report["errors"] += 1
+                continue
+            report["unrecorded_blobs_deleted"] += 1
+
+
+async def collect_garbage(
+    db,
+    delete_blob: Callable[[dict], Awaitable[bool]],
+    grace_period: timedelta,
+    user_quota_bytes: Optional[int] = None,
+    global_quota_bytes: Optional[int] = None,
+    batch_size: int = 500,
+    storage=None,
+) -> dict:
+    """Run one janitor pass and return a report of what was reclaimed.
+
+    delete_blob receives a chat_files document and returns False when the blob
+    was already gone. Quotas of None or 0 are not enforced. With a storage
+    backend, blobs without a chat_files row are swept too.
+    """
+    started = time.monotonic()
+    report = {
+        "orphans_deleted": 0,
+        "quota_deleted": 0,
+        "missing_blobs": 0,
+        "errors": 0,
+        "reclaimed_bytes": 0,
+        "over_quota": [],
+        "unrecorded_blobs_deleted": 0,
+    }
+    cutoff = (datetime.now(timezone.utc) - grace_period).isoformat()
+
+    await _collect_orphans(db, delete_blob, cutoff, batch_size, report)
+
+    # Finished upload jobs are only useful for polling shortly after upload
+    jobs = await db.upload_jobs.delete_many({"status": {"$in": ["completed", "failed"]}, "updated_at": {"$lt": cutoff}})
+    report["upload_jobs_deleted"] = jobs.deleted_count
+
+    if user_quota_bytes:
+        usage = await db.chat_files.aggregate([
+            {"$match": {"user_id": {"$ne": None}}},
+            {"$group": {"_id": "$user_id", "bytes": {"$sum": "$size"}}},
+            {"$match": {"bytes": {"$gt": user_quota_bytes}}},
+        ]).to_list(None)
+        for entry in usage:
+            await _enforce_quota(db, delete_blob, entry["_id"], {"user_id": entry["_id"]}, entry["bytes"] - user_quota_bytes, batch_size, report)
+
+    if global_quota_bytes:
+        usage = await db.chat_files.aggregate([
+            {"$group": {"_id": None, "bytes": {"$sum": "$size"}}},
+        ]).to_list(1)
+        total = usage[0]["bytes"] if usage else 0
+        if total > global_quota_bytes:
+            await _enforce_quota(db, delete_blob, "global", {}, total - global_quota_bytes, batch_size, report)
+
+    if storage is not None:
+        # Rows are written after their blob, so only blobs past the grace period are swept
+        await _sweep_unrecorded_blobs(db, storage, time.time() - grace_period.total_seconds(), batch_size, report)
+
+    report["duration_ms"] = round((time.monotonic() - started) * 1000, 1)
+    logger.info(f"Upload janitor reclaimed {report['reclaimed_bytes']} bytes: {report}")
+    return report
@@ -0,0 +1,34 @@
+"""Leases that let one API worker at a time run a maintenance job.
+
+Every worker schedules the background jobs, but before each run a worker
+takes the job's lease document in the `leases` collection. The holder renews
+it on every run; if the holder dies, another worker takes over once the
+lease expires.
+"""
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+HOST = socket.gethostname()
+# Identifies this process as a lease holder
+HOLDER = f"{HOST}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+async def acquire_lease(db, name: str, ttl_seconds: float) -> bool:
+    """Take or renew the named lease for ttl_seconds; False if another worker holds it"""
+    now = datetime.now(timezone.utc)
+    try:
+        lease = await db.leases.find_one_and_update(
+            {"_id": name, "$or": [{"holder": HOLDER}, {"expires_at": {"$lte": now}}]},
+            {"$set": {"holder": HOLDER, "expires_at": now + timedelta(seconds=ttl_seconds)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+    except DuplicateKeyError:
+        # The lease exists and is held: our upsert tried to insert a second one
+        return False
+    return lease is not None and lease["holder"] == HOLDER
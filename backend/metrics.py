@@ -0,0 +1,186 @@
+"""Prometheus metrics for the API.
+
+- HTTP request counts and latency per route template, method and status
+  (recorded by PrometheusMiddleware)
+- MongoDB command latency per command and collection (MongoCommandMetrics,
+  registered on the Motor client through pymongo command monitoring)
+- LLM call latency and errors, upload sizes and text extraction time, and
+  the number of live chat sessions (recorded by server.py)
+
+render_metrics() returns the text exposition format served at /metrics.
+
+With several worker processes, set PROMETHEUS_MULTIPROC_DIR to an empty
+directory shared by the workers (cleared before they start): each worker
+then writes its samples there and a scrape of any worker reports them all.
+Gauges are summed over live workers.
+"""
+import hmac
+import ipaddress
+import os
+import time
+from contextlib import contextmanager
+from typing import Iterable, List, Optional, Union
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+from pymongo import monitoring
+
+IPNetwork = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (1024, 10 * 1024, 100 * 1024, 512 * 1024, 1024 ** 2, 5 * 1024 ** 2, 10 * 1024 ** 2, 25 * 1024 ** 2, 50 * 1024 ** 2)
+
+HTTP_REQUESTS = Counter(
+    "gogarvis_http_requests_total", "HTTP requests handled", ["method", "route", "status"]
+)
+HTTP_LATENCY = Histogram(
+    "gogarvis_http_request_duration_seconds", "HTTP request latency", ["method", "route"], buckets=LATENCY_BUCKETS
+)
+HTTP_IN_PROGRESS = Gauge(
+    "gogarvis_http_requests_in_progress", "HTTP requests currently being handled", multiprocess_mode="livesum"
+)
+MONGO_COMMAND_LATENCY = Histogram(
+    "gogarvis_mongo_command_duration_seconds", "MongoDB command latency", ["command", "collection"], buckets=LATENCY_BUCKETS
+)
+MONGO_COMMAND_FAILURES = Counter(
+    "gogarvis_mongo_command_failures_total", "MongoDB commands that failed", ["command", "collection"]
+)
+LLM_LATENCY = Histogram(
+    "gogarvis_llm_request_duration_seconds", "LLM call latency", ["endpoint"], buckets=LATENCY_BUCKETS
+)
+LLM_ERRORS = Counter(
+    "gogarvis_llm_errors_total", "LLM calls that failed", ["endpoint"]
+)
+UPLOAD_SIZE = Histogram(
+    "gogarvis_upload_size_bytes", "Size of uploaded files", ["kind"], buckets=SIZE_BUCKETS
+)
+UPLOAD_EXTRACTION_LATENCY = Histogram(
+    "gogarvis_upload_extraction_duration_seconds", "Text extraction time per upload", ["kind"], buckets=LATENCY_BUCKETS
+)
+CHAT_SESSIONS = Gauge(
+    "gogarvis_chat_sessions", "LLM chat sessions held in memory", multiprocess_mode="livesum"
+)
+CHANGE_FEED_SUBSCRIBERS = Gauge(
+    "gogarvis_change_feed_subscribers", "Clients connected to the change feed", multiprocess_mode="livesum"
+)
+CHANGE_FEED_RESETS = Counter(
+    "gogarvis_change_feed_resets_total", "Change feed clients told to refetch", ["reason"]
+)
+SINGLE_FLIGHT_CALLS = Counter(
+    "gogarvis_single_flight_calls_total", "Cached reads that ran a build (leader) or joined one in flight (shared)", ["key", "role"]
+)
+
+# Commands whose first field is not a collection name
+NON_COLLECTION_COMMANDS = {"getMore", "killCursors", "endSessions", "ping", "hello", "isMaster", "ismaster", "buildInfo", "saslStart", "saslContinue"}
+
+
+def command_collection(command_name: str, command: dict) -> str:
+    if command_name == "getMore":
+        return str(command.get("collection", "-"))
+    if command_name in NON_COLLECTION_COMMANDS:
+        return "-"
+    target = command.get(command_name)
+    return target if isinstance(target, str) else "-"
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Observe every command's duration; succeeded events carry no command, so
+    the collection is remembered from the started event"""
+
+    def __init__(self):
+        self._pending = {}
+
+    def started(self, event):
+        self._pending[(event.connection_id, event.request_id)] = command_collection(event.command_name, event.command)
+
+    def succeeded(self, event):
+        collection = self._pending.pop((event.connection_id, event.request_id), "-")
+        MONGO_COMMAND_LATENCY.labels(event.command_name, collection).observe(event.duration_micros / 1_000_000)
+
+    def failed(self, event):
+        collection = self._pending.pop((event.connection_id, event.request_id), "-")
+        MONGO_COMMAND_LATENCY.labels(event.command_name, collection).observe(event.duration_micros / 1_000_000)
+        MONGO_COMMAND_FAILURES.labels(event.command_name, collection).inc()
+
+
+class PrometheusMiddleware:
+    """Count and time HTTP requests by route template, never by raw path"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_PROGRESS.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_PROGRESS.dec()
+            route = scope.get("route")
+            # Unmatched paths share one label so scanners cannot explode cardinality
+            route_label = getattr(route, "path", None) or "unmatched"
+            HTTP_LATENCY.labels(scope["method"], route_label).observe(time.perf_counter() - started)
+            HTTP_REQUESTS.labels(scope["method"], route_label, str(status)).inc()
+
+
+@contextmanager
+def observe_llm_call(endpoint: str):
+    """Time an LLM call, counting it as an error if it raises"""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        LLM_ERRORS.labels(endpoint).inc()
+        raise
+    finally:
+        LLM_LATENCY.labels(endpoint).observe(time.perf_counter() - started)
+
+
+def observe_single_flight(key: str, shared: bool):
+    SINGLE_FLIGHT_CALLS.labels(key, "shared" if shared else "leader").inc()
+
+
+def multiprocess_enabled() -> bool:
+    return bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+
+def render_metrics():
+    if multiprocess_enabled():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+def mark_worker_exited():
+    """Drop this worker's live gauges from the shared multiprocess samples"""
+    if multiprocess_enabled():
+        multiprocess.mark_process_dead(os.getpid())
+
+
+def parse_networks(value: str) -> List[IPNetwork]:
+    """Parse a comma-separated list of addresses or CIDR ranges"""
+    return [ipaddress.ip_network(part.strip(), strict=False) for part in value.split(",") if part.strip()]
+
+
+def scrape_allowed(authorization: Optional[str], client_host: Optional[str], token: str, networks: Iterable[IPNetwork] = ()) -> bool:
+    """A scrape needs `Authorization: Bearer <token>` or a client address inside
+    one of the configured networks; with neither configured nothing is served"""
+    if token and hmac.compare_digest((authorization or "").encode(), f"Bearer {token}".encode()):
+        return True
+    try:
+        address = ipaddress.ip_address(client_host or "")
+    except ValueError:
+        return False
+    return any(address in network for network in networks)
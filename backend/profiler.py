@@ -0,0 +1,320 @@
+"""On-demand sampling profiler for live traffic.
+
+A background thread samples every thread's Python stack with
+sys._current_frames at a fixed interval; no tracing hooks are installed, so
+the profiled code runs at full speed and nothing runs at all while no profile
+is active. Two modes:
+
+- timed: sample the whole process for T seconds
+- requests: sample only while requests whose route matches a pattern are
+  executing, until N of them have finished. On the event loop thread a sample
+  counts when the request's own middleware frame is on the stack (i.e. that
+  request's task is running); samples from other threads (asyncio.to_thread
+  work such as PDF extraction) count while any matching request is in flight.
+
+Results are rendered as collapsed stacks (flamegraph.pl, speedscope, inferno)
+or speedscope JSON, optionally with a tracemalloc allocation diff.
+
+Sessions live in the process that started them, so the server only profiles
+when it runs as a single worker.
+"""
+import asyncio
+import fnmatch
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+MAX_STACK_DEPTH = 128
+MAX_SESSIONS = 10
+ALLOCATION_TOP = 25
+
+# Innermost frames of threads parked waiting for work
+IDLE_FUNCTIONS = {
+    ("threading.py", "wait"), ("queue.py", "get"), ("selectors.py", "select"),
+    ("selectors.py", "poll"), ("threading.py", "_wait_for_tstate_lock"), ("thread.py", "_worker"),
+}
+
+
+def frame_label(frame) -> str:
+    code = frame.f_code
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})"
+
+
+def is_idle(frame) -> bool:
+    code = frame.f_code
+    return (code.co_filename.rsplit("/", 1)[-1], code.co_name) in IDLE_FUNCTIONS
+
+
+class StackSampler(threading.Thread):
+    """Count distinct stacks across threads until stopped"""
+
+    def __init__(self, interval: float, should_sample=None):
+        super().__init__(name="profiler-sampler", daemon=True)
+        self.interval = interval
+        # should_sample(thread_id, frames_on_stack) -> bool; None samples everything
+        self.should_sample = should_sample
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.idle_samples = 0
+        self.started_at = None
+        self.duration = 0.0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        thread_names = {}
+        self.started_at = time.perf_counter()
+        while not self._stop_event.wait(self.interval):
+            for thread in threading.enumerate():
+                thread_names[thread.ident] = thread.name
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == self.ident:
+                    continue
+                if is_idle(frame):
+                    self.idle_samples += 1
+                    continue
+                frames = []
+                while frame is not None and len(frames) < MAX_STACK_DEPTH:
+                    frames.append(frame)
+                    frame = frame.f_back
+                if self.should_sample and not self.should_sample(thread_id, frames):
+                    continue
+                stack = [thread_names.get(thread_id, str(thread_id))] + [frame_label(f) for f in reversed(frames)]
+                self.stacks[tuple(stack)] += 1
+                self.samples += 1
+        self.duration = time.perf_counter() - self.started_at
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def collapsed_stacks(stacks: Counter) -> str:
+    return "\n".join(f"{';'.join(stack)} {count}" for stack, count in stacks.most_common()) + "\n"
+
+
+def speedscope_profile(stacks: Counter, interval: float, name: str) -> dict:
+    frames: List[dict] = []
+    frame_index: Dict[str, int] = {}
+    samples, weights = [], []
+    for stack, count in stacks.most_common():
+        indexes = []
+        for label in stack:
+            if label not in frame_index:
+                frame_index[label] = len(frames)
+                frames.append({"name": label})
+            indexes.append(frame_index[label])
+        samples.append(indexes)
+        weights.append(round(count * interval * 1000, 3))
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled",
+            "name": name,
+            "unit": "milliseconds",
+            "startValue": 0,
+            "endValue": round(sum(weights), 3),
+            "samples": samples,
+            "weights": weights,
+        }],
+        "exporter": "gogarvis-profiler",
+    }
+
+
+def allocation_diff(before, after) -> List[dict]:
+    return [
+        {
+            "location": str(stat.traceback[0]) if stat.traceback else "?",
+            "size_diff_bytes": stat.size_diff,
+            "count_diff": stat.count_diff,
+            "size_bytes": stat.size,
+        }
+        for stat in after.compare_to(before, "lineno")[:ALLOCATION_TOP]
+    ]
+
+
+class ProfileSession:
+    def __init__(self, mode: str, interval: float, memory: bool, route_pattern: Optional[str] = None,
+                 max_requests: int = 0, should_sample=None):
+        self.session_id = str(uuid.uuid4())
+        self.mode = mode
+        self.interval = interval
+        self.route_pattern = route_pattern
+        self.max_requests = max_requests
+        self.requests_profiled = 0
+        self.status = "running"
+        self.created_at = datetime.now(timezone.utc).isoformat()
+        self.finished_at = None
+        self.memory = memory
+        self._finishing = False
+        self._owns_tracemalloc = False
+        self._memory_before = None
+        self.allocations = None
+        self.sampler = StackSampler(interval, should_sample)
+
+    def start(self):
+        if self.memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._owns_tracemalloc = True
+            self._memory_before = tracemalloc.take_snapshot()
+        self.sampler.start()
+
+    async def finish(self, status: str = "completed"):
+        """Stop sampling and collect the results; joining the sampler and the
+        allocation snapshot run off the event loop"""
+        if self.status != "running" or self._finishing:
+            return
+        self._finishing = True
+        await asyncio.to_thread(self.sampler.stop)
+        if self.memory:
+            after = await asyncio.to_thread(tracemalloc.take_snapshot)
+            self.allocations = await asyncio.to_thread(allocation_diff, self._memory_before, after)
+            self._memory_before = None
+            if self._owns_tracemalloc:
+                tracemalloc.stop()
+        self.status = status
+        self.finished_at = datetime.now(timezone.utc).isoformat()
+
+    def summary(self) -> dict:
+        return {
+            "session_id": self.session_id,
+            "mode": self.mode,
+            "status": self.status,
+            "route_pattern": self.route_pattern,
+            "requests_profiled": self.requests_profiled,
+            "max_requests": self.max_requests,
+            "interval_ms": self.interval * 1000,
+            "samples": self.sampler.samples,
+            "idle_samples": self.sampler.idle_samples,
+            "duration_s": round(self.sampler.duration, 3),
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+    def render(self, output_format: str):
+        """Return the profile as collapsed-stack text or a speedscope document"""
+        if output_format == "collapsed":
+            return collapsed_stacks(self.sampler.stacks)
+        name = f"{self.mode} {self.route_pattern or ''}".strip()
+        return {
+            **self.summary(),
+            "speedscope": speedscope_profile(self.sampler.stacks, self.interval, name),
+            "allocations": self.allocations,
+        }
+
+
+class Profiler:
+    """Owns the active profile session and the recently finished ones"""
+
+    def __init__(self):
+        # Checked by ProfilingMiddleware on every request; None means disabled
+        self.request_session: Optional[ProfileSession] = None
+        self.sessions: Dict[str, ProfileSession] = {}
+        self._active_frames = set()
+        self._loop_thread_id = None
+        self._finishing_tasks = set()
+
+    def _busy(self) -> bool:
+        return any(session.status == "running" for session in self.sessions.values())
+
+    def _remember(self, session: ProfileSession):
+        self.sessions[session.session_id] = session
+        for session_id in list(self.sessions)[:-MAX_SESSIONS]:
+            if self.sessions[session_id].status != "running":
+                del self.sessions[session_id]
+
+    async def profile_for(self, seconds: float, interval: float, memory: bool) -> ProfileSession:
+        """Sample the whole process for `seconds`"""
+        if self._busy():
+            raise RuntimeError("A profile is already running")
+        session = ProfileSession("timed", interval, memory)
+        self._remember(session)
+        session.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            await session.finish()
+        return session
+
+    def arm(self, route_pattern: str, max_requests: int, interval: float, memory: bool, timeout: float) -> ProfileSession:
+        """Profile the next `max_requests` requests whose route matches route_pattern"""
+        if self._busy():
+            raise RuntimeError("A profile is already running")
+        self._loop_thread_id = threading.get_ident()
+        self._active_frames = set()
+        session = ProfileSession("requests", interval, memory, route_pattern, max_requests, self._should_sample)
+        self._remember(session)
+        session.start()
+        self.request_session = session
+        asyncio.get_running_loop().call_later(timeout, self._expire, session)
+        return session
+
+    def _should_sample(self, thread_id: int, frames) -> bool:
+        active = self._active_frames
+        if not active:
+            return False
+        if thread_id != self._loop_thread_id:
+            return True
+        return any(frame in active for frame in frames)
+
+    def _expire(self, session: ProfileSession):
+        if self.request_session is session:
+            self.request_session = None
+        task = asyncio.get_running_loop().create_task(session.finish("timed_out"))
+        self._finishing_tasks.add(task)
+        task.add_done_callback(self._finishing_tasks.discard)
+
+    async def stop(self, session_id: str) -> Optional[ProfileSession]:
+        """Finish a running session early, keeping what it sampled; None if unknown"""
+        session = self.sessions.get(session_id)
+        if session is None:
+            return None
+        if self.request_session is session:
+            self.request_session = None
+        await session.finish("stopped")
+        return session
+
+    def matches(self, session: ProfileSession, method: str, path: str) -> bool:
+        return fnmatch.fnmatchcase(f"{method} {path}", session.route_pattern) or fnmatch.fnmatchcase(path, session.route_pattern)
+
+    def enter(self, frame):
+        self._active_frames = self._active_frames | {frame}
+
+    async def exit(self, session: ProfileSession, frame):
+        self._active_frames = self._active_frames - {frame}
+        session.requests_profiled += 1
+        if session.requests_profiled >= session.max_requests and session.status == "running":
+            self.request_session = None
+            await session.finish()
+
+
+class ProfilingMiddleware:
+    """Hand matching requests to the armed profile session; a single attribute
+    check per request while profiling is off"""
+
+    def __init__(self, app, profiler: Profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        session = self.profiler.request_session
+        if session is None or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        # Match against the raw path; route templates are only known after routing
+        if not self.profiler.matches(session, scope["method"], scope["path"]):
+            await self.app(scope, receive, send)
+            return
+        frame = sys._getframe()
+        self.profiler.enter(frame)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            await self.profiler.exit(session, frame)
@@ -0,0 +1,176 @@
+"""Token-bucket rate limiting shared by every API worker.
+
+Each named budget (e.g. "chat=30/minute") is a bucket per client holding up
+to N tokens that refills continuously at N per period. Clients are keyed by
+authenticated user_id, falling back to the client IP for anonymous requests.
+
+Buckets live in a store:
+
+- MongoBucketStore: one document per bucket, refilled and debited in a single
+  atomic find_one_and_update (pipeline update, MongoDB 4.2+) using the
+  server's clock, so all workers share one limit; idle buckets expire via a
+  TTL index
+- MemoryBucketStore: per-process, for development and tests
+
+FastAPI reads and parses a request body before the route runs, so
+RateLimitMiddleware spends the first token of expensive upload routes before
+the body is read; the route then spends the rest once it knows the cost.
+"""
+import asyncio
+import logging
+import math
+import os
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+DEFAULT_RATE_LIMITS = "llm=20/minute,chat=30/minute,upload=20/minute,editor=120/minute"
+
+
+def parse_rate(rate: str) -> Tuple[int, float]:
+    """Parse "20/minute" into (capacity, tokens per second)"""
+    count, _, period = rate.strip().partition("/")
+    seconds = PERIODS.get(period.strip().rstrip("s"))
+    if not seconds or not count.strip().isdigit() or int(count) < 1:
+        raise ValueError(f"Invalid rate limit: {rate!r} (expected e.g. 20/minute)")
+    capacity = int(count)
+    return capacity, capacity / seconds
+
+
+def parse_budgets(spec: str) -> Dict[str, Tuple[int, float]]:
+    """Parse "chat=30/minute,upload=10/minute" into {name: (capacity, rate)}"""
+    budgets = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, rate = item.partition("=")
+        budgets[name.strip()] = parse_rate(rate)
+    return budgets
+
+
+class MemoryBucketStore:
+    def __init__(self):
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = asyncio.Lock()
+
+    async def take(self, key: str, capacity: int, rate: float, cost: int) -> Tuple[bool, float]:
+        """Debit `cost` tokens if available; return (allowed, tokens left)"""
+        async with self._lock:
+            now = time.monotonic()
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+            return allowed, tokens
+
+
+class MongoBucketStore:
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def take(self, key: str, capacity: int, rate: float, cost: int) -> Tuple[bool, float]:
+        now_ms = {"$toLong": "$$NOW"}
+        elapsed_s = {"$divide": [{"$max": [0, {"$subtract": [now_ms, {"$ifNull": ["$updated_ms", now_ms]}]}]}, 1000]}
+        refilled = {"$min": [capacity, {"$add": [{"$ifNull": ["$tokens", capacity]}, {"$multiply": [elapsed_s, rate]}]}]}
+        seconds_to_full = capacity / rate if rate else 0
+        update = [
+            {"$set": {"tokens": refilled, "updated_ms": now_ms}},
+            {"$set": {
+                "allowed": {"$gte": ["$tokens", cost]},
+                "tokens": {"$cond": [{"$gte": ["$tokens", cost]}, {"$subtract": ["$tokens", cost]}, "$tokens"]},
+                # A bucket idle this long is full again, so it can be dropped
+                "expires_at": {"$add": ["$$NOW", int(seconds_to_full * 1000) + 60_000]},
+            }},
+        ]
+        try:
+            bucket = await self.collection.find_one_and_update({"_id": key}, update, upsert=True, return_document=ReturnDocument.AFTER)
+        except DuplicateKeyError:
+            # Two first requests raced to insert the bucket; it exists now, so update it
+            bucket = await self.collection.find_one_and_update({"_id": key}, update, upsert=True, return_document=ReturnDocument.AFTER)
+        return bucket["allowed"], bucket["tokens"]
+
+
+class RateLimiter:
+    def __init__(self, store, budgets: Dict[str, Tuple[int, float]], enabled: bool = True, trust_forwarded: bool = False):
+        self.store = store
+        self.budgets = budgets
+        self.enabled = enabled
+        self.trust_forwarded = trust_forwarded
+
+    def client_ip(self, request: Request) -> str:
+        if self.trust_forwarded:
+            forwarded = request.headers.get("x-forwarded-for")
+            if forwarded:
+                return forwarded.split(",")[0].strip()
+        return request.client.host if request.client else "unknown"
+
+    async def check(self, request: Request, budget: str, user_id: Optional[str] = None, cost: int = 1):
+        """Spend `cost` tokens from the caller's `budget` bucket, raising 429 when empty"""
+        if not self.enabled or budget not in self.budgets or cost < 1:
+            return
+        capacity, rate = self.budgets[budget]
+        identity = f"user:{user_id}" if user_id else f"ip:{self.client_ip(request)}"
+        key = f"{budget}:{identity}"
+        try:
+            allowed, tokens = await self.store.take(key, capacity, rate, min(cost, capacity))
+        except Exception as e:
+            # Fail open: a limiter outage must not take the API down with it
+            logger.error(f"Rate limit store error for {key}: {e}")
+            return
+        if not allowed:
+            retry_after = max(1, math.ceil((min(cost, capacity) - tokens) / rate))
+            raise HTTPException(
+                status_code=429,
+                detail=f"Rate limit exceeded for {budget}; retry in {retry_after}s",
+                headers={"Retry-After": str(retry_after)},
+            )
+
+
+class RateLimitMiddleware:
+    """Spend one token of a route's budget before its body is read"""
+
+    def __init__(self, app, limiter: RateLimiter, routes: Dict[Tuple[str, str], str], identify: Callable[[Request], Awaitable[Optional[str]]]):
+        self.app = app
+        self.limiter = limiter
+        # {(method, path): budget}
+        self.routes = routes
+        # Returns the caller's user_id, or None for anonymous requests
+        self.identify = identify
+
+    async def __call__(self, scope, receive, send):
+        budget = self.routes.get((scope.get("method"), scope.get("path"))) if scope["type"] == "http" else None
+        if budget is None:
+            await self.app(scope, receive, send)
+            return
+        request = Request(scope)
+        try:
+            await self.limiter.check(request, budget, await self.identify(request))
+        except HTTPException as e:
+            response = JSONResponse({"detail": e.detail}, status_code=e.status_code, headers=e.headers)
+            await response(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+
+
+def rate_limiter_from_env(db) -> RateLimiter:
+    """Build the limiter from RATE_LIMIT_* settings"""
+    backend = os.environ.get("RATE_LIMIT_BACKEND", "mongo").lower()
+    if backend == "mongo":
+        store = MongoBucketStore(db.rate_limits)
+    elif backend == "memory":
+        store = MemoryBucketStore()
+    else:
+        raise ValueError(f"Unknown RATE_LIMIT_BACKEND: {backend}")
+    return RateLimiter(
+        store,
+        parse_budgets(os.environ.get("RATE_LIMITS", DEFAULT_RATE_LIMITS)),
+        enabled=os.environ.get("RATE_LIMIT_ENABLED", "1") == "1",
+        trust_forwarded=os.environ.get("RATE_LIMIT_TRUST_FORWARDED", "0") == "1",
+    )
@@ -0,0 +1,143 @@
+"""Per-request MongoDB round-trip accounting and slow-command logging.
+
+DbRequestMiddleware opens a RequestDbStats for every HTTP request in a
+contextvar; DbCommandTracker (a pymongo CommandListener) adds each command's
+duration to it. Motor runs pymongo in executor threads with a copy of the
+caller's context, so commands are attributed to the request that issued them.
+
+The totals are reported in a Server-Timing header, e.g.
+
+    Server-Timing: db;dur=12.4;desc="5 round trips", app;dur=31.0
+
+and any command slower than the threshold is logged with its collection and
+filter shape (values replaced by "?").
+"""
+import contextvars
+import logging
+import threading
+import time
+from typing import Optional
+
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+_current_stats = contextvars.ContextVar("request_db_stats", default=None)
+
+
+class RequestDbStats:
+    __slots__ = ("scope", "round_trips", "db_seconds", "_lock")
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.round_trips = 0
+        self.db_seconds = 0.0
+        # Commands of one request can finish concurrently on different threads
+        self._lock = threading.Lock()
+
+    @property
+    def route(self) -> str:
+        """The matched route template (the router adds it to the scope), else the raw path"""
+        route = self.scope.get("route")
+        return f"{self.scope['method']} {route.path if route is not None else self.scope['path']}"
+
+    def add(self, seconds: float):
+        with self._lock:
+            self.round_trips += 1
+            self.db_seconds += seconds
+
+
+def current_db_stats() -> Optional[RequestDbStats]:
+    return _current_stats.get()
+
+
+def filter_shape(value):
+    """Replace the literal values in a query filter with "?", keeping its structure"""
+    if isinstance(value, dict):
+        return {key: filter_shape(item) for key, item in value.items()}
+    if isinstance(value, list):
+        shapes = []
+        for item in value:
+            shape = filter_shape(item)
+            if shape not in shapes:
+                shapes.append(shape)
+        return shapes
+    return "?"
+
+
+def command_filter(command_name: str, command: dict):
+    if command_name in ("find", "count", "distinct", "findAndModify"):
+        return command.get("filter", command.get("query"))
+    if command_name == "delete":
+        return [statement.get("q") for statement in command.get("deletes", [])]
+    if command_name == "update":
+        return [statement.get("q") for statement in command.get("updates", [])]
+    if command_name == "aggregate":
+        return [stage["$match"] for stage in command.get("pipeline", []) if "$match" in stage]
+    return None
+
+
+class DbCommandTracker(monitoring.CommandListener):
+    """Attribute command time to the current request and log slow commands"""
+
+    def __init__(self, slow_threshold_ms: float):
+        self.slow_threshold = slow_threshold_ms / 1000
+        self._pending = {}
+
+    def started(self, event):
+        if self.slow_threshold > 0:
+            target = event.command.get(event.command_name)
+            collection = target if isinstance(target, str) else event.command.get("collection", "-")
+            self._pending[(event.connection_id, event.request_id)] = (collection, command_filter(event.command_name, event.command))
+
+    def _finished(self, event, outcome: str):
+        seconds = event.duration_micros / 1_000_000
+        stats = _current_stats.get()
+        if stats is not None:
+            stats.add(seconds)
+        details = self._pending.pop((event.connection_id, event.request_id), None)
+        if details and seconds >= self.slow_threshold:
+            collection, query_filter = details
+            route = stats.route if stats else "background"
+            logger.warning(
+                f"Slow MongoDB {event.command_name} on {collection} ({outcome}): {seconds * 1000:.1f}ms "
+                f"filter={filter_shape(query_filter) if query_filter is not None else '-'} route={route}"
+            )
+
+    def succeeded(self, event):
+        self._finished(event, "ok")
+
+    def failed(self, event):
+        self._finished(event, "failed")
+
+
+class DbRequestMiddleware:
+    """Track Mongo round trips per request and report them in Server-Timing"""
+
+    def __init__(self, app, server_timing: bool = True):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestDbStats(scope)
+        token = _current_stats.set(stats)
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                if self.server_timing:
+                    timing = (
+                        f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.round_trips} round trips", '
+                        f"app;dur={(time.perf_counter() - started) * 1000:.1f}"
+                    )
+                    message["headers"] = list(message.get("headers", [])) + [(b"server-timing", timing.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_stats.reset(token)
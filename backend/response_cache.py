@@ -0,0 +1,141 @@
+"""Pre-serialized JSON bodies for cacheable reads.
+
+Catalog reads (documents, glossary, Pig Pen, components, brands) return the
+same large lists until an editor changes them. ResponseCache stores the
+orjson-encoded body per request key, tagged with the collections it was built
+from; writes invalidate a collection's tag and every body built from it.
+
+A per-tag generation counter keeps a read that raced with a write from
+storing its (possibly stale) body. Entries also expire after a TTL so writes
+made by other API workers are picked up.
+
+Each entry also keeps the gzip/brotli variants clients have asked for, so a
+body is compressed once per revision (at the best setting) rather than on
+every request.
+
+Concurrent misses for the same key share one build, and concurrent requests
+for a missing variant share one compression (see singleflight.py), so a
+stampede on a cold or just-invalidated entry costs one query.
+"""
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+import orjson
+from starlette.requests import Request
+from starlette.responses import Response
+
+from compression import compress_async, negotiate_encoding
+from singleflight import SingleFlight
+
+
+def json_bytes(content) -> bytes:
+    """Serialize JSON-native data (plus datetimes) without jsonable_encoder"""
+    return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+class RawJSONResponse(Response):
+    """A response whose body is already encoded JSON"""
+
+    media_type = "application/json"
+
+
+def body_digest(*parts: bytes) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(part)
+    return digest.hexdigest()
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak If-None-Match comparison; compression turns our ETags into W/ ones"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+
+def flight_label(key: Hashable) -> str:
+    """A low-cardinality name for a cache key (its route), for metrics"""
+    return str(key[0]) if isinstance(key, tuple) and key else str(key)
+
+
+class CachedBody:
+    __slots__ = ("body", "expires_at", "tags", "variants", "_digest")
+
+    def __init__(self, body: bytes, expires_at: float, tags: Tuple[str, ...]):
+        self.body = body
+        self.expires_at = expires_at
+        self.tags = tags
+        # encoding -> compressed body, filled on first request for that encoding
+        self.variants: Dict[str, bytes] = {}
+        self._digest = None
+
+    @property
+    def digest(self) -> str:
+        """Hash of the encoded body, computed on first use"""
+        if self._digest is None:
+            self._digest = body_digest(self.body)
+        return self._digest
+
+
+class ResponseCache:
+    def __init__(self, ttl_seconds: float, max_entries: int = 512, compress_min_size: int = 1024,
+                 flights: Optional[SingleFlight] = None):
+        self.ttl = ttl_seconds
+        self.compress_min_size = compress_min_size
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, CachedBody]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self.flights = flights or SingleFlight()
+
+    def invalidate(self, tag: str):
+        self._generations[tag] = self._generations.get(tag, 0) + 1
+        for key in [key for key, entry in self._entries.items() if tag in entry.tags]:
+            del self._entries[key]
+
+    async def entry(self, key: Hashable, tags: Iterable[str], build: Callable[[], Awaitable[object]]) -> CachedBody:
+        """Return the cache entry for key, building and encoding it on a miss"""
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry is not None and entry.expires_at > now:
+            self._entries.move_to_end(key)
+            return entry
+        tags = tuple(tags)
+        generations = tuple(self._generations.get(tag, 0) for tag in tags)
+        # Misses share a build only within a generation: a read arriving after
+        # a write must not be handed a body that was started before it
+        return await self.flights.do((key, generations), lambda: self._build(key, tags, generations, build), label=flight_label(key))
+
+    async def _build(self, key: Hashable, tags: Tuple[str, ...], generations: Tuple[int, ...], build: Callable[[], Awaitable[object]]) -> CachedBody:
+        entry = CachedBody(json_bytes(await build()), time.monotonic() + self.ttl, tags)
+        if self.ttl > 0 and generations == tuple(self._generations.get(tag, 0) for tag in tags):
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    async def variant(self, entry: CachedBody, encoding: str) -> bytes:
+        """The entry's body compressed for encoding, compressing it once"""
+        if encoding not in entry.variants:
+            async def compress_body():
+                entry.variants[encoding] = await compress_async(entry.body, encoding, level="best")
+                return entry.variants[encoding]
+            return await self.flights.do(("compress", id(entry), encoding), compress_body, label="compress")
+        return entry.variants[encoding]
+
+    async def response(self, request: Request, key: Hashable, tags: Iterable[str], build: Callable[[], Awaitable[object]]) -> Response:
+        """Serve the cached body, pre-compressed in the client's preferred encoding"""
+        entry = await self.entry(key, tags, build)
+        encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+        if encoding is None or len(entry.body) < self.compress_min_size:
+            # Small or identity bodies are left to CompressionMiddleware
+            return RawJSONResponse(entry.body)
+        return RawJSONResponse(
+            await self.variant(entry, encoding),
+            headers={"Content-Encoding": encoding, "Vary": "Accept-Encoding"},
+        )
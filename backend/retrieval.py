@@ -0,0 +1,206 @@
+"""Lexical retrieval index over the canonical spec PDFs and document content.
+
+Passages are stored in a SQLite FTS5 table (BM25 ranking) on local disk, so
+the index survives restarts. Indexing is incremental: a PDF is re-extracted
+only when its mtime/size changed and its SHA-256 differs from the indexed
+copy, and a document only when its content hash changed. The revision of
+each indexed document is kept too, so callers can skip loading the content
+of documents that have not been written since.
+
+All methods are blocking; call them through asyncio.to_thread.
+"""
+import hashlib
+import logging
+import re
+import sqlite3
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import PyPDF2
+
+logger = logging.getLogger(__name__)
+
+CHUNK_WORDS = 200
+CHUNK_OVERLAP = 40
+MAX_QUERY_TERMS = 24
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for",
+    "from", "how", "i", "in", "is", "it", "me", "my", "of", "on", "or", "should",
+    "tell", "that", "the", "this", "to", "was", "what", "when", "where", "which",
+    "who", "why", "will", "with", "you", "your", "about", "explain",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    source_id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    title TEXT NOT NULL,
+    mtime_ns INTEGER,
+    size INTEGER,
+    sha256 TEXT NOT NULL,
+    revision INTEGER
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS passages USING fts5(
+    text,
+    source_id UNINDEXED,
+    title UNINDEXED,
+    page UNINDEXED,
+    tokenize = 'porter unicode61'
+);
+"""
+
+
+def chunk_text(text: str) -> List[str]:
+    """Split text into overlapping windows of about CHUNK_WORDS words"""
+    words = text.split()
+    if not words:
+        return []
+    step = CHUNK_WORDS - CHUNK_OVERLAP
+    return [" ".join(words[i:i + CHUNK_WORDS]) for i in range(0, max(len(words) - CHUNK_OVERLAP, 1), step)]
+
+
+def extract_pdf_pages(path: Path) -> List[str]:
+    reader = PyPDF2.PdfReader(str(path))
+    pages = []
+    for page in reader.pages:
+        try:
+            pages.append(page.extract_text() or "")
+        except Exception as e:
+            logger.error(f"Spec index could not extract a page of {path.name}: {e}")
+            pages.append("")
+    return pages
+
+
+def build_match_query(text: str) -> Optional[str]:
+    """Turn free text into an FTS5 OR query of quoted terms"""
+    terms = []
+    for token in re.findall(r"[\w-]+", text.lower()):
+        token = token.strip("-")
+        if len(token) < 2 or token in STOPWORDS or token in terms:
+            continue
+        terms.append(token)
+    if not terms:
+        return None
+    return " OR ".join(f'"{t}"' for t in terms[:MAX_QUERY_TERMS])
+
+
+class SpecIndex:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            # Indexes built before revisions were tracked
+            if "revision" not in {row[1] for row in conn.execute("PRAGMA table_info(sources)")}:
+                conn.execute("ALTER TABLE sources ADD COLUMN revision INTEGER")
+
+    @contextmanager
+    def _connect(self):
+        """Open a connection that commits on success and is always closed"""
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _replace_source(self, conn, source_id: str, kind: str, title: str, chunks: Iterable[Tuple[Optional[int], str]], mtime_ns, size, sha256: str, revision=None):
+        conn.execute("DELETE FROM passages WHERE source_id = ?", (source_id,))
+        conn.executemany(
+            "INSERT INTO passages (text, source_id, title, page) VALUES (?, ?, ?, ?)",
+            [(text, source_id, title, page) for page, text in chunks],
+        )
+        conn.execute(
+            "INSERT OR REPLACE INTO sources (source_id, kind, title, mtime_ns, size, sha256, revision) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (source_id, kind, title, mtime_ns, size, sha256, revision),
+        )
+
+    def sync(self, docs_path: Path, documents: List[dict]) -> Dict[str, int]:
+        """Bring the index in line with the PDFs on disk and the given documents.
+
+        documents are dicts with doc_id, title, filename, revision and content.
+        PDFs are titled after the document with the same filename, if any. A
+        document may carry content_hash (the SHA-256 of its content) instead of
+        its content when that version is already indexed.
+        """
+        report = {"indexed": 0, "unchanged": 0, "removed": 0, "passages": 0}
+        titles = {d["filename"]: d["title"] for d in documents if d.get("filename")}
+        with self._connect() as conn:
+            known = {row[0]: row[1:] for row in conn.execute("SELECT source_id, mtime_ns, size, sha256, revision FROM sources")}
+            seen = set()
+
+            pdf_paths = sorted(docs_path.glob("*.pdf")) if docs_path.is_dir() else []
+            for pdf_path in pdf_paths:
+                source_id = f"pdf:{pdf_path.name}"
+                seen.add(source_id)
+                stat = pdf_path.stat()
+                previous = known.get(source_id)
+                if previous and previous[0] == stat.st_mtime_ns and previous[1] == stat.st_size:
+                    report["unchanged"] += 1
+                    continue
+                sha256 = hashlib.sha256(pdf_path.read_bytes()).hexdigest()
+                title = titles.get(pdf_path.name, pdf_path.stem)
+                if previous and previous[2] == sha256:
+                    # Touched but identical: remember the new mtime only
+                    conn.execute("UPDATE sources SET mtime_ns = ?, size = ? WHERE source_id = ?", (stat.st_mtime_ns, stat.st_size, source_id))
+                    report["unchanged"] += 1
+                    continue
+                try:
+                    pages = extract_pdf_pages(pdf_path)
+                except Exception as e:
+                    # Record it without passages so it is retried only once it changes
+                    logger.error(f"Spec index could not read {pdf_path.name}: {e}")
+                    pages = []
+                chunks = [(page_number, chunk) for page_number, text in enumerate(pages, start=1) for chunk in chunk_text(text)]
+                self._replace_source(conn, source_id, "pdf", title, chunks, stat.st_mtime_ns, stat.st_size, sha256)
+                report["indexed"] += 1
+                report["passages"] += len(chunks)
+
+            for doc in documents:
+                content = doc.get("content") or ""
+                # Empty documents are recorded without passages, so their revision is known
+                source_id = f"doc:{doc['doc_id']}"
+                seen.add(source_id)
+                sha256 = doc.get("content_hash") or hashlib.sha256(content.encode()).hexdigest()
+                previous = known.get(source_id)
+                if previous and previous[2] == sha256:
+                    if previous[3] != doc.get("revision"):
+                        # Rewritten with the same content: remember the new revision only
+                        conn.execute("UPDATE sources SET revision = ? WHERE source_id = ?", (doc.get("revision"), source_id))
+                    report["unchanged"] += 1
+                    continue
+                chunks = [(None, chunk) for chunk in chunk_text(content)]
+                self._replace_source(conn, source_id, "document", doc["title"], chunks, None, len(content), sha256, doc.get("revision"))
+                report["indexed"] += 1
+                report["passages"] += len(chunks)
+
+            for source_id in set(known) - seen:
+                conn.execute("DELETE FROM passages WHERE source_id = ?", (source_id,))
+                conn.execute("DELETE FROM sources WHERE source_id = ?", (source_id,))
+                report["removed"] += 1
+        return report
+
+    def document_versions(self) -> Dict[str, Tuple[str, Optional[int]]]:
+        """doc_id -> (SHA-256, revision) of the indexed content of each document"""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT source_id, sha256, revision FROM sources WHERE kind = 'document'").fetchall()
+        return {source_id[len("doc:"):]: (sha256, revision) for source_id, sha256, revision in rows}
+
+    def search(self, text: str, limit: int = 4) -> List[dict]:
+        """Return the best matching passages for free text, best first"""
+        match = build_match_query(text)
+        if not match:
+            return []
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT source_id, title, page, text, bm25(passages) AS score FROM passages "
+                "WHERE passages MATCH ? ORDER BY score LIMIT ?",
+                (match, limit),
+            ).fetchall()
+        return [
+            {"source_id": source_id, "title": title, "page": page, "text": text, "score": score}
+            for source_id, title, page, text, score in rows
+        ]
@@ -0,0 +1,96 @@
+"""Monotonic content revisions for delta sync.
+
+Every write to catalog content stamps the row with `revision`, drawn from one
+counter shared by all content collections, so "everything changed since
+revision N" is one indexed range query per collection (GET /api/sync).
+Soft deletes are writes too, so deleted rows reach syncing clients.
+
+Rows written before revisions existed (or by tools that bypass the API, such
+as generate_dataset.py) are stamped by stamp_missing_revisions, which the
+server runs at startup.
+
+changes_since builds one /api/sync page from those range queries.
+"""
+import asyncio
+from typing import Dict, Iterable, Optional
+
+from pymongo import ReturnDocument, UpdateOne
+
+COUNTER_ID = "content_revision"
+
+
+async def next_revisions(db, count: int) -> range:
+    """Reserve `count` consecutive revisions in one round trip"""
+    counter = await db.counters.find_one_and_update(
+        {"_id": COUNTER_ID},
+        {"$inc": {"value": count}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return range(counter["value"] - count + 1, counter["value"] + 1)
+
+
+async def next_revision(db) -> int:
+    return (await next_revisions(db, 1))[0]
+
+
+async def stamp_missing_revisions(db, collections: Iterable[str], batch_size: int = 1000) -> int:
+    """Give every unstamped row its own revision; safe to run on several workers at once"""
+    stamped = 0
+    for collection in collections:
+        while True:
+            ids = [doc["_id"] async for doc in db[collection].find({"revision": {"$exists": False}}, {"_id": 1}).limit(batch_size)]
+            if not ids:
+                break
+            revisions = await next_revisions(db, len(ids))
+            await db[collection].bulk_write(
+                # The guard keeps a concurrent stamper's revision rather than overwriting it
+                [UpdateOne({"_id": _id, "revision": {"$exists": False}}, {"$set": {"revision": revision}}) for _id, revision in zip(ids, revisions)],
+                ordered=False,
+            )
+            stamped += len(ids)
+    return stamped
+
+
+async def changes_since(db, collections: Dict[str, str], since: int, limit: int, settled_before: str,
+                        id_fields: Optional[Dict[str, str]] = None) -> dict:
+    """Rows of {content_type: collection} with a revision above `since`, at most
+    `limit` of them, grouped by content type. With id_fields ({content_type:
+    id field}) deleted rows are reduced to their id, is_active and revision.
+
+    The returned revision is the cursor for the next call. It stops short of
+    rows updated after `settled_before`: revisions are reserved just before
+    the write lands, so a lower one can still appear behind them.
+    """
+    async def fetch(content_type: str):
+        rows = await db[collections[content_type]].find(
+            {"revision": {"$gt": since}}, {"_id": 0}
+        ).sort("revision", 1).limit(limit + 1).to_list(limit + 1)
+        return [(row["revision"], content_type, row) for row in rows]
+
+    # Revisions are global, so the first `limit` rows across collections form a
+    # complete prefix: nothing below the last one is left unread
+    fetched = sorted(
+        (item for rows in await asyncio.gather(*(fetch(content_type) for content_type in sorted(collections))) for item in rows),
+        key=lambda item: item[0]
+    )
+    page = fetched[:limit]
+
+    revision = since
+    for row_revision, _, row in page:
+        if (row.get("updated_at") or "") > settled_before:
+            break
+        revision = row_revision
+
+    changes = {content_type: [] for content_type in sorted(collections)}
+    for _, content_type, row in page:
+        if id_fields and row.get("is_active") is False:
+            id_field = id_fields[content_type]
+            row = {id_field: row.get(id_field), "is_active": False, "revision": row["revision"]}
+        changes[content_type].append(row)
+    return {
+        "revision": revision,
+        # Only worth asking again right away if the cursor reached the end of this page
+        "has_more": len(fetched) > limit and bool(page) and revision == page[-1][0],
+        "changes": changes,
+    }
@@ -1,12 +1,18 @@
 """Seed script to initialize GoGarvis database with content"""
 import asyncio
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
 from datetime import datetime, timezone
 import uuid
 import os
+from types import SimpleNamespace
 from dotenv import load_dotenv
 from pathlib import Path
 
+from history import audit_entry, version_entry
+from indexes import ensure_indexes
+from revisions import next_revisions, stamp_missing_revisions
+
 load_dotenv(Path(__file__).parent / '.env')
 
 mongo_url = os.environ['MONGO_URL']
@@ -559,101 +565,162 @@ BRAND_PROFILES = [
     }
 ]
 
+# (collection, natural key, id field, rows, insert-only defaults)
+SEED_SETS = [
+    ("documents", "filename", "doc_id", DOCUMENTS, {"content": ""}),
+    ("glossary_terms", "term", "term_id", GLOSSARY, {}),
+    ("components", "name", "component_id", COMPONENTS, {}),
+    ("pigpen_operators", "tai_d", "operator_id", PIGPEN_OPERATORS, {}),
+    ("brand_profiles", "name", "brand_id", BRAND_PROFILES, {"logo_url": None}),
+]
+
+# Content type names used in version history and the audit log
+CONTENT_TYPES = {
+    "documents": "document",
+    "glossary_terms": "glossary",
+    "components": "component",
+    "pigpen_operators": "pigpen",
+    "brand_profiles": "brand",
+}
+
+# Author of the versions and audit entries the seed writes
+SEED_USER = SimpleNamespace(user_id="system_seed", name="Seed", email="")
+
+def row_title(row: dict) -> str:
+    return row.get("title") or row.get("name") or row.get("term") or "Unknown"
+
+async def sync_collection(db, collection: str, key: str, id_field: str, rows: list, defaults: dict, now: str) -> dict:
+    """Bring seed rows up to date without overwriting editors' changes.
+    
+    seed_rows remembers which row each seed entry created and the revision
+    the seed last wrote to it, so a row renamed by an editor is still found.
+    A row is updated from the seed only while it is untouched since the
+    seed's last write; edited rows are left as they are (reported as
+    "kept") and only get missing fields filled in. Canonical Pig Pen
+    operators missing from the seed are retired (deactivated). Every write
+    is versioned and audited like an API write.
+    """
+    content_type = CONTENT_TYPES[collection]
+    canonical = collection == "pigpen_operators"
+    await stamp_missing_revisions(db, [collection])
+    current_rows = [doc async for doc in db[collection].find({}, {"_id": 0})]
+    seed_state = {state["seed_key"]: state async for state in db.seed_rows.find({"collection": collection})}
+    by_id = {doc[id_field]: doc for doc in current_rows if doc.get(id_field)}
+    by_key = {doc[key]: doc for doc in current_rows if doc.get(key) is not None}
+    
+    def find_row(seed_key):
+        state = seed_state.get(seed_key)
+        if state and state["content_id"] in by_id:
+            return by_id[state["content_id"]], state
+        # Rows seeded before seed_rows existed (or purged since) are matched by natural key
+        return by_key.get(seed_key), None
+    
+    diff = {"inserted": [], "updated": [], "unchanged": 0, "kept": [], "retired": []}
+    # (seed key, current row or None, fields to write); each gets a revision once they are counted
+    planned = []
+    adopted = []
+    for row in rows:
+        desired = {**row, "is_active": True} if canonical else dict(row)
+        current, state = find_row(row[key])
+        if current is None:
+            planned.append((row[key], None, {id_field: str(uuid.uuid4()), **defaults, "is_active": True, **desired, "created_at": now, "updated_at": now}))
+            diff["inserted"].append(row[key])
+            continue
+        
+        untouched = state is not None and state["revision"] == current.get("revision")
+        missing = {field: value for field, value in {**defaults, **desired}.items() if field not in current}
+        differing = {field: value for field, value in desired.items() if field in current and current[field] != value}
+        if differing and not untouched:
+            diff["kept"].append(row[key])
+        changes = {**missing, **(differing if untouched else {})}
+        if changes:
+            planned.append((row[key], current, {**changes, "updated_at": now}))
+            diff["updated"].append(row[key])
+            continue
+        diff["unchanged"] += 1
+        if not differing and not untouched:
+            # Matches the seed: from now on seed changes may update it
+            adopted.append((row[key], current))
+    
+    if canonical:
+        seeded_keys = {row[key] for row in rows}
+        seed_keys_by_id = {state["content_id"]: seed_key for seed_key, state in seed_state.items()}
+        for current in current_rows:
+            seed_key = seed_keys_by_id.get(current.get(id_field), current.get(key))
+            if current.get("is_canonical") and current.get("is_active", True) and seed_key not in seeded_keys:
+                planned.append((None, current, {"is_active": False, "updated_at": now}))
+                diff["retired"].append(seed_key)
+    
+    ops, versions, audits, states = [], [], [], []
+    revisions = iter(await next_revisions(db, len(planned)) if planned else [])
+    for seed_key, current, fields in planned:
+        revision = next(revisions)
+        fields["revision"] = revision
+        if current is None:
+            ops.append(UpdateOne({key: fields[key]}, {"$setOnInsert": fields}, upsert=True))
+            versions.append(version_entry(SEED_USER, content_type, fields[id_field], dict(fields), "create", f"Seeded: {row_title(fields)}"))
+            audits.append(audit_entry(SEED_USER, "create", content_type, fields[id_field], row_title(fields), {"seed": True}))
+            states.append((seed_key, fields[id_field], revision))
+            continue
+        content_id = current[id_field]
+        updated = {**current, **fields}
+        # Guarded by revision so an edit racing with the seed wins
+        ops.append(UpdateOne({id_field: content_id, "revision": current.get("revision")}, {"$set": fields}))
+        if seed_key is None:
+            versions.append(version_entry(SEED_USER, content_type, content_id, current, "delete", f"Retired by seed: {row_title(current)}"))
+            audits.append(audit_entry(SEED_USER, "delete", content_type, content_id, row_title(current), {"seed": True}))
+            continue
+        versions.append(version_entry(SEED_USER, content_type, content_id, current, "update", f"Before seed update: {row_title(current)}"))
+        versions.append(version_entry(SEED_USER, content_type, content_id, updated, "update", f"Seed update: {row_title(updated)}"))
+        audits.append(audit_entry(SEED_USER, "update", content_type, content_id, row_title(updated), {"changes": list(fields), "seed": True}))
+        state = seed_state.get(seed_key)
+        if state is not None and state["revision"] == current.get("revision"):
+            states.append((seed_key, content_id, revision))
+    states.extend((seed_key, current[id_field], current.get("revision")) for seed_key, current in adopted)
+    
+    if ops:
+        await db[collection].bulk_write(ops, ordered=False)
+        await db.content_versions.insert_many(versions, ordered=False)
+        await db.audit_log.insert_many(audits, ordered=False)
+    if states:
+        await db.seed_rows.bulk_write([
+            UpdateOne(
+                {"_id": f"{collection}:{seed_key}"},
+                {"$set": {"collection": collection, "seed_key": seed_key, "content_id": content_id, "revision": revision}},
+                upsert=True
+            )
+            for seed_key, content_id, revision in states
+        ], ordered=False)
+    return diff
+
 async def seed_database():
     client = AsyncIOMotorClient(mongo_url)
     db = client[db_name]
     
     now = datetime.now(timezone.utc).isoformat()
     
-    # Seed documents
-    if await db.documents.count_documents({}) == 0:
-        docs = []
-        for d in DOCUMENTS:
-            docs.append({
-                "doc_id": str(uuid.uuid4()),
-                **d,
-                "content": "",
-                "is_active": True,
-                "created_at": now,
-                "updated_at": now
-            })
-        await db.documents.insert_many(docs)
-        print(f"Seeded {len(docs)} documents")
+    # Seed all collections concurrently; each costs one read and at most one bulk write
+    diffs = await asyncio.gather(*(
+        sync_collection(db, collection, key, id_field, rows, defaults, now)
+        for collection, key, id_field, rows, defaults in SEED_SETS
+    ))
     
-    # Seed glossary
-    if await db.glossary_terms.count_documents({}) == 0:
-        terms = []
-        for t in GLOSSARY:
-            terms.append({
-                "term_id": str(uuid.uuid4()),
-                **t,
-                "is_active": True,
-                "created_at": now,
-                "updated_at": now
-            })
-        await db.glossary_terms.insert_many(terms)
-        print(f"Seeded {len(terms)} glossary terms")
-    
-    # Seed components
-    if await db.components.count_documents({}) == 0:
-        components = []
-        for c in COMPONENTS:
-            components.append({
-                "component_id": str(uuid.uuid4()),
-                **c,
-                "is_active": True,
-                "created_at": now,
-                "updated_at": now
-            })
-        await db.components.insert_many(components)
-        print(f"Seeded {len(components)} components")
-    
-    # CLEAR and reseed Pig Pen operators with official 33
-    await db.pigpen_operators.delete_many({})
-    operators = []
-    for o in PIGPEN_OPERATORS:
-        operators.append({
-            "operator_id": str(uuid.uuid4()),
-            **o,
-            "is_active": True,
-            "created_at": now,
-            "updated_at": now
-        })
-    await db.pigpen_operators.insert_many(operators)
-    print(f"Seeded {len(operators)} Pig Pen operators (OFFICIAL CANONICAL 33)")
-    
-    # Seed brand profiles
-    if await db.brand_profiles.count_documents({}) == 0:
-        brands = []
-        for b in BRAND_PROFILES:
-            brands.append({
-                "brand_id": str(uuid.uuid4()),
-                **b,
-                "logo_url": None,
-                "is_active": True,
-                "created_at": now,
-                "updated_at": now
-            })
-        await db.brand_profiles.insert_many(brands)
-        print(f"Seeded {len(brands)} brand profiles")
+    for (collection, *_), diff in zip(SEED_SETS, diffs):
+        print(
+            f"{collection}: {len(diff['inserted'])} inserted, {len(diff['updated'])} updated, "
+            f"{diff['unchanged']} unchanged, {len(diff['kept'])} kept (edited), {len(diff['retired'])} retired"
+        )
+        for label in ("inserted", "updated", "kept", "retired"):
+            if diff[label]:
+                print(f"  {label}: {', '.join(map(str, diff[label]))}")
     
     # Create indexes
-    await db.documents.create_index("doc_id", unique=True)
-    await db.glossary_terms.create_index("term_id", unique=True)
-    await db.components.create_index("component_id", unique=True)
-    await db.pigpen_operators.create_index("operator_id", unique=True)
-    await db.pigpen_operators.create_index("tai_d", unique=True)
-    await db.brand_profiles.create_index("brand_id", unique=True)
-
-    await db.users.create_index("user_id", unique=True)
-    await db.users.create_index("email", unique=True)
-    await db.user_sessions.create_index("session_token", unique=True)
-    await db.audit_log.create_index([("timestamp", -1)])
-    await db.content_versions.create_index([("content_type", 1), ("content_id", 1), ("timestamp", -1)])
+    await ensure_indexes(db)
 
     print("Database seeded successfully! (No users or admins created by seed script)")
     print(f"Total canonical operators: {len(PIGPEN_OPERATORS)}")
     client.close()
+    return dict(zip((collection for collection, *_ in SEED_SETS), diffs))
 
 if __name__ == "__main__":
     asyncio.run(seed_database())
@@ -1,40 +1,92 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Query, Depends, Request, Response, UploadFile, File, Form
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, APIRouter, HTTPException, Query, Depends, Request, Response, UploadFile, File, Form, Body
+from fastapi.responses import JSONResponse, StreamingResponse, RedirectResponse, PlainTextResponse, ORJSONResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict
+from pydantic import BaseModel, Field, ConfigDict, ValidationError
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
 from typing import List, Optional, Dict, Any
 import uuid
+import asyncio
 from datetime import datetime, timezone, timedelta
 import PyPDF2
 import httpx
 import base64
+import hashlib
 import io
+import json
+import time
+
+from janitor import collect_garbage
+from storage import storage_from_env
+from file_serving import file_response, bytes_response, ranged_response, hashed_file_stat
+from retrieval import SpecIndex
+from indexes import ensure_indexes, verify_query_plans
+from metrics import (
+    MongoCommandMetrics, PrometheusMiddleware, mark_worker_exited, observe_llm_call, observe_single_flight, parse_networks, render_metrics, scrape_allowed,
+    CHAT_SESSIONS, CHANGE_FEED_SUBSCRIBERS, CHANGE_FEED_RESETS, LLM_ERRORS, UPLOAD_SIZE, UPLOAD_EXTRACTION_LATENCY,
+)
+from request_tracker import DbCommandTracker, DbRequestMiddleware
+from profiler import Profiler, ProfilingMiddleware
+from rate_limit import RateLimitMiddleware, rate_limiter_from_env
+from response_cache import ResponseCache, RawJSONResponse, json_bytes, body_digest, etag_matches
+from singleflight import SingleFlight
+from compression import CompressionMiddleware
+from change_feed import ChangeFeedHub
+from revisions import changes_since, next_revision, next_revisions, stamp_missing_revisions
+from history import audit_entry, version_entry
+from leases import HOLDER, HOST, acquire_lease
+from document_content import DocumentContentStore, update_operators
+import upload_jobs
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+# Commands slower than this are logged with their filter shape (0 disables)
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", "100"))
+SERVER_TIMING = os.environ.get("SERVER_TIMING", "1") == "1"
+client = AsyncIOMotorClient(mongo_url, event_listeners=[MongoCommandMetrics(), DbCommandTracker(SLOW_QUERY_MS)])
 db = client[os.environ['DB_NAME']]
 
+_replicated_deployment = None
+
+async def is_replicated_deployment() -> bool:
+    """Transactions and change streams need a replica set or mongos.
+
+    A successful answer is kept for the life of the process; a failed probe
+    reports False for this call only, so the next call asks the server again.
+    """
+    global _replicated_deployment
+    if _replicated_deployment is None:
+        try:
+            hello = await client.admin.command("hello")
+        except Exception as e:
+            logger.warning(f"Could not detect the MongoDB deployment type: {e}")
+            return False
+        _replicated_deployment = "setName" in hello or hello.get("msg") == "isdbgrid"
+    return _replicated_deployment
+
 
 # Create the main app
-app = FastAPI(title="GoGarvis API")
+app = FastAPI(title="GoGarvis API", default_response_class=ORJSONResponse)
 api_router = APIRouter(prefix="/api")
 
-# Rate limiter setup
-limiter = Limiter(key_func=get_remote_address)
-app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+# Rate limiter setup: per-user token buckets shared by all workers (see rate_limit.py)
+rate_limiter = rate_limiter_from_env(db)
+
+# Responses smaller than this are sent uncompressed
+COMPRESSION_MIN_BYTES = int(os.environ.get("COMPRESSION_MIN_BYTES", "1024"))
+
+# Encoded catalog responses, invalidated by writes (see response_cache.py);
+# concurrent misses for the same key share one query (see singleflight.py)
+RESPONSE_CACHE_TTL_SECONDS = float(os.environ.get("RESPONSE_CACHE_TTL_SECONDS", "5"))
+response_cache = ResponseCache(RESPONSE_CACHE_TTL_SECONDS, compress_min_size=COMPRESSION_MIN_BYTES, flights=SingleFlight(observe_single_flight))
 
 
 # LLM Integration
@@ -43,9 +95,10 @@ chat_sessions = {}
 
 # Secure LLM Proxy Endpoint
 @api_router.post("/llm/proxy")
-@limiter.limit("20/minute")
 async def llm_proxy(request: Request, payload: dict = Body(...)):
     """Proxy LLM requests to Emergent/OpenAI using backend-only key."""
+    user = await get_current_user(request)
+    await rate_limiter.check(request, "llm", user.user_id if user else None)
     api_key = os.environ.get("EMERGENT_LLM_KEY")
     if not api_key:
         raise HTTPException(status_code=500, detail="LLM API key not configured")
@@ -54,24 +107,50 @@ async def llm_proxy(request: Request, payload: dict = Body(...)):
     if not prompt:
         raise HTTPException(status_code=400, detail="Prompt required")
     # Forward to Emergent/OpenAI (example endpoint, adjust as needed)
-    async with httpx.AsyncClient(timeout=30) as client:
-        resp = await client.post(
-            "https://api.openai.com/v1/chat/completions",
-            headers={"Authorization": f"Bearer {api_key}"},
-            json={"model": "gpt-5.2", "messages": [{"role": "user", "content": prompt}], "context": context},
-        )
+    with observe_llm_call("proxy"):
+        async with httpx.AsyncClient(timeout=30) as client:
+            resp = await client.post(
+                "https://api.openai.com/v1/chat/completions",
+                headers={"Authorization": f"Bearer {api_key}"},
+                json={"model": "gpt-5.2", "messages": [{"role": "user", "content": prompt}], "context": context},
+            )
     if resp.status_code != 200:
+        LLM_ERRORS.labels("proxy").inc()
         raise HTTPException(status_code=resp.status_code, detail=resp.text)
     data = resp.json()
     # Strip any keys/metadata
     return {"response": data.get("choices", [{}])[0].get("message", {}).get("content", "")}
 
-# File upload storage
-UPLOAD_DIR = Path("/app/uploads")
-UPLOAD_DIR.mkdir(exist_ok=True)
+# File upload storage (STORAGE_BACKEND=local|s3, see storage.py)
+storage = storage_from_env()
 MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
 
-DOCS_PATH = Path("/app/docs/specs")
+# Upload janitor (one worker at a time): unreferenced uploads are removed after
+# the grace period, and the oldest unreferenced files when a quota (0 = unlimited)
+# is exceeded
+UPLOAD_GC_INTERVAL_SECONDS = int(os.environ.get("UPLOAD_GC_INTERVAL_SECONDS", "3600"))
+UPLOAD_GC_GRACE_HOURS = float(os.environ.get("UPLOAD_GC_GRACE_HOURS", "24"))
+UPLOAD_USER_QUOTA_MB = int(os.environ.get("UPLOAD_USER_QUOTA_MB", "500"))
+UPLOAD_GLOBAL_QUOTA_MB = int(os.environ.get("UPLOAD_GLOBAL_QUOTA_MB", "0"))
+UPLOAD_GC_BATCH_SIZE = int(os.environ.get("UPLOAD_GC_BATCH_SIZE", "500"))
+
+DOCS_PATH = Path(os.environ.get("DOCS_PATH", "/app/docs/specs"))
+
+# Spec retrieval index used to ground chat answers (0 passages disables it)
+SPEC_INDEX_PATH = Path(os.environ.get("SPEC_INDEX_PATH", str(ROOT_DIR / "data" / "spec_index.sqlite3")))
+SPEC_INDEX_REFRESH_SECONDS = int(os.environ.get("SPEC_INDEX_REFRESH_SECONDS", "600"))
+SPEC_CONTEXT_PASSAGES = int(os.environ.get("SPEC_CONTEXT_PASSAGES", "4"))
+spec_index = SpecIndex(SPEC_INDEX_PATH)
+
+# Document content larger than this moves out of the row into hashed chunks (0 keeps it inline)
+DOCUMENT_CONTENT_INLINE_MAX_BYTES = int(os.environ.get("DOCUMENT_CONTENT_INLINE_MAX_BYTES", "16384"))
+document_content = DocumentContentStore(db, DOCUMENT_CONTENT_INLINE_MAX_BYTES)
+
+# Uploads never change once stored; spec PDFs can be replaced in place
+UPLOAD_CACHE_CONTROL = "private, max-age=31536000, immutable"
+SPEC_CACHE_CONTROL = "public, max-age=86400"
+# Document content changes with edits; clients revalidate against its hash ETag
+DOCUMENT_CONTENT_CACHE_CONTROL = "private, no-cache"
 
 # ============== Auth Models ==============
 
@@ -251,9 +330,21 @@ class ChatRequest(BaseModel):
     session_id: Optional[str] = None
     file_ids: Optional[List[str]] = None  # List of uploaded file IDs to include
 
+class AttachmentError(BaseModel):
+    file_id: str
+    reason: str  # not_found, missing_blob, read_error
+
+class Citation(BaseModel):
+    index: int
+    title: str
+    source_id: str  # pdf:<filename> or doc:<doc_id>
+    page: Optional[int] = None
+
 class ChatResponse(BaseModel):
     response: str
     session_id: str
+    attachment_errors: List[AttachmentError] = []
+    citations: List[Citation] = []
 
 class FileUploadResponse(BaseModel):
     file_id: str
@@ -265,6 +356,18 @@ class FileUploadResponse(BaseModel):
 class RoleUpdate(BaseModel):
     role: str
 
+class BatchOperation(BaseModel):
+    op: str  # create, update, delete, restore
+    content_type: str
+    content_id: Optional[str] = None  # required for everything but create
+    data: Dict[str, Any] = {}  # create/update body for the content type
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation]
+
+class MultiGetRequest(BaseModel):
+    ids: List[str]
+
 # ============== Auth Helpers ==============
 
 async def get_current_user(request: Request) -> Optional[User]:
@@ -309,6 +412,9 @@ async def require_editor(request: Request) -> User:
     user = await require_auth(request)
     if user.role not in ["admin", "editor"]:
         raise HTTPException(status_code=403, detail="Editor or admin role required")
+    # Reads (e.g. exports) are not limited; the budget is for writes
+    if request.method not in ("GET", "HEAD"):
+        await rate_limiter.check(request, "editor", user.user_id)
     return user
 
 async def require_admin(request: Request) -> User:
@@ -320,36 +426,89 @@ async def require_admin(request: Request) -> User:
 
 # ============== Audit & Version Helpers ==============
 
+# Catalog content types: collection, id field, natural key (unique per type,
+# used to match imported rows), title field and models
+CONTENT_TYPES = {
+    "document": {"collection": "documents", "id_field": "doc_id", "natural_key": "filename", "title_field": "title", "create_model": DocumentCreate, "update_model": DocumentUpdate, "model": Document},
+    "glossary": {"collection": "glossary_terms", "id_field": "term_id", "natural_key": "term", "title_field": "term", "create_model": GlossaryTermCreate, "update_model": GlossaryTermUpdate, "model": GlossaryTerm},
+    "component": {"collection": "components", "id_field": "component_id", "natural_key": "name", "title_field": "name", "create_model": None, "update_model": ComponentUpdate, "model": SystemComponent},
+    "pigpen": {"collection": "pigpen_operators", "id_field": "operator_id", "natural_key": "tai_d", "title_field": "name", "create_model": PigPenOperatorCreate, "update_model": PigPenOperatorUpdate, "model": PigPenOperator},
+    "brand": {"collection": "brand_profiles", "id_field": "brand_id", "natural_key": "name", "title_field": "name", "create_model": BrandProfileCreate, "update_model": BrandProfileUpdate, "model": BrandProfile},
+}
+CONTENT_COLLECTIONS = {content_type: spec["collection"] for content_type, spec in CONTENT_TYPES.items()}
+
+def parse_content_types(types: Optional[str]) -> Optional[set]:
+    """Parse a comma-separated ?types= filter; None means every content type"""
+    if not types:
+        return None
+    content_types = {content_type.strip() for content_type in types.split(",") if content_type.strip()}
+    unknown = content_types - set(CONTENT_TYPES)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Invalid content type: {', '.join(sorted(unknown))}")
+    return content_types
+
+# ============== Field Selection ==============
+# ?fields=a,b on read endpoints becomes a Mongo projection, limited to these
+# allow-lists so clients can only ask for fields the endpoint already returns.
+
+FIELD_ALLOWLISTS = {
+    "documents": {"doc_id", "filename", "title", "category", "description", "content", "content_hash", "content_size", "is_active", "created_at", "updated_at", "revision"},
+    "glossary_terms": {"term_id", "term", "definition", "category", "is_active", "created_at", "updated_at", "revision"},
+    "components": {"component_id", "name", "description", "status", "layer", "key_functions", "is_active", "created_at", "updated_at", "revision"},
+    "pigpen_operators": {
+        "operator_id", "tai_d", "name", "capabilities", "role", "authority", "status", "category", "is_canonical",
+        "decision_weight", "behavioral_traits", "invocation_triggers", "is_active", "created_at", "updated_at", "revision"
+    },
+    "brand_profiles": {
+        "brand_id", "name", "description", "primary_color", "secondary_color", "font_heading", "font_body",
+        "logo_url", "style_guidelines", "is_active", "created_at", "updated_at", "revision"
+    },
+    "audit_log": {"log_id", "user_id", "user_name", "user_email", "action", "content_type", "content_id", "content_title", "details", "timestamp"},
+    "content_versions": {"version_id", "content_id", "content_type", "data", "changed_by", "changed_by_name", "change_type", "change_summary", "timestamp"},
+}
+
+# Fields returned along with a selected field. Lists never load offloaded
+# document content, so selecting content also returns its reference.
+IMPLIED_FIELDS = {
+    "documents": {"content": ("content_hash", "content_size")},
+}
+
+def parse_fields(fields: Optional[str], collection: str) -> Optional[tuple]:
+    """Validate a comma-separated field list; None selects every field"""
+    if not fields:
+        return None
+    selected = tuple(dict.fromkeys(field.strip() for field in fields.split(",") if field.strip()))
+    unknown = [field for field in selected if field not in FIELD_ALLOWLISTS[collection]]
+    if unknown or not selected:
+        raise HTTPException(status_code=400, detail=f"Invalid fields for {collection}: {', '.join(unknown) or fields}")
+    implied = IMPLIED_FIELDS.get(collection, {})
+    return tuple(dict.fromkeys(name for field in selected for name in (field, *implied.get(field, ()))))
+
+def projection(fields: Optional[tuple], *needed: str) -> dict:
+    """Projection for the selected fields plus any the handler reads itself"""
+    if fields is None:
+        return {"_id": 0}
+    return {"_id": 0, **{field: 1 for field in dict.fromkeys([*fields, *needed])}}
+
+def select_fields(rows: List[dict], fields: Optional[tuple]) -> List[dict]:
+    """Drop fields fetched only for the handler's own use, in the requested order"""
+    if fields is None:
+        return rows
+    return [{field: row[field] for field in fields if field in row} for row in rows]
+
 async def log_audit(user: User, action: str, content_type: str, content_id: str, content_title: str, details: dict = {}):
-    """Log an audit entry"""
-    entry = AuditLogEntry(
-        user_id=user.user_id,
-        user_name=user.name,
-        user_email=user.email,
-        action=action,
-        content_type=content_type,
-        content_id=content_id,
-        content_title=content_title,
-        details=details
-    )
-    doc = entry.model_dump()
-    doc["timestamp"] = doc["timestamp"].isoformat()
-    await db.audit_log.insert_one(doc)
+    """Log an audit entry (every content write ends with one)"""
+    await db.audit_log.insert_one(audit_entry(user, action, content_type, content_id, content_title, details))
+    if content_type in CONTENT_COLLECTIONS:
+        response_cache.invalidate(CONTENT_COLLECTIONS[content_type])
+
+def soft_delete_fields(revision: int) -> dict:
+    """$set for deleting content: it stays in place, inactive, for history and sync"""
+    return {"is_active": False, "updated_at": datetime.now(timezone.utc).isoformat(), "revision": revision}
 
 async def save_version(user: User, content_type: str, content_id: str, data: dict, change_type: str, change_summary: str):
     """Save a version snapshot"""
-    version = ContentVersion(
-        content_id=content_id,
-        content_type=content_type,
-        data=data,
-        changed_by=user.user_id,
-        changed_by_name=user.name,
-        change_type=change_type,
-        change_summary=change_summary
-    )
-    doc = version.model_dump()
-    doc["timestamp"] = doc["timestamp"].isoformat()
-    await db.content_versions.insert_one(doc)
+    await db.content_versions.insert_one(version_entry(user, content_type, content_id, data, change_type, change_summary))
 
 # ============== Auth Routes ==============
 
@@ -431,12 +590,7 @@ async def create_session(request: Request, response: Response):
         "role": role
     }
 
-@api_router.get("/auth/me")
-async def get_me(request: Request):
-    """Get current user"""
-    user = await get_current_user(request)
-    if not user:
-        raise HTTPException(status_code=401, detail="Not authenticated")
+def user_summary(user: User) -> dict:
     return {
         "user_id": user.user_id,
         "email": user.email,
@@ -445,6 +599,14 @@ async def get_me(request: Request):
         "role": user.role
     }
 
+@api_router.get("/auth/me")
+async def get_me(request: Request):
+    """Get current user"""
+    user = await get_current_user(request)
+    if not user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return user_summary(user)
+
 @api_router.post("/auth/logout")
 async def logout(request: Request, response: Response):
     """Logout user"""
@@ -491,10 +653,12 @@ async def get_audit_log(
     request: Request,
     content_type: Optional[str] = None,
     user_id: Optional[str] = None,
-    limit: int = 100
+    limit: int = 100,
+    fields: Optional[str] = None
 ):
     """Get audit log entries"""
     await require_auth(request)
+    selected = parse_fields(fields, "audit_log")
     
     query = {}
     if content_type:
@@ -502,22 +666,23 @@ async def get_audit_log(
     if user_id:
         query["user_id"] = user_id
     
-    entries = await db.audit_log.find(query, {"_id": 0}).sort("timestamp", -1).to_list(limit)
-    return {"entries": entries, "total": len(entries)}
+    entries = await db.audit_log.find(query, projection(selected)).sort("timestamp", -1).to_list(limit)
+    return RawJSONResponse(json_bytes({"entries": entries, "total": len(entries)}))
 
 # ============== Version History Routes ==============
 
 @api_router.get("/versions/{content_type}/{content_id}")
-async def get_versions(content_type: str, content_id: str, request: Request):
+async def get_versions(content_type: str, content_id: str, request: Request, fields: Optional[str] = None):
     """Get version history for content"""
     await require_auth(request)
+    selected = parse_fields(fields, "content_versions")
     
     versions = await db.content_versions.find(
         {"content_type": content_type, "content_id": content_id},
-        {"_id": 0}
+        projection(selected)
     ).sort("timestamp", -1).to_list(100)
     
-    return {"versions": versions}
+    return RawJSONResponse(json_bytes({"versions": versions}))
 
 @api_router.post("/versions/{content_type}/{content_id}/rollback/{version_id}")
 async def rollback_version(content_type: str, content_id: str, version_id: str, request: Request):
@@ -532,32 +697,28 @@ async def rollback_version(content_type: str, content_id: str, version_id: str,
     if not version:
         raise HTTPException(status_code=404, detail="Version not found")
     
-    # Get collection name
-    collection_map = {
-        "document": "documents",
-        "glossary": "glossary_terms",
-        "component": "components",
-        "pigpen": "pigpen_operators",
-        "brand": "brand_profiles"
-    }
-    
-    collection_name = collection_map.get(content_type)
-    if not collection_name:
+    spec = CONTENT_TYPES.get(content_type)
+    if not spec:
         raise HTTPException(status_code=400, detail="Invalid content type")
+    collection_name, id_field = spec["collection"], spec["id_field"]
     
     # Get current state before rollback
-    id_field = f"{content_type}_id" if content_type != "document" else "doc_id"
     current = await db[collection_name].find_one({id_field: content_id}, {"_id": 0})
+    if not current:
+        raise HTTPException(status_code=404, detail="Content not found")
     
     # Save current state as a version
-    if current:
-        await save_version(user, content_type, content_id, current, "rollback", f"State before rollback to {version_id[:8]}")
+    await save_version(user, content_type, content_id, current, "rollback", f"State before rollback to {version_id[:8]}")
     
     # Apply rollback
     rollback_data = version["data"].copy()
     rollback_data["updated_at"] = datetime.now(timezone.utc).isoformat()
+    rollback_data["revision"] = await next_revision(db)
+    unset = await document_content.prepare(rollback_data) if content_type == "document" else {}
     
-    await db[collection_name].update_one({id_field: content_id}, {"$set": rollback_data})
+    result = await db[collection_name].update_one({id_field: content_id}, update_operators(rollback_data, unset))
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Content not found")
     
     # Save rollback version
     await save_version(user, content_type, content_id, rollback_data, "rollback", f"Rolled back to version {version_id[:8]}")
@@ -569,9 +730,9 @@ async def rollback_version(content_type: str, content_id: str, version_id: str,
 
 # ============== Document Routes ==============
 
-@api_router.get("/documents")
-async def get_documents(category: Optional[str] = None, search: Optional[str] = None):
-    documents = await db.documents.find({"is_active": True}, {"_id": 0}).to_list(1000)
+async def documents_payload(category: Optional[str] = None, search: Optional[str] = None, fields: Optional[tuple] = None) -> dict:
+    filter_fields = (("category",) if category else ()) + (("title", "description") if search else ())
+    documents = await db.documents.find({"is_active": True}, projection(fields, *filter_fields)).to_list(1000)
     
     if category and category != "all":
         documents = [d for d in documents if d.get("category", "").lower() == category.lower()]
@@ -580,14 +741,79 @@ async def get_documents(category: Optional[str] = None, search: Optional[str] =
         search_lower = search.lower()
         documents = [d for d in documents if search_lower in d.get("title", "").lower() or search_lower in d.get("description", "").lower()]
     
-    return {"documents": documents, "total": len(documents)}
+    return {"documents": select_fields(documents, fields), "total": len(documents)}
+
+@api_router.get("/documents")
+async def get_documents(request: Request, category: Optional[str] = None, search: Optional[str] = None, fields: Optional[str] = None):
+    selected = parse_fields(fields, "documents")
+    return await response_cache.response(request, ("documents", category, search, selected), ["documents"], lambda: documents_payload(category, search, selected))
 
 @api_router.get("/documents/{doc_id}")
-async def get_document(doc_id: str):
-    doc = await db.documents.find_one({"doc_id": doc_id, "is_active": True}, {"_id": 0})
+async def get_document(doc_id: str, fields: Optional[str] = None):
+    """A document with its content, loaded from chunk storage when it is offloaded"""
+    selected = parse_fields(fields, "documents")
+    wants_content = selected is None or "content" in selected
+    doc = await db.documents.find_one({"doc_id": doc_id, "is_active": True}, projection(selected, *(("content_hash", "content_size") if wants_content else ())))
+    if not doc:
+        raise HTTPException(status_code=404, detail="Document not found")
+    if wants_content and "content_hash" in doc:
+        content_hash, content_size = doc["content_hash"], doc["content_size"]
+        try:
+            await document_content.inline(doc)
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="Document content missing")
+        # The reference stays visible (and selectable) next to the loaded text
+        doc.update(content_hash=content_hash, content_size=content_size)
+    return select_fields([doc], selected)[0]
+
+@api_router.api_route("/documents/{doc_id}/content", methods=["GET", "HEAD"])
+async def get_document_content(doc_id: str, request: Request, version_id: Optional[str] = None):
+    """A document's content as text/plain (supports Range), current or as of a version"""
+    if version_id:
+        await require_auth(request)
+        version = await db.content_versions.find_one(
+            {"version_id": version_id, "content_type": "document", "content_id": doc_id},
+            {"_id": 0, "data.filename": 1, "data.content": 1, "data.content_hash": 1, "data.content_size": 1}
+        )
+        doc = version and version["data"]
+    else:
+        doc = await db.documents.find_one(
+            {"doc_id": doc_id, "is_active": True},
+            {"_id": 0, "filename": 1, "content": 1, "content_hash": 1, "content_size": 1}
+        )
     if not doc:
         raise HTTPException(status_code=404, detail="Document not found")
-    return doc
+    
+    filename = f"{Path(doc.get('filename') or doc_id).stem}.txt"
+    media_type = "text/plain; charset=utf-8"
+    if "content_hash" not in doc:
+        data = (doc.get("content") or "").encode()
+        return bytes_response(request, data, hashlib.sha256(data).hexdigest(), media_type, filename, DOCUMENT_CONTENT_CACHE_CONTROL)
+    
+    async def read_range(start: int, end: int) -> bytes:
+        try:
+            return await document_content.read(doc["content_hash"], start, end)
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="Document content missing")
+    
+    return await ranged_response(request, doc["content_size"], doc["content_hash"], read_range, media_type, filename, DOCUMENT_CONTENT_CACHE_CONTROL)
+
+@api_router.api_route("/documents/{doc_id}/file", methods=["GET", "HEAD"])
+async def download_document_file(doc_id: str, request: Request):
+    """Serve a document's canonical spec PDF from DOCS_PATH (supports Range)"""
+    doc = await db.documents.find_one({"doc_id": doc_id, "is_active": True}, {"_id": 0, "filename": 1})
+    if not doc:
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    docs_root = DOCS_PATH.resolve()
+    file_path = (docs_root / doc["filename"]).resolve()
+    if docs_root not in file_path.parents:
+        raise HTTPException(status_code=404, detail="Document file not found")
+    try:
+        size, sha256 = await hashed_file_stat(file_path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Document file not found")
+    return file_response(request, file_path, size, sha256, get_mime_type(doc["filename"]), doc["filename"], SPEC_CACHE_CONTROL)
 
 @api_router.post("/documents")
 async def create_document(doc: DocumentCreate, request: Request):
@@ -597,8 +823,10 @@ async def create_document(doc: DocumentCreate, request: Request):
     doc_dict = new_doc.model_dump()
     doc_dict["created_at"] = doc_dict["created_at"].isoformat()
     doc_dict["updated_at"] = doc_dict["updated_at"].isoformat()
+    doc_dict["revision"] = await next_revision(db)
+    await document_content.prepare(doc_dict)
     
-    await db.documents.insert_one(doc_dict)
+    await db.documents.insert_one(dict(doc_dict))
     await save_version(user, "document", new_doc.doc_id, doc_dict, "create", f"Created document: {doc.title}")
     await log_audit(user, "create", "document", new_doc.doc_id, doc.title)
     
@@ -617,8 +845,10 @@ async def update_document(doc_id: str, update: DocumentUpdate, request: Request)
     
     update_data = {k: v for k, v in update.model_dump().items() if v is not None}
     update_data["updated_at"] = datetime.now(timezone.utc).isoformat()
+    update_data["revision"] = await next_revision(db)
+    unset = await document_content.prepare(update_data)
     
-    await db.documents.update_one({"doc_id": doc_id}, {"$set": update_data})
+    await db.documents.update_one({"doc_id": doc_id}, update_operators(update_data, unset))
     
     # Get updated doc for version
     updated_doc = await db.documents.find_one({"doc_id": doc_id}, {"_id": 0})
@@ -636,22 +866,25 @@ async def delete_document(doc_id: str, request: Request):
         raise HTTPException(status_code=404, detail="Document not found")
     
     await save_version(user, "document", doc_id, doc, "delete", f"Deleted document: {doc.get('title')}")
-    await db.documents.update_one({"doc_id": doc_id}, {"$set": {"is_active": False}})
+    await db.documents.update_one({"doc_id": doc_id}, {"$set": soft_delete_fields(await next_revision(db))})
     await log_audit(user, "delete", "document", doc_id, doc.get("title"))
     
     return {"message": "Document deleted", "doc_id": doc_id}
 
 @api_router.get("/documents/categories/list")
-async def get_document_categories():
-    documents = await db.documents.find({"is_active": True}, {"_id": 0, "category": 1}).to_list(1000)
-    categories = list(set(d.get("category") for d in documents if d.get("category")))
-    return {"categories": sorted(categories)}
+async def get_document_categories(request: Request):
+    async def build():
+        documents = await db.documents.find({"is_active": True}, {"_id": 0, "category": 1}).to_list(1000)
+        categories = list(set(d.get("category") for d in documents if d.get("category")))
+        return {"categories": sorted(categories)}
+    
+    return await response_cache.response(request, ("documents/categories",), ["documents"], build)
 
 # ============== Glossary Routes ==============
 
-@api_router.get("/glossary")
-async def get_glossary(category: Optional[str] = None, search: Optional[str] = None):
-    terms = await db.glossary_terms.find({"is_active": True}, {"_id": 0}).to_list(1000)
+async def glossary_payload(category: Optional[str] = None, search: Optional[str] = None, fields: Optional[tuple] = None) -> dict:
+    filter_fields = (("category",) if category else ()) + (("term", "definition") if search else ())
+    terms = await db.glossary_terms.find({"is_active": True}, projection(fields, *filter_fields)).to_list(1000)
     
     if category and category != "all":
         terms = [t for t in terms if t.get("category", "").lower() == category.lower()]
@@ -660,7 +893,12 @@ async def get_glossary(category: Optional[str] = None, search: Optional[str] = N
         search_lower = search.lower()
         terms = [t for t in terms if search_lower in t.get("term", "").lower() or search_lower in t.get("definition", "").lower()]
     
-    return {"terms": terms, "total": len(terms)}
+    return {"terms": select_fields(terms, fields), "total": len(terms)}
+
+@api_router.get("/glossary")
+async def get_glossary(request: Request, category: Optional[str] = None, search: Optional[str] = None, fields: Optional[str] = None):
+    selected = parse_fields(fields, "glossary_terms")
+    return await response_cache.response(request, ("glossary", category, search, selected), ["glossary_terms"], lambda: glossary_payload(category, search, selected))
 
 @api_router.post("/glossary")
 async def create_glossary_term(term: GlossaryTermCreate, request: Request):
@@ -670,8 +908,9 @@ async def create_glossary_term(term: GlossaryTermCreate, request: Request):
     term_dict = new_term.model_dump()
     term_dict["created_at"] = term_dict["created_at"].isoformat()
     term_dict["updated_at"] = term_dict["updated_at"].isoformat()
+    term_dict["revision"] = await next_revision(db)
     
-    await db.glossary_terms.insert_one(term_dict)
+    await db.glossary_terms.insert_one(dict(term_dict))
     await save_version(user, "glossary", new_term.term_id, term_dict, "create", f"Created term: {term.term}")
     await log_audit(user, "create", "glossary", new_term.term_id, term.term)
     
@@ -689,6 +928,7 @@ async def update_glossary_term(term_id: str, update: GlossaryTermUpdate, request
     
     update_data = {k: v for k, v in update.model_dump().items() if v is not None}
     update_data["updated_at"] = datetime.now(timezone.utc).isoformat()
+    update_data["revision"] = await next_revision(db)
     
     await db.glossary_terms.update_one({"term_id": term_id}, {"$set": update_data})
     
@@ -707,23 +947,30 @@ async def delete_glossary_term(term_id: str, request: Request):
         raise HTTPException(status_code=404, detail="Term not found")
     
     await save_version(user, "glossary", term_id, term, "delete", f"Deleted term: {term.get('term')}")
-    await db.glossary_terms.update_one({"term_id": term_id}, {"$set": {"is_active": False}})
+    await db.glossary_terms.update_one({"term_id": term_id}, {"$set": soft_delete_fields(await next_revision(db))})
     await log_audit(user, "delete", "glossary", term_id, term.get("term"))
     
     return {"message": "Term deleted", "term_id": term_id}
 
 @api_router.get("/glossary/categories")
-async def get_glossary_categories():
-    terms = await db.glossary_terms.find({"is_active": True}, {"_id": 0, "category": 1}).to_list(1000)
-    categories = list(set(t.get("category") for t in terms if t.get("category")))
-    return {"categories": sorted(categories)}
+async def get_glossary_categories(request: Request):
+    async def build():
+        terms = await db.glossary_terms.find({"is_active": True}, {"_id": 0, "category": 1}).to_list(1000)
+        categories = list(set(t.get("category") for t in terms if t.get("category")))
+        return {"categories": sorted(categories)}
+    
+    return await response_cache.response(request, ("glossary/categories",), ["glossary_terms"], build)
 
 # ============== Architecture Components Routes ==============
 
+async def components_payload(fields: Optional[tuple] = None) -> dict:
+    components = await db.components.find({"is_active": True}, projection(fields)).sort("layer", 1).to_list(100)
+    return {"components": select_fields(components, fields)}
+
 @api_router.get("/architecture/components")
-async def get_components():
-    components = await db.components.find({"is_active": True}, {"_id": 0}).sort("layer", 1).to_list(100)
-    return {"components": components}
+async def get_components(request: Request, fields: Optional[str] = None):
+    selected = parse_fields(fields, "components")
+    return await response_cache.response(request, ("components", selected), ["components"], lambda: components_payload(selected))
 
 @api_router.put("/architecture/components/{component_id}")
 async def update_component(component_id: str, update: ComponentUpdate, request: Request):
@@ -737,6 +984,7 @@ async def update_component(component_id: str, update: ComponentUpdate, request:
     
     update_data = {k: v for k, v in update.model_dump().items() if v is not None}
     update_data["updated_at"] = datetime.now(timezone.utc).isoformat()
+    update_data["revision"] = await next_revision(db)
     
     await db.components.update_one({"component_id": component_id}, {"$set": update_data})
     
@@ -762,28 +1010,32 @@ async def check_canonical_access(user: User, operator: dict, action: str):
                 detail=f"CANONICAL PROTECTION: Cannot {action} canonical operator '{operator.get('name')}'. Only sovereign authority (TSID-0001) can modify canonical operators."
             )
 
-@api_router.get("/pigpen")
-async def get_pigpen_operators(category: Optional[str] = None):
+async def pigpen_payload(category: Optional[str] = None, fields: Optional[tuple] = None) -> dict:
     query = {"is_active": True}
     if category and category != "all":
         query["category"] = category
     
-    operators = await db.pigpen_operators.find(query, {"_id": 0}).sort([("decision_weight", -1), ("tai_d", 1)]).to_list(200)
+    operators = await db.pigpen_operators.find(query, projection(fields, "is_canonical")).sort([("decision_weight", -1), ("tai_d", 1)]).to_list(200)
     
     # Count canonical vs user-added
     canonical_count = sum(1 for o in operators if o.get("is_canonical", False))
     user_count = len(operators) - canonical_count
     
     return {
-        "operators": operators, 
+        "operators": select_fields(operators, fields), 
         "total": len(operators),
         "canonical_count": canonical_count,
         "user_count": user_count
     }
 
+@api_router.get("/pigpen")
+async def get_pigpen_operators(request: Request, category: Optional[str] = None, fields: Optional[str] = None):
+    selected = parse_fields(fields, "pigpen_operators")
+    return await response_cache.response(request, ("pigpen", category, selected), ["pigpen_operators"], lambda: pigpen_payload(category, selected))
+
 @api_router.get("/pigpen/{operator_id}")
-async def get_pigpen_operator(operator_id: str):
-    operator = await db.pigpen_operators.find_one({"operator_id": operator_id, "is_active": True}, {"_id": 0})
+async def get_pigpen_operator(operator_id: str, fields: Optional[str] = None):
+    operator = await db.pigpen_operators.find_one({"operator_id": operator_id, "is_active": True}, projection(parse_fields(fields, "pigpen_operators")))
     if not operator:
         raise HTTPException(status_code=404, detail="Operator not found")
     return operator
@@ -803,8 +1055,9 @@ async def create_pigpen_operator(operator: PigPenOperatorCreate, request: Reques
     op_dict["decision_weight"] = op_dict.get("decision_weight", 1)  # Default low weight
     op_dict["created_at"] = op_dict["created_at"].isoformat()
     op_dict["updated_at"] = op_dict["updated_at"].isoformat()
+    op_dict["revision"] = await next_revision(db)
     
-    await db.pigpen_operators.insert_one(op_dict)
+    await db.pigpen_operators.insert_one(dict(op_dict))
     await save_version(user, "pigpen", new_operator.operator_id, op_dict, "create", f"Created operator: {operator.name}")
     await log_audit(user, "create", "pigpen", new_operator.operator_id, operator.name, {"is_canonical": False})
     
@@ -825,6 +1078,7 @@ async def update_pigpen_operator(operator_id: str, update: PigPenOperatorUpdate,
     
     update_data = {k: v for k, v in update.model_dump().items() if v is not None}
     update_data["updated_at"] = datetime.now(timezone.utc).isoformat()
+    update_data["revision"] = await next_revision(db)
     
     await db.pigpen_operators.update_one({"operator_id": operator_id}, {"$set": update_data})
     
@@ -846,27 +1100,34 @@ async def delete_pigpen_operator(operator_id: str, request: Request):
     await check_canonical_access(user, operator, "delete")
     
     await save_version(user, "pigpen", operator_id, operator, "delete", f"Deleted operator: {operator.get('name')}")
-    await db.pigpen_operators.update_one({"operator_id": operator_id}, {"$set": {"is_active": False}})
+    await db.pigpen_operators.update_one({"operator_id": operator_id}, {"$set": soft_delete_fields(await next_revision(db))})
     await log_audit(user, "delete", "pigpen", operator_id, operator.get("name"))
     
     return {"message": "Operator deleted", "operator_id": operator_id}
 
 @api_router.get("/pigpen/categories/list")
-async def get_pigpen_categories():
-    operators = await db.pigpen_operators.find({"is_active": True}, {"_id": 0, "category": 1}).to_list(100)
-    categories = list(set(o.get("category") for o in operators if o.get("category")))
-    return {"categories": sorted(categories)}
+async def get_pigpen_categories(request: Request):
+    async def build():
+        operators = await db.pigpen_operators.find({"is_active": True}, {"_id": 0, "category": 1}).to_list(100)
+        categories = list(set(o.get("category") for o in operators if o.get("category")))
+        return {"categories": sorted(categories)}
+    
+    return await response_cache.response(request, ("pigpen/categories",), ["pigpen_operators"], build)
 
 # ============== Brand Profiles Routes ==============
 
+async def brands_payload(fields: Optional[tuple] = None) -> dict:
+    brands = await db.brand_profiles.find({"is_active": True}, projection(fields)).to_list(100)
+    return {"brands": select_fields(brands, fields), "total": len(brands)}
+
 @api_router.get("/brands")
-async def get_brand_profiles():
-    brands = await db.brand_profiles.find({"is_active": True}, {"_id": 0}).to_list(100)
-    return {"brands": brands, "total": len(brands)}
+async def get_brand_profiles(request: Request, fields: Optional[str] = None):
+    selected = parse_fields(fields, "brand_profiles")
+    return await response_cache.response(request, ("brands", selected), ["brand_profiles"], lambda: brands_payload(selected))
 
 @api_router.get("/brands/{brand_id}")
-async def get_brand_profile(brand_id: str):
-    brand = await db.brand_profiles.find_one({"brand_id": brand_id, "is_active": True}, {"_id": 0})
+async def get_brand_profile(brand_id: str, fields: Optional[str] = None):
+    brand = await db.brand_profiles.find_one({"brand_id": brand_id, "is_active": True}, projection(parse_fields(fields, "brand_profiles")))
     if not brand:
         raise HTTPException(status_code=404, detail="Brand not found")
     return brand
@@ -879,8 +1140,9 @@ async def create_brand_profile(brand: BrandProfileCreate, request: Request):
     brand_dict = new_brand.model_dump()
     brand_dict["created_at"] = brand_dict["created_at"].isoformat()
     brand_dict["updated_at"] = brand_dict["updated_at"].isoformat()
+    brand_dict["revision"] = await next_revision(db)
     
-    await db.brand_profiles.insert_one(brand_dict)
+    await db.brand_profiles.insert_one(dict(brand_dict))
     await save_version(user, "brand", new_brand.brand_id, brand_dict, "create", f"Created brand: {brand.name}")
     await log_audit(user, "create", "brand", new_brand.brand_id, brand.name)
     
@@ -898,6 +1160,7 @@ async def update_brand_profile(brand_id: str, update: BrandProfileUpdate, reques
     
     update_data = {k: v for k, v in update.model_dump().items() if v is not None}
     update_data["updated_at"] = datetime.now(timezone.utc).isoformat()
+    update_data["revision"] = await next_revision(db)
     
     await db.brand_profiles.update_one({"brand_id": brand_id}, {"$set": update_data})
     
@@ -916,11 +1179,471 @@ async def delete_brand_profile(brand_id: str, request: Request):
         raise HTTPException(status_code=404, detail="Brand not found")
     
     await save_version(user, "brand", brand_id, brand, "delete", f"Deleted brand: {brand.get('name')}")
-    await db.brand_profiles.update_one({"brand_id": brand_id}, {"$set": {"is_active": False}})
+    await db.brand_profiles.update_one({"brand_id": brand_id}, {"$set": soft_delete_fields(await next_revision(db))})
     await log_audit(user, "delete", "brand", brand_id, brand.get("name"))
     
     return {"message": "Brand deleted", "brand_id": brand_id}
 
+# ============== Multi-Get ==============
+# Views that show a set of referenced items fetch them in one $in query
+# instead of one request per id.
+
+MULTI_GET_MAX_IDS = int(os.environ.get("MULTI_GET_MAX_IDS", "100"))
+
+@api_router.post("/multi-get/{content_type}")
+async def multi_get(content_type: str, body: MultiGetRequest, request: Request, fields: Optional[str] = None):
+    """Fetch many items of one type by id, in request order.
+    
+    content_type is a content type or "version" (auth required). Ids that do
+    not exist, or whose content is deleted, are listed in missing.
+    """
+    if content_type == "version":
+        await require_auth(request)
+        collection, id_field, query = "content_versions", "version_id", {}
+    elif content_type in CONTENT_TYPES:
+        spec = CONTENT_TYPES[content_type]
+        collection, id_field, query = spec["collection"], spec["id_field"], {"is_active": True}
+    else:
+        raise HTTPException(status_code=400, detail=f"Invalid content type: {content_type}")
+    
+    ids = list(dict.fromkeys(body.ids))
+    if len(ids) > MULTI_GET_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MULTI_GET_MAX_IDS} ids per request")
+    selected = parse_fields(fields, collection)
+    # Items are matched to ids by the client, so the id is always returned
+    if selected is not None and id_field not in selected:
+        selected = (id_field, *selected)
+    
+    rows = await db[collection].find({**query, id_field: {"$in": ids}}, projection(selected, id_field)).to_list(len(ids)) if ids else []
+    by_id = {row[id_field]: row for row in rows}
+    return {
+        "items": select_fields([by_id[item_id] for item_id in ids if item_id in by_id], selected),
+        "missing": [item_id for item_id in ids if item_id not in by_id]
+    }
+
+# ============== Bulk Import/Export ==============
+# Whole catalogs move as NDJSON (one JSON object per line). Imported rows are
+# matched to existing content by natural key and applied in batches: one
+# lookup, one bulk_write and one insert_many each for versions and audit.
+
+BULK_BATCH_SIZE = int(os.environ.get("BULK_BATCH_SIZE", "500"))
+BULK_MAX_REPORTED_ERRORS = 100
+
+async def iter_ndjson_lines(request: Request):
+    """Yield (line_number, line) for each non-blank line of a streamed body"""
+    buffer = b""
+    line_number = 0
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_number += 1
+            if line.strip():
+                yield line_number, line
+    if buffer.strip():
+        yield line_number + 1, buffer
+
+def record_import_error(report: dict, line_number: int, error: str):
+    report["failed"] += 1
+    if len(report["errors"]) < BULK_MAX_REPORTED_ERRORS:
+        report["errors"].append({"line": line_number, "error": error})
+
+async def apply_import_batch(user: User, content_type: str, batch: dict, report: dict, dry_run: bool):
+    """Insert new rows and update changed ones for one batch keyed by natural key"""
+    spec = CONTENT_TYPES[content_type]
+    collection = db[spec["collection"]]
+    key, id_field, title_field = spec["natural_key"], spec["id_field"], spec["title_field"]
+    existing = {
+        doc[key]: doc
+        async for doc in collection.find({key: {"$in": list(batch)}}, {"_id": 0})
+    }
+    
+    now = datetime.now(timezone.utc).isoformat()
+    # One revision per row; rows left unchanged just leave gaps
+    revisions = iter(await next_revisions(db, len(batch)) if not dry_run else [None] * len(batch))
+    # One write per planned row: (line number, report counter, write, versions, audit entry)
+    planned = []
+    for natural_key, (line_number, row, provided) in batch.items():
+        current = existing.get(natural_key)
+        if current is None:
+            doc = {id_field: str(uuid.uuid4()), **row, "is_active": True, "created_at": now, "updated_at": now, "revision": next(revisions)}
+            if content_type == "document":
+                await document_content.prepare(doc, write=not dry_run)
+            if content_type == "pigpen":
+                doc.update(is_canonical=False, decision_weight=1)  # Imported operators are never canonical
+            planned.append((
+                line_number, "inserted", InsertOne(doc),
+                [version_entry(user, content_type, doc[id_field], dict(doc), "create", f"Bulk import: {doc[title_field]}")],
+                audit_entry(user, "create", content_type, doc[id_field], doc[title_field], {"bulk_import": True}),
+            ))
+            continue
+        
+        if content_type == "pigpen":
+            try:
+                await check_canonical_access(user, current, "edit")
+            except HTTPException as e:
+                record_import_error(report, line_number, e.detail)
+                continue
+        
+        # Large content is compared (and stored) by hash
+        unset = await document_content.prepare(provided, write=not dry_run) if content_type == "document" else {}
+        # Only fields present in the row are applied; importing restores deleted content
+        changes = {field: value for field, value in provided.items() if current.get(field) != value}
+        if not current.get("is_active", True):
+            changes["is_active"] = True
+        if not changes:
+            report["unchanged"] += 1
+            continue
+        changes["updated_at"] = now
+        changes["revision"] = next(revisions)
+        unset = {field: "" for field in unset if field in current}
+        updated = {field: value for field, value in {**current, **changes}.items() if field not in unset}
+        planned.append((
+            line_number, "updated", UpdateOne({id_field: current[id_field]}, update_operators(changes, unset)),
+            [
+                version_entry(user, content_type, current[id_field], current, "update", f"Before bulk import: {current.get(title_field)}"),
+                version_entry(user, content_type, current[id_field], updated, "update", f"Bulk import: {updated.get(title_field)}"),
+            ],
+            audit_entry(user, "update", content_type, current[id_field], updated.get(title_field), {"changes": list(changes), "bulk_import": True}),
+        ))
+    
+    failed = {}
+    if planned and not dry_run:
+        try:
+            await collection.bulk_write([write for _, _, write, _, _ in planned], ordered=False)
+        except BulkWriteError as e:
+            # Unordered: every other row was written, and still needs its history
+            failed = {error["index"]: error.get("errmsg", "write failed") for error in e.details["writeErrors"]}
+    committed = []
+    for index, (line_number, outcome, _, versions, audit) in enumerate(planned):
+        if index in failed:
+            record_import_error(report, line_number, failed[index])
+            continue
+        report[outcome] += 1
+        committed.append((versions, audit))
+    if committed and not dry_run:
+        await db.content_versions.insert_many([version for versions, _ in committed for version in versions], ordered=False)
+        await db.audit_log.insert_many([audit for _, audit in committed], ordered=False)
+
+@api_router.post("/bulk/{content_type}/import")
+async def bulk_import(content_type: str, request: Request, dry_run: bool = False):
+    """Create or update content from an NDJSON body, matching rows by natural key.
+    
+    Rows are validated against the type's create model; invalid rows are
+    reported by line number and skipped. With dry_run nothing is written.
+    """
+    user = await require_editor(request)
+    spec = CONTENT_TYPES.get(content_type)
+    if not spec or not spec["create_model"]:
+        raise HTTPException(status_code=400, detail=f"Import not supported for content type: {content_type}")
+    
+    report = {"lines": 0, "inserted": 0, "updated": 0, "unchanged": 0, "failed": 0, "errors": [], "dry_run": dry_run}
+    batch = {}
+    async for line_number, line in iter_ndjson_lines(request):
+        report["lines"] += 1
+        try:
+            model = spec["create_model"].model_validate_json(line)
+        except ValidationError as e:
+            error = e.errors()[0]
+            location = ".".join(str(part) for part in error["loc"])
+            record_import_error(report, line_number, f"{location}: {error['msg']}" if location else error["msg"])
+            continue
+        row = model.model_dump()
+        # A repeated key in one batch would race with itself; apply what we have first
+        if row[spec["natural_key"]] in batch or len(batch) >= BULK_BATCH_SIZE:
+            await apply_import_batch(user, content_type, batch, report, dry_run)
+            batch = {}
+        batch[row[spec["natural_key"]]] = (line_number, row, model.model_dump(exclude_unset=True))
+    if batch:
+        await apply_import_batch(user, content_type, batch, report, dry_run)
+    
+    if not dry_run:
+        response_cache.invalidate(spec["collection"])
+    return report
+
+@api_router.get("/bulk/{content_type}/export")
+async def bulk_export(content_type: str, request: Request, include_inactive: bool = False):
+    """Stream a content type as NDJSON in id order"""
+    await require_editor(request)
+    spec = CONTENT_TYPES.get(content_type)
+    if not spec:
+        raise HTTPException(status_code=404, detail=f"Unknown content type: {content_type}")
+    
+    query = {} if include_inactive else {"is_active": True}
+    
+    async def rows():
+        cursor = db[spec["collection"]].find(query, {"_id": 0}).sort(spec["id_field"], 1).batch_size(BULK_BATCH_SIZE)
+        chunk = []
+        async for doc in cursor:
+            # Offloaded content is written inline so exports re-import as-is
+            chunk.append(json_bytes(await document_content.inline(doc) if content_type == "document" else doc))
+            if len(chunk) >= BULK_BATCH_SIZE:
+                yield b"\n".join(chunk) + b"\n"
+                chunk = []
+        if chunk:
+            yield b"\n".join(chunk) + b"\n"
+    
+    return StreamingResponse(
+        rows(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{content_type}.ndjson"'}
+    )
+
+# ============== Batch Mutations ==============
+# Many edits in one request: authenticate once, validate and check canonical
+# access for every item, then apply all of them in one transaction with one
+# bulk_write per collection and one insert_many each for versions and audit.
+# Any failing item rejects the whole batch.
+
+BATCH_MAX_OPERATIONS = int(os.environ.get("BATCH_MAX_OPERATIONS", "500"))
+BATCH_OPS = {"create", "update", "delete", "restore"}
+
+class BatchItemError(Exception):
+    def __init__(self, status_code: int, detail: str):
+        self.status_code = status_code
+        self.detail = detail
+
+def validate_batch_data(model, data: dict):
+    try:
+        return model(**data)
+    except ValidationError as e:
+        error = e.errors()[0]
+        location = ".".join(str(part) for part in error["loc"])
+        raise BatchItemError(422, f"{location}: {error['msg']}" if location else error["msg"])
+
+async def load_batch_targets(operations: List[BatchOperation]) -> Dict[tuple, dict]:
+    """Fetch every existing item the batch touches with one $in query per type"""
+    ids_by_type: Dict[str, set] = {}
+    for operation in operations:
+        if operation.op != "create" and operation.content_type in CONTENT_TYPES and operation.content_id:
+            ids_by_type.setdefault(operation.content_type, set()).add(operation.content_id)
+    
+    async def load(content_type: str, ids: set):
+        spec = CONTENT_TYPES[content_type]
+        docs = await db[spec["collection"]].find({spec["id_field"]: {"$in": list(ids)}}, {"_id": 0}).to_list(len(ids))
+        return {(content_type, doc[spec["id_field"]]): doc for doc in docs}
+    
+    targets = {}
+    for loaded in await asyncio.gather(*(load(content_type, ids) for content_type, ids in ids_by_type.items())):
+        targets.update(loaded)
+    return targets
+
+async def taken_tai_ds(operations: List[BatchOperation]) -> set:
+    tai_ds = [operation.data.get("tai_d") for operation in operations if operation.op == "create" and operation.content_type == "pigpen"]
+    tai_ds = [tai_d for tai_d in tai_ds if isinstance(tai_d, str)]
+    if not tai_ds:
+        return set()
+    existing = await db.pigpen_operators.find({"tai_d": {"$in": tai_ds}}, {"_id": 0, "tai_d": 1}).to_list(len(tai_ds))
+    return {operator["tai_d"] for operator in existing}
+
+async def plan_batch_operation(user: User, operation: BatchOperation, state: Dict[tuple, dict], tai_ds: set, now: str, revision: int, chunks: dict):
+    """Validate one operation against the in-memory state and return its
+    (collection, write, versions, audit entry, content_id). Large document
+    content is collected in chunks rather than stored, as the batch may still fail."""
+    if operation.op not in BATCH_OPS:
+        raise BatchItemError(400, f"Unknown operation: {operation.op}")
+    spec = CONTENT_TYPES.get(operation.content_type)
+    if not spec:
+        raise BatchItemError(400, f"Invalid content type: {operation.content_type}")
+    content_type, id_field, title_field = operation.content_type, spec["id_field"], spec["title_field"]
+    
+    if operation.op == "create":
+        if not spec["create_model"]:
+            raise BatchItemError(400, f"Cannot create content type: {content_type}")
+        payload = validate_batch_data(spec["create_model"], operation.data)
+        doc = spec["model"](**payload.model_dump()).model_dump()
+        doc["created_at"] = doc["updated_at"] = now
+        doc["revision"] = revision
+        if content_type == "document":
+            await document_content.prepare(doc, pending=chunks)
+        if content_type == "pigpen":
+            if doc["tai_d"] in tai_ds:
+                raise BatchItemError(400, f"Operator with TAI-D '{doc['tai_d']}' already exists")
+            tai_ds.add(doc["tai_d"])
+            doc["is_canonical"] = False  # User-created operators are NEVER canonical
+            doc["decision_weight"] = 1
+        content_id = doc[id_field]
+        state[(content_type, content_id)] = doc
+        version = version_entry(user, content_type, content_id, doc, "create", f"Created {content_type}: {doc[title_field]}")
+        # insert gets a copy: pymongo adds _id to the document it inserts
+        return spec["collection"], InsertOne(dict(doc)), [version], audit_entry(user, "create", content_type, content_id, doc[title_field], {"batch": True}), content_id
+    
+    content_id = operation.content_id
+    current = state.get((content_type, content_id)) if content_id else None
+    # Deleted content can only be restored
+    if current is None or (operation.op != "restore" and not current.get("is_active", True)):
+        raise BatchItemError(404, f"{content_type} {content_id} not found")
+    if content_type == "pigpen":
+        try:
+            await check_canonical_access(user, current, {"update": "edit"}.get(operation.op, operation.op))
+        except HTTPException as e:
+            raise BatchItemError(e.status_code, e.detail)
+    
+    if operation.op == "update":
+        update = validate_batch_data(spec["update_model"], operation.data)
+        changes = {k: v for k, v in update.model_dump().items() if v is not None}
+        changes["updated_at"] = now
+        changes["revision"] = revision
+        unset = await document_content.prepare(changes, pending=chunks) if content_type == "document" else {}
+        audit_details = {"changes": list(changes.keys()), "batch": True}
+    elif operation.op == "delete":
+        changes, unset = soft_delete_fields(revision), {}
+        audit_details = {"batch": True}
+    else:
+        changes, unset = {"is_active": True, "updated_at": now, "revision": revision}, {}
+        audit_details = {"batch": True}
+    
+    updated = {field: value for field, value in {**current, **changes}.items() if field not in unset}
+    state[(content_type, content_id)] = updated
+    title = updated.get(title_field)
+    if operation.op == "update":
+        versions = [
+            version_entry(user, content_type, content_id, current, "update", f"Before update: {current.get(title_field)}"),
+            version_entry(user, content_type, content_id, updated, "update", f"Updated {content_type}: {title}"),
+        ]
+    elif operation.op == "delete":
+        versions = [version_entry(user, content_type, content_id, current, "delete", f"Deleted {content_type}: {title}")]
+    else:
+        versions = [version_entry(user, content_type, content_id, updated, "restore", f"Restored {content_type}: {title}")]
+    write = UpdateOne({id_field: content_id}, update_operators(changes, unset))
+    return spec["collection"], write, versions, audit_entry(user, operation.op, content_type, content_id, title, audit_details), content_id
+
+async def apply_batch_writes(chunks: dict, writes: Dict[str, list], versions: List[dict], audits: List[dict], session=None):
+    for sha256, data in chunks.items():
+        await document_content.put(data, sha256, session=session)
+    for collection, ops in writes.items():
+        await db[collection].bulk_write(ops, ordered=True, session=session)
+    await db.content_versions.insert_many(versions, session=session)
+    await db.audit_log.insert_many(audits, session=session)
+
+@api_router.post("/batch")
+async def batch_mutations(batch: BatchRequest, request: Request):
+    """Apply create/update/delete/restore operations across content types atomically.
+    
+    Operations run in order, so later items see earlier ones (e.g. update then
+    delete the same term). Every item is checked before anything is written;
+    if any fails the batch is rejected with per-item results and nothing changes.
+    A standalone mongod has no transactions, so it only accepts single-item batches.
+    """
+    user = await require_editor(request)
+    if not batch.operations:
+        raise HTTPException(status_code=400, detail="No operations")
+    if len(batch.operations) > BATCH_MAX_OPERATIONS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_OPERATIONS} operations per batch")
+    # Without transactions a failure part-way through would leave some items applied
+    replicated = await is_replicated_deployment()
+    if len(batch.operations) > 1 and not replicated:
+        raise HTTPException(status_code=503, detail="Batches of more than one operation require a MongoDB replica set")
+    
+    state, tai_ds = await asyncio.gather(load_batch_targets(batch.operations), taken_tai_ds(batch.operations))
+    now = datetime.now(timezone.utc).isoformat()
+    revisions = await next_revisions(db, len(batch.operations))
+    writes: Dict[str, list] = {}
+    chunks: Dict[str, bytes] = {}
+    versions, audits, results = [], [], []
+    failed = False
+    for index, operation in enumerate(batch.operations):
+        result = {"index": index, "op": operation.op, "content_type": operation.content_type, "content_id": operation.content_id}
+        try:
+            collection, write, item_versions, audit, content_id = await plan_batch_operation(user, operation, state, tai_ds, now, revisions[index], chunks)
+        except BatchItemError as e:
+            failed = True
+            results.append({**result, "status": e.status_code, "detail": e.detail})
+            continue
+        writes.setdefault(collection, []).append(write)
+        versions.extend(item_versions)
+        audits.append(audit)
+        results.append({**result, "content_id": content_id, "status": 200})
+    
+    if failed:
+        raise HTTPException(status_code=400, detail={"message": "Batch rejected; no changes were applied", "results": results})
+    
+    if replicated:
+        async with await client.start_session() as session:
+            # with_transaction retries transient errors and unknown commit results
+            await session.with_transaction(lambda session: apply_batch_writes(chunks, writes, versions, audits, session))
+    else:
+        await apply_batch_writes(chunks, writes, versions, audits)
+    
+    for collection in writes:
+        response_cache.invalidate(collection)
+    return {"applied": len(results), "results": results}
+
+# ============== Delta Sync ==============
+# Every content write stamps a global, monotonic revision (see revisions.py),
+# so clients holding an older copy fetch only what changed since.
+
+SYNC_MAX_ROWS = int(os.environ.get("SYNC_MAX_ROWS", "1000"))
+# Revisions are reserved just before the write lands, so a lower revision can
+# appear after a higher one has been read. Rows changed this recently are
+# returned, but the cursor does not move past them until they settle.
+SYNC_SETTLE_SECONDS = float(os.environ.get("SYNC_SETTLE_SECONDS", "5"))
+
+@api_router.get("/sync")
+async def sync_changes(since: int = Query(0, ge=0), types: Optional[str] = None, limit: int = Query(500, ge=1)):
+    """Content created, updated or deleted after revision `since`.
+    
+    Rows come back whole. Deleted ones come back as just their id,
+    is_active false and revision, so clients can drop them. Pass the returned revision as the next `since` and keep
+    going while has_more is true; since=0 returns everything.
+    """
+    content_types = parse_content_types(types) or set(CONTENT_TYPES)
+    settled_before = (datetime.now(timezone.utc) - timedelta(seconds=SYNC_SETTLE_SECONDS)).isoformat()
+    page = await changes_since(
+        db, {content_type: CONTENT_COLLECTIONS[content_type] for content_type in content_types},
+        since, min(limit, SYNC_MAX_ROWS), settled_before,
+        id_fields={content_type: CONTENT_TYPES[content_type]["id_field"] for content_type in content_types}
+    )
+    return {"since": since, **page}
+
+# ============== Change Feed ==============
+# One change stream per worker fans content changes out to SSE clients and
+# invalidates this worker's response cache for writes made on other workers.
+
+CHANGE_FEED_ENABLED = os.environ.get("CHANGE_FEED_ENABLED", "1") == "1"
+CHANGE_FEED_KEEPALIVE_SECONDS = float(os.environ.get("CHANGE_FEED_KEEPALIVE_SECONDS", "15"))
+
+change_feed = ChangeFeedHub(
+    db,
+    CONTENT_TYPES,
+    buffer_size=int(os.environ.get("CHANGE_FEED_BUFFER_SIZE", "1000")),
+    queue_size=int(os.environ.get("CHANGE_FEED_QUEUE_SIZE", "100")),
+    on_reset=lambda reason: CHANGE_FEED_RESETS.labels(reason=reason).inc(),
+)
+
+def invalidate_cached_collections(collections):
+    for collection in collections:
+        response_cache.invalidate(collection)
+
+change_feed.listeners.append(invalidate_cached_collections)
+
+@api_router.get("/changes/stream")
+async def stream_changes(request: Request, types: Optional[str] = None, last_event_id: Optional[str] = None):
+    """Server-sent events for content changes, optionally filtered by content type.
+    
+    Reconnecting clients resume after Last-Event-ID (header, or the
+    last_event_id query parameter for clients that cannot set headers).
+    """
+    if not change_feed.running:
+        raise HTTPException(status_code=503, detail="Change feed unavailable (requires a MongoDB replica set)")
+    
+    content_types = parse_content_types(types)
+    resume_from = request.headers.get("last-event-id") or last_event_id
+    
+    async def counted(messages):
+        CHANGE_FEED_SUBSCRIBERS.inc()
+        try:
+            async for message in messages:
+                yield message
+        finally:
+            CHANGE_FEED_SUBSCRIBERS.dec()
+    
+    return StreamingResponse(
+        counted(change_feed.stream(content_types, resume_from, CHANGE_FEED_KEEPALIVE_SECONDS)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # ============== Chat Routes ==============
 
 SYSTEM_MESSAGE = """You are GARVIS AI, the sovereign intelligence assistant for the GoGarvis Full Stack architecture. You are knowledgeable about:
@@ -990,69 +1713,286 @@ def is_image_file(filename: str) -> bool:
     """Check if file is an image"""
     return filename.lower().endswith(('.png', '.jpg', '.jpeg', '.webp'))
 
-# ============== File Upload Routes ==============
+# Only the fields needed to build the LLM message
+CHAT_ATTACHMENT_PROJECTION = {"_id": 0, "file_id": 1, "filename": 1, "storage_key": 1, "path": 1, "is_image": 1, "extracted_text": 1}
 
-@api_router.post("/chat/upload", response_model=List[FileUploadResponse])
-async def upload_files(files: List[UploadFile] = File(...)):
-    """Upload multiple files for chat context"""
-    results = []
-    
-    for file in files:
-        # Validate file extension
-        allowed_extensions = ('.png', '.jpg', '.jpeg', '.webp', '.pdf', '.txt', '.md')
-        if not file.filename.lower().endswith(allowed_extensions):
-            raise HTTPException(
-                status_code=400, 
-                detail=f"File type not allowed: {file.filename}. Allowed: {allowed_extensions}"
-            )
+# Uploads made before storage.py record a flat `path` until `python storage.py migrate` runs
+
+async def read_upload_blob(file_doc: dict) -> bytes:
+    """Read an upload's bytes, raising FileNotFoundError if the blob is gone"""
+    if "storage_key" in file_doc:
+        return await storage.get(file_doc["storage_key"])
+    return await asyncio.to_thread(Path(file_doc["path"]).read_bytes)
+
+async def delete_upload_blob(file_doc: dict) -> bool:
+    """Remove an upload's bytes, returning False if they were already gone"""
+    if "storage_key" in file_doc:
+        return await storage.delete(file_doc["storage_key"])
+    try:
+        await asyncio.to_thread(Path(file_doc["path"]).unlink)
+    except FileNotFoundError:
+        return False
+    return True
+
+async def resolve_chat_attachments(file_ids: List[str]):
+    """Resolve chat attachments with a single query and concurrent image reads.
+
+    Returns (document_context, image_contents, errors) in request order.
+    """
+    file_ids = list(dict.fromkeys(file_ids))
+    file_docs = await db.chat_files.find(
+        {"file_id": {"$in": file_ids}}, CHAT_ATTACHMENT_PROJECTION
+    ).to_list(len(file_ids))
+    docs_by_id = {d["file_id"]: d for d in file_docs}
+    
+    image_ids = [fid for fid in file_ids if fid in docs_by_id and docs_by_id[fid].get("is_image")]
+    image_reads = await asyncio.gather(
+        *(read_upload_blob(docs_by_id[fid]) for fid in image_ids),
+        return_exceptions=True
+    )
+    image_data_by_id = dict(zip(image_ids, image_reads))
+    
+    document_context = []
+    image_contents = []
+    errors = []
+    for file_id in file_ids:
+        file_doc = docs_by_id.get(file_id)
+        if not file_doc:
+            errors.append(AttachmentError(file_id=file_id, reason="not_found"))
+            continue
         
-        # Read file content
-        content = await file.read()
+        if file_doc.get("is_image"):
+            image_data = image_data_by_id[file_id]
+            if isinstance(image_data, FileNotFoundError):
+                errors.append(AttachmentError(file_id=file_id, reason="missing_blob"))
+            elif isinstance(image_data, Exception):
+                logger.error(f"Attachment read error for {file_id}: {image_data}")
+                errors.append(AttachmentError(file_id=file_id, reason="read_error"))
+            else:
+                image_base64 = base64.b64encode(image_data).decode('utf-8')
+                image_contents.append(ImageContent(image_base64=image_base64))
+        elif file_doc.get("extracted_text"):
+            # Add document text to context
+            document_context.append(f"[Document: {file_doc['filename']}]\n{file_doc['extracted_text']}")
+    
+    return document_context, image_contents, errors
+
+async def extract_pdf_text_with_progress(file_content: bytes, on_page=None) -> str:
+    """Extract PDF text page by page off the event loop, reporting progress"""
+    try:
+        pdf_reader = await asyncio.to_thread(PyPDF2.PdfReader, io.BytesIO(file_content))
+        total_pages = len(pdf_reader.pages)
+        text = ""
+        for page_number, page in enumerate(pdf_reader.pages, start=1):
+            text += await asyncio.to_thread(page.extract_text) or ""
+            if on_page:
+                await on_page(page_number, total_pages)
+        return text.strip()
+    except Exception as e:
+        logger.error(f"PDF extraction error: {e}")
+        return ""
+
+ALLOWED_UPLOAD_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp', '.pdf', '.txt', '.md')
+
+async def read_validated_upload(file: UploadFile) -> bytes:
+    """Validate an uploaded file's type and size and return its content"""
+    if not file.filename.lower().endswith(ALLOWED_UPLOAD_EXTENSIONS):
+        raise HTTPException(
+            status_code=400, 
+            detail=f"File type not allowed: {file.filename}. Allowed: {ALLOWED_UPLOAD_EXTENSIONS}"
+        )
+    
+    content = await file.read()
+    
+    if len(content) > MAX_FILE_SIZE:
+        raise HTTPException(
+            status_code=400, 
+            detail=f"File too large: {file.filename}. Max size: 50MB"
+        )
+    return content
+
+async def process_upload(file_id: str, filename: str, content: bytes, user_id: Optional[str] = None, on_page=None) -> FileUploadResponse:
+    """Extract text from a stored upload and record its metadata"""
+    extracted_text = None
+    kind = "image" if is_image_file(filename) else "pdf" if filename.lower().endswith('.pdf') else "text"
+    UPLOAD_SIZE.labels(kind).observe(len(content))
+    if kind != "image":
+        started = time.perf_counter()
+        if kind == "pdf":
+            extracted_text = await extract_pdf_text_with_progress(content, on_page)
+        else:
+            extracted_text = extract_text_from_file(content, filename)
+        UPLOAD_EXTRACTION_LATENCY.labels(kind).observe(time.perf_counter() - started)
+        if extracted_text and len(extracted_text) > 10000:
+            extracted_text = extracted_text[:10000] + "... [truncated]"
+    
+    # Store file metadata in DB
+    file_doc = {
+        "file_id": file_id,
+        "filename": filename,
+        "file_type": get_mime_type(filename),
+        "size": len(content),
+        "sha256": await asyncio.to_thread(lambda: hashlib.sha256(content).hexdigest()),
+        "storage_key": file_id,
+        "is_image": is_image_file(filename),
+        "extracted_text": extracted_text,
+        "user_id": user_id,
+        "uploaded_at": datetime.now(timezone.utc).isoformat()
+    }
+    # An upload job taken over from a worker that died may already have its row
+    await db.chat_files.replace_one({"file_id": file_id}, file_doc, upsert=True)
+    
+    return FileUploadResponse(
+        file_id=file_id,
+        filename=filename,
+        file_type=get_mime_type(filename),
+        size=len(content),
+        extracted_text=extracted_text[:500] + "..." if extracted_text and len(extracted_text) > 500 else extracted_text
+    )
+
+# ============== Upload Jobs ==============
+# Async uploads are staged in blob storage and processed by a bounded worker pool.
+# Job state lives in db.upload_jobs so any API worker can answer status polls,
+# and jobs of a worker that dies are picked up by another (see upload_jobs.py).
+
+UPLOAD_WORKERS = int(os.environ.get("UPLOAD_WORKERS", "4"))
+# Jobs one API worker will hold, queued or running, before refusing uploads
+UPLOAD_QUEUE_LIMIT = int(os.environ.get("UPLOAD_QUEUE_LIMIT", "64"))
+UPLOAD_PROGRESS_INTERVAL = 0.5  # seconds between progress writes
+UPLOAD_JOB_HEARTBEAT_SECONDS = 30
+UPLOAD_JOB_MAX_ATTEMPTS = 3
+upload_worker_slots = asyncio.Semaphore(UPLOAD_WORKERS)
+upload_job_tasks = set()
+
+async def run_upload_job(job_id: str):
+    """Process one queued upload inside the worker pool"""
+    async with upload_worker_slots:
+        job = await upload_jobs.start_job(db, job_id)
+        if job is None:
+            return
+        last_write = 0.0
         
-        # Validate file size
-        if len(content) > MAX_FILE_SIZE:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"File too large: {file.filename}. Max size: 50MB"
-            )
+        async def on_page(pages_processed: int, total_pages: int):
+            nonlocal last_write
+            now = asyncio.get_running_loop().time()
+            if pages_processed == total_pages or now - last_write >= UPLOAD_PROGRESS_INTERVAL:
+                last_write = now
+                await upload_jobs.update_job(db, job_id, pages_processed=pages_processed, total_pages=total_pages)
         
-        # Generate file ID and save
+        try:
+            content = await storage.get(job["file_id"])
+            result = await process_upload(job["file_id"], job["filename"], content, job.get("user_id"), on_page)
+            await upload_jobs.update_job(db, job_id, status="completed", result=result.model_dump())
+        except Exception as e:
+            logger.error(f"Upload job {job_id} failed: {e}")
+            await upload_jobs.update_job(db, job_id, status="failed", error=str(e))
+
+def start_upload_job(job_id: str):
+    task = asyncio.create_task(run_upload_job(job_id))
+    upload_job_tasks.add(task)
+    task.add_done_callback(upload_job_tasks.discard)
+
+async def maintain_upload_jobs():
+    """Renew this worker's lease and take over jobs of workers that died"""
+    ttl = UPLOAD_JOB_HEARTBEAT_SECONDS * 3
+    await upload_jobs.heartbeat(db, ttl)
+    claimed = await upload_jobs.claim_abandoned_jobs(db, UPLOAD_QUEUE_LIMIT - len(upload_job_tasks), ttl, UPLOAD_JOB_MAX_ATTEMPTS)
+    if claimed:
+        logger.info(f"Requeued {len(claimed)} interrupted upload jobs")
+    for job_id in claimed:
+        start_upload_job(job_id)
+
+# ============== File Upload Routes ==============
+
+@api_router.post("/chat/upload", response_model=List[FileUploadResponse])
+async def upload_files(request: Request, files: List[UploadFile] = File(...), mode: str = Query("sync", pattern="^(sync|async)$")):
+    """Upload multiple files for chat context.
+    
+    With mode=async the files are stored and queued, and the response is a 202
+    with one job per file; poll /chat/upload/jobs/{job_id} for the result.
+    """
+    # Uploads stay anonymous without a session; the owner is used for quotas
+    user = await get_current_user(request)
+    user_id = user.user_id if user else None
+    # RateLimitMiddleware took the first token before the body was read
+    await rate_limiter.check(request, "upload", user_id, cost=len(files) - 1)
+    if mode == "async" and len(upload_job_tasks) + len(files) > UPLOAD_QUEUE_LIMIT:
+        raise HTTPException(
+            status_code=503,
+            detail="Upload queue is full, try again shortly",
+            headers={"Retry-After": str(UPLOAD_JOB_HEARTBEAT_SECONDS)}
+        )
+    
+    # Validate every file before storing any of them
+    contents = [await read_validated_upload(file) for file in files]
+    
+    if mode == "async":
+        jobs = []
+        now = datetime.now(timezone.utc).isoformat()
+        for file, content in zip(files, contents):
+            file_id = str(uuid.uuid4())
+            job_id = str(uuid.uuid4())
+            await storage.put(file_id, content)
+            job = {
+                "job_id": job_id,
+                "file_id": file_id,
+                "filename": file.filename,
+                "size": len(content),
+                "user_id": user_id,
+                "worker": HOLDER,
+                "attempts": 0,
+                "status": "queued",
+                "pages_processed": 0,
+                "total_pages": None,
+                "result": None,
+                "error": None,
+                "created_at": now,
+                "updated_at": now
+            }
+            await db.upload_jobs.insert_one(job)
+            start_upload_job(job_id)
+            jobs.append({"job_id": job_id, "file_id": file_id, "filename": file.filename, "status": "queued"})
+        return JSONResponse(status_code=202, content={"jobs": jobs})
+    
+    results = []
+    for file, content in zip(files, contents):
         file_id = str(uuid.uuid4())
-        file_path = UPLOAD_DIR / f"{file_id}_{file.filename}"
-        
-        with open(file_path, 'wb') as f:
-            f.write(content)
-        
-        # Extract text for documents
-        extracted_text = None
-        if not is_image_file(file.filename):
-            extracted_text = extract_text_from_file(content, file.filename)
-            if extracted_text and len(extracted_text) > 10000:
-                extracted_text = extracted_text[:10000] + "... [truncated]"
-        
-        # Store file metadata in DB
-        file_doc = {
-            "file_id": file_id,
-            "filename": file.filename,
-            "file_type": get_mime_type(file.filename),
-            "size": len(content),
-            "path": str(file_path),
-            "is_image": is_image_file(file.filename),
-            "extracted_text": extracted_text,
-            "uploaded_at": datetime.now(timezone.utc).isoformat()
-        }
-        await db.chat_files.insert_one(file_doc)
-        
-        results.append(FileUploadResponse(
-            file_id=file_id,
-            filename=file.filename,
-            file_type=get_mime_type(file.filename),
-            size=len(content),
-            extracted_text=extracted_text[:500] + "..." if extracted_text and len(extracted_text) > 500 else extracted_text
-        ))
+        await storage.put(file_id, content)
+        results.append(await process_upload(file_id, file.filename, content, user_id))
     
     return results
 
+@api_router.get("/chat/upload/jobs/{job_id}")
+async def get_upload_job(job_id: str):
+    """Get the status of an async upload job"""
+    job = await db.upload_jobs.find_one({"job_id": job_id}, upload_jobs.PUBLIC_PROJECTION)
+    if not job:
+        raise HTTPException(status_code=404, detail="Upload job not found")
+    return job
+
+@api_router.get("/chat/upload/jobs/{job_id}/events")
+async def stream_upload_job(job_id: str, request: Request):
+    """Server-sent events reporting upload job progress until it finishes"""
+    job = await db.upload_jobs.find_one({"job_id": job_id}, upload_jobs.PUBLIC_PROJECTION)
+    if not job:
+        raise HTTPException(status_code=404, detail="Upload job not found")
+    
+    async def events():
+        current = job
+        last_sent = None
+        while True:
+            state = (current["status"], current.get("pages_processed"), current.get("total_pages"))
+            if state != last_sent:
+                last_sent = state
+                event = current["status"] if current["status"] in upload_jobs.TERMINAL_STATES else "progress"
+                yield f"event: {event}\ndata: {json.dumps(current)}\n\n"
+            if current["status"] in upload_jobs.TERMINAL_STATES or await request.is_disconnected():
+                return
+            await asyncio.sleep(UPLOAD_PROGRESS_INTERVAL)
+            current = await db.upload_jobs.find_one({"job_id": job_id}, upload_jobs.PUBLIC_PROJECTION) or current
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
 @api_router.get("/chat/files/{file_id}")
 async def get_file_info(file_id: str):
     """Get file metadata"""
@@ -1061,6 +2001,44 @@ async def get_file_info(file_id: str):
         raise HTTPException(status_code=404, detail="File not found")
     return file_doc
 
+@api_router.api_route("/chat/files/{file_id}/download", methods=["GET", "HEAD"])
+async def download_file(file_id: str, request: Request):
+    """Download an uploaded file (supports Range and conditional requests)"""
+    file_doc = await db.chat_files.find_one({"file_id": file_id}, {"_id": 0, "extracted_text": 0})
+    if not file_doc:
+        raise HTTPException(status_code=404, detail="File not found")
+    
+    filename = file_doc["filename"]
+    media_type = file_doc.get("file_type") or get_mime_type(filename)
+    if "storage_key" in file_doc:
+        local_path = storage.local_path(file_doc["storage_key"])
+    else:
+        local_path = Path(file_doc["path"])
+    
+    if local_path is None:
+        # Remote storage: let the client fetch (and range-request) the object directly
+        url = storage.presigned_url(file_doc["storage_key"], filename, media_type)
+        if url:
+            return RedirectResponse(url, status_code=307)
+        try:
+            data = await read_upload_blob(file_doc)
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="File content missing")
+        sha256 = file_doc.get("sha256") or hashlib.sha256(data).hexdigest()
+        return bytes_response(request, data, sha256, media_type, filename, UPLOAD_CACHE_CONTROL)
+    
+    try:
+        if file_doc.get("sha256"):
+            size = (await asyncio.to_thread(local_path.stat)).st_size
+            sha256 = file_doc["sha256"]
+        else:
+            # Uploads stored before hashing was added: hash once and remember it
+            size, sha256 = await hashed_file_stat(local_path)
+            await db.chat_files.update_one({"file_id": file_id}, {"$set": {"sha256": sha256}})
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="File content missing")
+    return file_response(request, local_path, size, sha256, media_type, filename, UPLOAD_CACHE_CONTROL)
+
 @api_router.delete("/chat/files/{file_id}")
 async def delete_file(file_id: str):
     """Delete uploaded file"""
@@ -1068,19 +2046,176 @@ async def delete_file(file_id: str):
     if not file_doc:
         raise HTTPException(status_code=404, detail="File not found")
     
-    # Delete file from disk
-    file_path = Path(file_doc["path"])
-    if file_path.exists():
-        file_path.unlink()
+    # Delete file from storage
+    await delete_upload_blob(file_doc)
     
     # Delete from DB
     await db.chat_files.delete_one({"file_id": file_id})
     return {"message": "File deleted", "file_id": file_id}
 
+# ============== Upload Janitor ==============
+
+async def collect_upload_garbage() -> dict:
+    return await collect_garbage(
+        db,
+        delete_upload_blob,
+        grace_period=timedelta(hours=UPLOAD_GC_GRACE_HOURS),
+        user_quota_bytes=UPLOAD_USER_QUOTA_MB * 1024 * 1024,
+        global_quota_bytes=UPLOAD_GLOBAL_QUOTA_MB * 1024 * 1024,
+        batch_size=UPLOAD_GC_BATCH_SIZE,
+        storage=storage
+    )
+
+@api_router.post("/admin/uploads/gc")
+async def run_upload_gc(request: Request):
+    """Run the upload janitor now and report reclaimed space (admin only)"""
+    await require_admin(request)
+    return await collect_upload_garbage()
+
+# ============== Spec Retrieval ==============
+
+async def refresh_spec_index() -> dict:
+    """Incrementally index the spec PDFs and document content.
+    
+    Content is loaded only for documents whose indexed copy is out of date:
+    offloaded content when its hash differs, inline content when the row has
+    been written since it was indexed.
+    """
+    documents = await db.documents.find(
+        {"is_active": True}, {"_id": 0, "doc_id": 1, "title": 1, "filename": 1, "revision": 1, "content_hash": 1, "content_size": 1}
+    ).to_list(None)
+    indexed = await asyncio.to_thread(spec_index.document_versions)
+    stale_inline = []
+    for doc in documents:
+        indexed_hash, indexed_revision = indexed.get(doc["doc_id"], (None, None))
+        if "content_hash" in doc:
+            if indexed_hash != doc["content_hash"]:
+                await document_content.inline(doc)
+        elif indexed_hash and doc.get("revision") is not None and indexed_revision == doc.get("revision"):
+            # Unchanged since it was indexed; the hash stands in for the content
+            doc["content_hash"] = indexed_hash
+        else:
+            stale_inline.append(doc)
+    if stale_inline:
+        contents = await db.documents.find(
+            {"doc_id": {"$in": [doc["doc_id"] for doc in stale_inline]}}, {"_id": 0, "doc_id": 1, "content": 1}
+        ).to_list(None)
+        by_id = {row["doc_id"]: row.get("content") for row in contents}
+        for doc in stale_inline:
+            doc["content"] = by_id.get(doc["doc_id"])
+    report = await asyncio.to_thread(spec_index.sync, DOCS_PATH, documents)
+    logger.info(f"Spec index refreshed: {report}")
+    return report
+
+async def retrieve_spec_context(question: str):
+    """Return (context_text, citations) for the passages most relevant to a question"""
+    if SPEC_CONTEXT_PASSAGES <= 0:
+        return None, []
+    try:
+        passages = await asyncio.to_thread(spec_index.search, question, SPEC_CONTEXT_PASSAGES)
+    except Exception as e:
+        logger.error(f"Spec retrieval error: {e}")
+        return None, []
+    if not passages:
+        return None, []
+    
+    citations = []
+    excerpts = []
+    for i, passage in enumerate(passages, start=1):
+        citation = Citation(index=i, title=passage["title"], source_id=passage["source_id"], page=passage["page"])
+        citations.append(citation)
+        location = f", p. {citation.page}" if citation.page else ""
+        excerpts.append(f"[{i}] {citation.title}{location}\n{passage['text']}")
+    context_text = (
+        "Relevant excerpts from the GoGarvis specifications. Ground your answer in them "
+        "and cite them as [n] where used:\n\n" + "\n\n".join(excerpts)
+    )
+    return context_text, citations
+
+@api_router.post("/admin/spec-index/refresh")
+async def run_spec_index_refresh(request: Request):
+    """Re-index changed spec PDFs and documents now (admin only)"""
+    await require_admin(request)
+    return await refresh_spec_index()
+
+# ============== Profiling ==============
+# Sampling profiles of live traffic for admins; see profiler.py. Sessions live
+# in the worker that started them, so profiling needs a single API worker.
+
+profiler = Profiler()
+
+async def require_single_worker():
+    workers = await upload_jobs.live_worker_count(db)
+    if workers > 1:
+        raise HTTPException(status_code=409, detail=f"Profiling needs a single API worker; {workers} are running")
+
+def render_profile(session, output_format: str):
+    rendered = session.render(output_format)
+    if output_format == "collapsed":
+        return PlainTextResponse(rendered, headers={"X-Profile-Session": session.session_id})
+    return rendered
+
+@api_router.post("/admin/profile")
+async def profile_process(
+    request: Request,
+    seconds: float = Query(10, gt=0, le=120),
+    interval_ms: float = Query(5, ge=1, le=1000),
+    format: str = Query("speedscope", pattern="^(collapsed|speedscope)$"),
+    memory: bool = False
+):
+    """Sample every thread for the given time and return the profile (admin only)"""
+    await require_admin(request)
+    await require_single_worker()
+    try:
+        session = await profiler.profile_for(seconds, interval_ms / 1000, memory)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return render_profile(session, format)
+
+@api_router.post("/admin/profile/requests")
+async def profile_requests(
+    request: Request,
+    route: str = Query(..., description="Glob matched against 'METHOD /path' or '/path', e.g. 'POST /api/chat*'"),
+    count: int = Query(10, ge=1, le=1000),
+    interval_ms: float = Query(2, ge=1, le=1000),
+    timeout_seconds: float = Query(300, gt=0, le=3600),
+    memory: bool = False
+):
+    """Profile the next `count` requests matching a route (admin only)"""
+    await require_admin(request)
+    await require_single_worker()
+    try:
+        session = profiler.arm(route, count, interval_ms / 1000, memory, timeout_seconds)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return session.summary()
+
+@api_router.get("/admin/profile/{session_id}")
+async def get_profile(request: Request, session_id: str, format: str = Query("speedscope", pattern="^(collapsed|speedscope)$")):
+    """Status of a profile session, with its profile once finished (admin only)"""
+    await require_admin(request)
+    session = profiler.sessions.get(session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Profile session not found")
+    if session.status == "running":
+        return session.summary()
+    return render_profile(session, format)
+
+@api_router.delete("/admin/profile/{session_id}")
+async def stop_profile(request: Request, session_id: str, format: str = Query("speedscope", pattern="^(collapsed|speedscope)$")):
+    """Stop a running profile session early and return what it sampled (admin only)"""
+    await require_admin(request)
+    session = await profiler.stop(session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Profile session not found")
+    return render_profile(session, format)
+
 # ============== Chat Routes ==============
 
 @api_router.post("/chat", response_model=ChatResponse)
-async def chat_with_garvis(request_body: ChatRequest):
+async def chat_with_garvis(request_body: ChatRequest, request: Request):
+    user = await get_current_user(request)
+    await rate_limiter.check(request, "chat", user.user_id if user else None)
     session_id = request_body.session_id or str(uuid.uuid4())
     
     if session_id not in chat_sessions:
@@ -1095,6 +2230,7 @@ async def chat_with_garvis(request_body: ChatRequest):
         ).with_model("openai", "gpt-5.2")
         
         chat_sessions[session_id] = chat
+        CHAT_SESSIONS.set(len(chat_sessions))
     
     chat = chat_sessions[session_id]
     
@@ -1102,32 +2238,22 @@ async def chat_with_garvis(request_body: ChatRequest):
         # Build message with file attachments
         message_text = request_body.message
         image_contents = []
+        attachment_errors = []
+        context_sections = []
+        
+        spec_context, citations = await retrieve_spec_context(request_body.message)
+        if spec_context:
+            context_sections.append(spec_context)
         
         if request_body.file_ids:
-            document_context = []
-            
-            for file_id in request_body.file_ids:
-                file_doc = await db.chat_files.find_one({"file_id": file_id})
-                if not file_doc:
-                    continue
-                
-                if file_doc.get("is_image"):
-                    # Load image and convert to base64
-                    file_path = Path(file_doc["path"])
-                    if file_path.exists():
-                        with open(file_path, 'rb') as f:
-                            image_data = f.read()
-                        image_base64 = base64.b64encode(image_data).decode('utf-8')
-                        image_contents.append(ImageContent(image_base64=image_base64))
-                else:
-                    # Add document text to context
-                    if file_doc.get("extracted_text"):
-                        document_context.append(f"[Document: {file_doc['filename']}]\n{file_doc['extracted_text']}")
-            
-            # Prepend document context to message
+            document_context, image_contents, attachment_errors = await resolve_chat_attachments(request_body.file_ids)
             if document_context:
                 context_text = "\n\n".join(document_context)
-                message_text = f"Context from uploaded documents:\n{context_text}\n\nUser question: {request_body.message}"
+                context_sections.append(f"Context from uploaded documents:\n{context_text}")
+        
+        # Prepend retrieved and uploaded context to the message
+        if context_sections:
+            message_text = "\n\n".join(context_sections) + f"\n\nUser question: {request_body.message}"
         
         # Create user message with optional images
         if image_contents:
@@ -1135,7 +2261,8 @@ async def chat_with_garvis(request_body: ChatRequest):
         else:
             user_message = UserMessage(text=message_text)
         
-        response = await chat.send_message(user_message)
+        with observe_llm_call("chat"):
+            response = await chat.send_message(user_message)
         
         # Store chat history with file references
         await db.chat_history.insert_one({
@@ -1152,7 +2279,7 @@ async def chat_with_garvis(request_body: ChatRequest):
             "timestamp": datetime.now(timezone.utc).isoformat()
         })
         
-        return ChatResponse(response=response, session_id=session_id)
+        return ChatResponse(response=response, session_id=session_id, attachment_errors=attachment_errors, citations=citations)
     except Exception as e:
         logger.error(f"Chat error: {e}")
         raise HTTPException(status_code=500, detail=f"Chat error: {str(e)}")
@@ -1160,24 +2287,23 @@ async def chat_with_garvis(request_body: ChatRequest):
 @api_router.get("/chat/history/{session_id}")
 async def get_chat_history(session_id: str):
     messages = await db.chat_history.find({"session_id": session_id}, {"_id": 0}).sort("timestamp", 1).to_list(100)
-    return {"messages": messages, "session_id": session_id}
+    return RawJSONResponse(json_bytes({"messages": messages, "session_id": session_id}))
 
 @api_router.delete("/chat/session/{session_id}")
 async def clear_chat_session(session_id: str):
     if session_id in chat_sessions:
         del chat_sessions[session_id]
+        CHAT_SESSIONS.set(len(chat_sessions))
     await db.chat_history.delete_many({"session_id": session_id})
     return {"message": "Session cleared", "session_id": session_id}
 
 # ============== Dashboard Stats ==============
 
-@api_router.get("/dashboard/stats")
-async def get_dashboard_stats():
-    doc_count = await db.documents.count_documents({"is_active": True})
-    term_count = await db.glossary_terms.count_documents({"is_active": True})
-    component_count = await db.components.count_documents({"is_active": True})
-    operator_count = await db.pigpen_operators.count_documents({"is_active": True})
-    brand_count = await db.brand_profiles.count_documents({"is_active": True})
+async def dashboard_payload() -> dict:
+    doc_count, term_count, component_count, operator_count, brand_count = await asyncio.gather(*(
+        db[collection].count_documents({"is_active": True})
+        for collection in ("documents", "glossary_terms", "components", "pigpen_operators", "brand_profiles")
+    ))
     
     return {
         "total_documents": doc_count,
@@ -1190,6 +2316,84 @@ async def get_dashboard_stats():
         "authority_chain": "INTACT"
     }
 
+@api_router.get("/dashboard/stats")
+async def get_dashboard_stats(request: Request):
+    return await response_cache.response(request, ("dashboard",), list(CONTENT_COLLECTIONS.values()), dashboard_payload)
+
+# ============== Bootstrap ==============
+# Everything the first screen needs in one round trip. Sections are read
+# concurrently from the response cache, sharing entries with the standalone
+# endpoints, and spliced together as already-encoded JSON.
+
+# section -> (collection for field selection, cache tags, cache key and payload
+# for the selected fields); keys match the standalone endpoints'
+BOOTSTRAP_SECTIONS = {
+    "stats": (None, list(CONTENT_COLLECTIONS.values()), lambda fields: ("dashboard",), lambda fields: dashboard_payload()),
+    "components": ("components", ["components"], lambda fields: ("components", fields), components_payload),
+    "documents": ("documents", ["documents"], lambda fields: ("documents", None, None, fields), lambda fields: documents_payload(fields=fields)),
+    "glossary": ("glossary_terms", ["glossary_terms"], lambda fields: ("glossary", None, None, fields), lambda fields: glossary_payload(fields=fields)),
+    "pigpen": ("pigpen_operators", ["pigpen_operators"], lambda fields: ("pigpen", None, fields), lambda fields: pigpen_payload(fields=fields)),
+    "brands": ("brand_profiles", ["brand_profiles"], lambda fields: ("brands", fields), brands_payload),
+}
+BOOTSTRAP_ALL = [*BOOTSTRAP_SECTIONS, "me"]
+
+def parse_bootstrap_fields(fields: Optional[str], sections: List[str]) -> Dict[str, tuple]:
+    """Parse "documents.title,documents.doc_id" into {"documents": ("title", "doc_id")}"""
+    grouped: Dict[str, list] = {}
+    for item in filter(None, (part.strip() for part in (fields or "").split(","))):
+        section, _, field = item.partition(".")
+        # An empty field name would otherwise select every field of the section
+        if not field.strip() or section not in sections or section not in BOOTSTRAP_SECTIONS or not BOOTSTRAP_SECTIONS[section][0]:
+            raise HTTPException(status_code=400, detail=f"Invalid field selector: {item}")
+        grouped.setdefault(section, []).append(field)
+    return {section: parse_fields(",".join(names), BOOTSTRAP_SECTIONS[section][0]) for section, names in grouped.items()}
+
+@api_router.get("/bootstrap")
+async def bootstrap(request: Request, include: Optional[str] = None, fields: Optional[str] = None):
+    """Dashboard stats, catalog lists and the current user in one response.
+    
+    include picks sections (stats, components, documents, glossary, pigpen,
+    brands, me; default all). fields selects list row fields per section, as
+    section.field (e.g. documents.doc_id,documents.title). The ETag changes
+    whenever any included section does.
+    """
+    sections = [section.strip() for section in include.split(",") if section.strip()] if include else BOOTSTRAP_ALL
+    unknown = set(sections) - set(BOOTSTRAP_ALL)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown bootstrap section: {', '.join(sorted(unknown))}")
+    sections = [section for section in BOOTSTRAP_ALL if section in sections]
+    selected_fields = parse_bootstrap_fields(fields, sections)
+    
+    async def section_entry(section: str):
+        _, tags, key, build = BOOTSTRAP_SECTIONS[section]
+        section_fields = selected_fields.get(section)
+        return await response_cache.entry(key(section_fields), tags, lambda: build(section_fields))
+    
+    cached = [section for section in sections if section != "me"]
+    entries = await asyncio.gather(*(section_entry(section) for section in cached))
+    bodies = dict(zip(cached, entries))
+    if "me" in sections:
+        user = await get_current_user(request)
+        me_body = json_bytes(user_summary(user) if user else None)
+    
+    etag = '"' + body_digest(
+        include.encode() if include else b"",
+        (fields or "").encode(),
+        *(entry.digest.encode() for entry in entries),
+        me_body if "me" in sections else b"",
+    ) + '"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache" if "me" in sections else "no-cache"}
+    if "me" in sections:
+        headers["Vary"] = "Cookie, Authorization"
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    
+    parts = []
+    for section in sections:
+        body = me_body if section == "me" else bodies[section].body
+        parts.append(b'"' + section.encode() + b'":' + body)
+    return RawJSONResponse(b"{" + b",".join(parts) + b"}", headers=headers)
+
 # ============== Health & Root ==============
 
 @api_router.get("/")
@@ -1200,9 +2404,31 @@ async def root():
 async def health_check():
     return {"status": "healthy", "timestamp": datetime.now(timezone.utc).isoformat()}
 
+# Closed unless a token or the scrapers' networks are configured. Behind a
+# reverse proxy every client has the proxy's address, so prefer the token.
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+METRICS_ALLOWED_NETWORKS = parse_networks(os.environ.get("METRICS_ALLOWED_NETWORKS", ""))
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    """Prometheus scrape endpoint"""
+    if not scrape_allowed(request.headers.get("authorization"), request.client.host if request.client else None, METRICS_TOKEN, METRICS_ALLOWED_NETWORKS):
+        if METRICS_TOKEN:
+            raise HTTPException(status_code=401, detail="Invalid metrics token", headers={"WWW-Authenticate": "Bearer"})
+        raise HTTPException(status_code=403, detail="Set METRICS_TOKEN or METRICS_ALLOWED_NETWORKS to scrape metrics")
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
 # Include router
 app.include_router(api_router)
 
+async def current_user_id(request: Request) -> Optional[str]:
+    user = await get_current_user(request)
+    return user.user_id if user else None
+
+# Uploads are refused before their (possibly large) bodies are read once the bucket is empty
+app.add_middleware(RateLimitMiddleware, limiter=rate_limiter, routes={("POST", "/api/chat/upload"): "upload"}, identify=current_user_id)
+app.add_middleware(CompressionMiddleware, minimum_size=COMPRESSION_MIN_BYTES)
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -1210,10 +2436,68 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(DbRequestMiddleware, server_timing=SERVER_TIMING)
+app.add_middleware(PrometheusMiddleware)
+app.add_middleware(ProfilingMiddleware, profiler=profiler)
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+background_tasks = []
+
+async def run_periodically(name: str, interval_seconds: float, job, lease: Optional[str] = None):
+    """Run a maintenance job forever, logging (not raising) failures.
+    
+    With a lease name only the worker holding that lease runs the job; the
+    lease outlives one interval so the holder keeps it while it is alive.
+    """
+    while True:
+        try:
+            if lease is None or await acquire_lease(db, lease, interval_seconds * 2):
+                await job()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"{name} failed: {e}")
+        await asyncio.sleep(interval_seconds)
+
+@app.on_event("startup")
+async def prepare_database():
+    await ensure_indexes(db)
+    stamped = await stamp_missing_revisions(db, CONTENT_COLLECTIONS.values())
+    if stamped:
+        logger.info(f"Assigned sync revisions to {stamped} content rows")
+    offloaded = await document_content.offload_inline_content()
+    if offloaded:
+        logger.info(f"Moved large content of {offloaded} documents to chunk storage")
+    if os.environ.get("VERIFY_QUERY_PLANS") == "1":
+        # Diagnostic mode: refuse to start if a hot route would scan a collection
+        verified = await verify_query_plans(db)
+        logger.info(f"Query plans verified for {len(verified)} canonical queries")
+
+@app.on_event("startup")
+async def start_background_tasks():
+    if UPLOAD_GC_INTERVAL_SECONDS > 0:
+        background_tasks.append(asyncio.create_task(run_periodically("Upload janitor", UPLOAD_GC_INTERVAL_SECONDS, collect_upload_garbage, lease="upload-janitor")))
+    if SPEC_INDEX_REFRESH_SECONDS > 0:
+        # The index is a SQLite file on local disk, so one worker per host refreshes it
+        background_tasks.append(asyncio.create_task(run_periodically("Spec index refresh", SPEC_INDEX_REFRESH_SECONDS, refresh_spec_index, lease=f"spec-index:{HOST}")))
+    # Hold the worker lease before queueing uploads; the first run requeues jobs left by dead workers
+    await upload_jobs.heartbeat(db, UPLOAD_JOB_HEARTBEAT_SECONDS * 3)
+    background_tasks.append(asyncio.create_task(run_periodically("Upload job recovery", UPLOAD_JOB_HEARTBEAT_SECONDS, maintain_upload_jobs)))
+
+@app.on_event("startup")
+async def check_replicated_deployment():
+    if await is_replicated_deployment():
+        if CHANGE_FEED_ENABLED:
+            change_feed.start()
+    else:
+        logger.warning("MongoDB is not a replica set: batches of more than one operation are refused and the change feed is disabled")
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    for task in background_tasks:
+        task.cancel()
+    await change_feed.stop()
     client.close()
+    mark_worker_exited()
@@ -0,0 +1,42 @@
+"""Single-flight coalescing of identical concurrent reads.
+
+When a link goes out to a team, hundreds of identical reads can arrive while
+the first one is still querying MongoDB (a cold worker, an expired or
+invalidated cache entry). SingleFlight lets the first caller for a key run
+the work and hands its result, or its exception, to every caller that asks
+for the same key while it is in flight. Nothing is remembered once the call
+finishes; caching is ResponseCache's job.
+
+The work runs in its own task, so a caller that disconnects does not cancel
+it for the others.
+"""
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    def __init__(self, observe: Optional[Callable[[str, bool], None]] = None):
+        self._flights: Dict[Hashable, asyncio.Future] = {}
+        # Called with (label, shared) for every call, e.g. to count coalesced reads
+        self.observe = observe
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]], label: str = "") -> T:
+        """Run fn() for key, or join the run already in flight for it"""
+        flight = self._flights.get(key)
+        shared = flight is not None
+        if flight is None:
+            flight = asyncio.ensure_future(fn())
+            self._flights[key] = flight
+            flight.add_done_callback(lambda done: self._land(key, done))
+        if self.observe:
+            self.observe(label, shared)
+        return await asyncio.shield(flight)
+
+    def _land(self, key: Hashable, flight: asyncio.Future):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if not flight.cancelled():
+            # Mark the exception retrieved even if every caller went away
+            flight.exception()
@@ -0,0 +1,263 @@
+"""Blob storage backends for uploaded files.
+
+Uploads are addressed by key (the file_id). Two backends are available:
+
+- local: files under UPLOAD_DIR, sharded by hash prefix (ab/cd/<key>) so no
+  directory grows past a few thousand entries
+- s3: any S3-compatible service (AWS, MinIO), so several API nodes can share
+  the same uploads
+
+Select one with STORAGE_BACKEND. Run `python storage.py migrate` once to move
+files from the old flat `{file_id}_{filename}` layout into the configured
+backend.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import List, Optional
+
+from file_serving import content_disposition
+
+logger = logging.getLogger(__name__)
+
+
+class BlobStorage(ABC):
+    """Interface shared by the storage backends"""
+
+    name = "base"
+
+    @abstractmethod
+    async def put(self, key: str, data: bytes) -> None:
+        """Store the blob, replacing any blob with the same key"""
+
+    @abstractmethod
+    async def get(self, key: str) -> bytes:
+        """Return the blob, raising FileNotFoundError if it does not exist"""
+
+    @abstractmethod
+    async def delete(self, key: str) -> bool:
+        """Delete the blob, returning False if it did not exist"""
+
+    @abstractmethod
+    async def size(self, key: str) -> Optional[int]:
+        """Return the blob size in bytes, or None if it does not exist"""
+
+    @abstractmethod
+    async def list_keys(self, modified_before: float) -> List[str]:
+        """Keys of the blobs last written before a Unix timestamp"""
+
+    def local_path(self, key: str) -> Optional[Path]:
+        """Filesystem path of the blob when the backend is on local disk"""
+        return None
+
+    def presigned_url(self, key: str, filename: str, media_type: str, expires_in: int = 3600) -> Optional[str]:
+        """Time-limited URL clients can download the blob from directly"""
+        return None
+
+
+class LocalShardedStorage(BlobStorage):
+    name = "local"
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def path_for(self, key: str) -> Path:
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        return self.root / digest[:2] / digest[2:4] / key
+
+    def local_path(self, key: str) -> Optional[Path]:
+        return self.path_for(key)
+
+    def _write(self, key: str, data: bytes):
+        path = self.path_for(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temp file first so readers never see a partial blob
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_name, path)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+
+    async def put(self, key: str, data: bytes) -> None:
+        await asyncio.to_thread(self._write, key, data)
+
+    async def get(self, key: str) -> bytes:
+        return await asyncio.to_thread(self.path_for(key).read_bytes)
+
+    async def delete(self, key: str) -> bool:
+        try:
+            await asyncio.to_thread(self.path_for(key).unlink)
+        except FileNotFoundError:
+            return False
+        return True
+
+    async def size(self, key: str) -> Optional[int]:
+        try:
+            stat = await asyncio.to_thread(self.path_for(key).stat)
+        except FileNotFoundError:
+            return None
+        return stat.st_size
+
+    async def list_keys(self, modified_before: float) -> List[str]:
+        def _list():
+            keys = []
+            for path in self.root.glob("*/*/*"):
+                # Skip half-written temp files; put() renames them into place
+                if path.name.startswith(".tmp-"):
+                    continue
+                try:
+                    if path.stat().st_mtime < modified_before:
+                        keys.append(path.name)
+                except FileNotFoundError:
+                    continue
+            return keys
+        return await asyncio.to_thread(_list)
+
+
+class S3Storage(BlobStorage):
+    name = "s3"
+
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: Optional[str] = None, region: Optional[str] = None):
+        try:
+            import boto3
+            from botocore.exceptions import ClientError
+        except ImportError:
+            raise RuntimeError("STORAGE_BACKEND=s3 requires boto3 (pip install boto3)")
+        self._client_error = ClientError
+        # Credentials come from the standard AWS_ACCESS_KEY_ID / AWS_SECRET_ACCESS_KEY variables
+        self.client = boto3.client("s3", endpoint_url=endpoint_url, region_name=region)
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+
+    def object_key(self, key: str) -> str:
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def _is_missing(self, error) -> bool:
+        return error.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound")
+
+    async def put(self, key: str, data: bytes) -> None:
+        await asyncio.to_thread(self.client.put_object, Bucket=self.bucket, Key=self.object_key(key), Body=data)
+
+    async def get(self, key: str) -> bytes:
+        def _get():
+            try:
+                response = self.client.get_object(Bucket=self.bucket, Key=self.object_key(key))
+            except self._client_error as e:
+                if self._is_missing(e):
+                    raise FileNotFoundError(key)
+                raise
+            return response["Body"].read()
+        return await asyncio.to_thread(_get)
+
+    async def size(self, key: str) -> Optional[int]:
+        def _head():
+            try:
+                return self.client.head_object(Bucket=self.bucket, Key=self.object_key(key))["ContentLength"]
+            except self._client_error as e:
+                if self._is_missing(e):
+                    return None
+                raise
+        return await asyncio.to_thread(_head)
+
+    def presigned_url(self, key: str, filename: str, media_type: str, expires_in: int = 3600) -> Optional[str]:
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params={
+                "Bucket": self.bucket,
+                "Key": self.object_key(key),
+                "ResponseContentType": media_type,
+                "ResponseContentDisposition": content_disposition(filename),
+            },
+            ExpiresIn=expires_in,
+        )
+
+    async def list_keys(self, modified_before: float) -> List[str]:
+        def _list():
+            keys = []
+            prefix = f"{self.prefix}/" if self.prefix else ""
+            for page in self.client.get_paginator("list_objects_v2").paginate(Bucket=self.bucket, Prefix=prefix):
+                for obj in page.get("Contents", []):
+                    if obj["LastModified"].timestamp() < modified_before:
+                        keys.append(obj["Key"][len(prefix):])
+            return keys
+        return await asyncio.to_thread(_list)
+
+    async def delete(self, key: str) -> bool:
+        # S3 deletes succeed for missing keys, so check first to report it
+        if await self.size(key) is None:
+            return False
+        await asyncio.to_thread(self.client.delete_object, Bucket=self.bucket, Key=self.object_key(key))
+        return True
+
+
+def storage_from_env() -> BlobStorage:
+    """Build the storage backend selected by STORAGE_BACKEND"""
+    backend = os.environ.get("STORAGE_BACKEND", "local").lower()
+    if backend == "local":
+        return LocalShardedStorage(Path(os.environ.get("UPLOAD_DIR", "/app/uploads")))
+    if backend == "s3":
+        return S3Storage(
+            bucket=os.environ["S3_BUCKET"],
+            prefix=os.environ.get("S3_PREFIX", "uploads"),
+            endpoint_url=os.environ.get("S3_ENDPOINT_URL") or None,
+            region=os.environ.get("S3_REGION") or None,
+        )
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
+
+
+async def migrate_flat_uploads(db, storage: BlobStorage, batch_size: int = 200) -> dict:
+    """Move uploads recorded with a flat `path` into the storage backend.
+
+    Each chat_files document gains a `storage_key` and loses its `path`; the old
+    file is removed only after the blob has been stored. Safe to re-run.
+    """
+    report = {"migrated": 0, "missing": 0, "bytes": 0}
+    cursor = db.chat_files.find(
+        {"storage_key": {"$exists": False}, "path": {"$exists": True}},
+        {"_id": 0, "file_id": 1, "path": 1},
+    ).batch_size(batch_size)
+    async for file_doc in cursor:
+        old_path = Path(file_doc["path"])
+        try:
+            data = await asyncio.to_thread(old_path.read_bytes)
+        except FileNotFoundError:
+            logger.warning(f"Upload {file_doc['file_id']} has no file at {old_path}")
+            report["missing"] += 1
+            continue
+        await storage.put(file_doc["file_id"], data)
+        await db.chat_files.update_one(
+            {"file_id": file_doc["file_id"]},
+            {"$set": {"storage_key": file_doc["file_id"]}, "$unset": {"path": ""}},
+        )
+        await asyncio.to_thread(old_path.unlink, missing_ok=True)
+        report["migrated"] += 1
+        report["bytes"] += len(data)
+    return report
+
+
+if __name__ == "__main__":
+    import sys
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / ".env")
+    if len(sys.argv) < 2 or sys.argv[1] != "migrate":
+        print("Usage: python storage.py migrate")
+        exit(1)
+
+    async def main():
+        client = AsyncIOMotorClient(os.environ["MONGO_URL"])
+        storage = storage_from_env()
+        report = await migrate_flat_uploads(client[os.environ["DB_NAME"]], storage)
+        print(f"Migrated {report['migrated']} uploads ({report['bytes']} bytes) to {storage.name} storage; {report['missing']} missing")
+        client.close()
+
+    asyncio.run(main())
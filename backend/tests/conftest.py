@@ -0,0 +1,37 @@
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+# Unit tests import the backend modules directly
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(scope="session")
+def server():
+    """server.py loaded by the benchmark harness: mongomock-motor and a stub LLM"""
+    pytest.importorskip("emergentintegrations")
+    import benchmark
+    return benchmark.load_server(use_mongomock=True, llm_latency_ms=0)
+
+
+@pytest.fixture
+async def api(server):
+    """A client for the API on a freshly seeded database, signed in as an editor"""
+    import benchmark
+    from httpx import ASGITransport, AsyncClient
+    from mongomock_motor import AsyncMongoMockClient
+
+    server.client = AsyncMongoMockClient()
+    server.db = server.client["api_test"]
+    server.document_content = server.DocumentContentStore(server.db, server.DOCUMENT_CONTENT_INLINE_MAX_BYTES)
+    server.response_cache = server.ResponseCache(server.RESPONSE_CACHE_TTL_SECONDS, compress_min_size=server.COMPRESSION_MIN_BYTES)
+    state = await benchmark.prepare(server, random.Random(0))
+    async with AsyncClient(transport=ASGITransport(app=server.app), base_url="http://test", headers=state.auth_headers) as client:
+        yield client
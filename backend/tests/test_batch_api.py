@@ -0,0 +1,91 @@
+"""
+API tests for atomic batch mutations (POST /api/batch), on mongomock
+"""
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+TERM = {"term": "Batch Term", "definition": "d", "category": "core"}
+LARGE_DOCUMENT = {"filename": "big.md", "title": "Big", "category": "spec", "description": "d", "content": "x" * 100_000}
+
+
+class FakeSession:
+    """Stands in for a replica-set session: mongomock has no transactions"""
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def with_transaction(self, callback):
+        return await callback(None)
+
+
+@pytest.fixture
+def replicated(server, monkeypatch):
+    async def is_replicated_deployment():
+        return True
+
+    async def start_session():
+        return FakeSession()
+
+    monkeypatch.setattr(server, "is_replicated_deployment", is_replicated_deployment)
+    monkeypatch.setattr(server.client, "start_session", start_session)
+
+
+async def a_term_id(server):
+    return (await server.db.glossary_terms.find_one({"is_active": True}))["term_id"]
+
+
+async def test_standalone_refuses_multi_operation_batches(api, server):
+    operations = [{"op": "create", "content_type": "glossary", "data": TERM}] * 2
+    response = await api.post("/api/batch", json={"operations": operations})
+    assert response.status_code == 503
+    assert await server.db.glossary_terms.count_documents({"term": "Batch Term"}) == 0
+
+
+async def test_standalone_applies_a_single_operation(api, server):
+    response = await api.post("/api/batch", json={"operations": [{"op": "create", "content_type": "glossary", "data": TERM}]})
+    assert response.status_code == 200
+    assert response.json()["applied"] == 1
+    assert await server.db.glossary_terms.count_documents({"term": "Batch Term"}) == 1
+
+
+async def test_one_invalid_item_rejects_the_whole_batch(api, server, replicated):
+    term_id = await a_term_id(server)
+    versions_before = await server.db.content_versions.count_documents({})
+    response = await api.post("/api/batch", json={"operations": [
+        {"op": "create", "content_type": "document", "data": LARGE_DOCUMENT},
+        {"op": "update", "content_type": "glossary", "content_id": term_id, "data": {"definition": "changed"}},
+        {"op": "delete", "content_type": "glossary", "content_id": "missing"},
+        {"op": "create", "content_type": "glossary", "data": {"term": "no definition"}},
+    ]})
+
+    assert response.status_code == 400
+    results = response.json()["detail"]["results"]
+    assert [result["status"] for result in results] == [200, 200, 404, 422]
+    assert (await server.db.glossary_terms.find_one({"term_id": term_id}))["definition"] != "changed"
+    assert await server.db.documents.count_documents({"filename": "big.md"}) == 0
+    # Large content is stored only once the batch is accepted
+    assert await server.db.document_content.count_documents({}) == 0
+    assert await server.db.content_versions.count_documents({}) == versions_before
+
+
+async def test_accepted_batch_gets_consecutive_revisions_in_order(api, server, replicated):
+    term_id = await a_term_id(server)
+    response = await api.post("/api/batch", json={"operations": [
+        {"op": "create", "content_type": "document", "data": LARGE_DOCUMENT},
+        {"op": "update", "content_type": "glossary", "content_id": term_id, "data": {"definition": "changed"}},
+        {"op": "delete", "content_type": "glossary", "content_id": term_id},
+    ]})
+
+    assert response.status_code == 200
+    document = await server.db.documents.find_one({"filename": "big.md"})
+    term = await server.db.glossary_terms.find_one({"term_id": term_id})
+    assert term["revision"] == document["revision"] + 2
+    assert term["definition"] == "changed" and term["is_active"] is False
+    assert "content" not in document
+    assert await server.db.document_content.count_documents({"sha256": document["content_hash"]}) > 0
+    counter = await server.db.counters.find_one({"_id": "content_revision"})
+    assert counter["value"] == term["revision"]
@@ -0,0 +1,75 @@
+"""
+API tests for first-paint data in one request (/api/bootstrap), on mongomock
+"""
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+pytestmark = pytest.mark.anyio
+
+STANDALONE = {
+    "stats": "/api/dashboard/stats",
+    "components": "/api/architecture/components",
+    "documents": "/api/documents",
+    "glossary": "/api/glossary",
+    "pigpen": "/api/pigpen",
+    "brands": "/api/brands",
+    "me": "/api/auth/me",
+}
+
+
+async def test_payload_matches_standalone_endpoints(api):
+    response = await api.get("/api/bootstrap")
+
+    assert response.status_code == 200
+    payload = response.json()
+    assert list(payload) == list(STANDALONE)
+    for section, path in STANDALONE.items():
+        assert payload[section] == (await api.get(path)).json(), section
+    assert payload["me"]["role"] == "editor"
+    assert response.headers["cache-control"] == "private, no-cache"
+
+
+async def test_include_keeps_canonical_order(api):
+    response = await api.get("/api/bootstrap", params={"include": "me, glossary,stats"})
+    assert list(response.json()) == ["stats", "glossary", "me"]
+
+    response = await api.get("/api/bootstrap", params={"include": "documents"})
+    assert list(response.json()) == ["documents"]
+    assert response.headers["cache-control"] == "no-cache"
+
+
+async def test_unknown_section_is_400(api):
+    response = await api.get("/api/bootstrap", params={"include": "stats,secrets"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Unknown bootstrap section: secrets"
+
+
+async def test_me_is_null_for_anonymous_callers(server, api):
+    async with AsyncClient(transport=ASGITransport(app=server.app), base_url="http://test") as anonymous:
+        response = await anonymous.get("/api/bootstrap", params={"include": "stats,me"})
+    assert response.status_code == 200
+    assert response.json()["me"] is None
+
+
+async def test_fields_select_rows_per_section(api):
+    response = await api.get("/api/bootstrap", params={"include": "documents,glossary", "fields": "documents.doc_id,documents.title"})
+
+    documents = response.json()["documents"]["documents"]
+    assert documents and all(list(row) == ["doc_id", "title"] for row in documents)
+    # Sections without a selector are whole
+    assert response.json()["glossary"] == (await api.get("/api/glossary")).json()
+
+
+async def test_etag_revalidates_until_a_section_changes(api):
+    first = await api.get("/api/bootstrap", params={"include": "glossary,stats"})
+    etag = first.headers["etag"]
+
+    again = await api.get("/api/bootstrap", params={"include": "glossary,stats"}, headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.content == b""
+
+    created = await api.post("/api/glossary", json={"term": "Bootstrap Term", "definition": "d", "category": "core"})
+    assert created.status_code == 200
+    changed = await api.get("/api/bootstrap", params={"include": "glossary,stats"}, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    assert changed.json()["stats"]["total_glossary_terms"] == first.json()["stats"]["total_glossary_terms"] + 1
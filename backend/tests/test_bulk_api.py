@@ -0,0 +1,87 @@
+"""
+API tests for NDJSON bulk export and import (/api/bulk/{type}), on mongomock
+"""
+import json
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+NDJSON = {"Content-Type": "application/x-ndjson"}
+
+
+def ndjson(*rows):
+    return "\n".join(row if isinstance(row, str) else json.dumps(row) for row in rows) + "\n"
+
+
+async def export(api, content_type, **params):
+    response = await api.get(f"/api/bulk/{content_type}/export", params=params)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+async def test_export_imports_back_unchanged(api, server):
+    exported = await export(api, "glossary")
+    assert exported and all("_id" not in row for row in exported)
+    revision = (await server.db.counters.find_one({"_id": "content_revision"}))["value"]
+
+    report = (await api.post("/api/bulk/glossary/import", content=ndjson(*exported), headers=NDJSON)).json()
+
+    assert report["lines"] == len(exported)
+    assert report["unchanged"] == len(exported)
+    assert report["inserted"] == report["updated"] == report["failed"] == 0
+    assert await export(api, "glossary") == exported
+    # Unchanged rows leave no trace in history
+    assert await server.db.content_versions.count_documents({"change_summary": {"$regex": "^Bulk import"}}) == 0
+    assert await server.db.glossary_terms.count_documents({"revision": {"$gt": revision}}) == 0
+
+
+async def test_import_creates_updates_and_reports_bad_lines(api, server):
+    existing = (await export(api, "glossary"))[0]
+    body = ndjson(
+        {"term": existing["term"], "definition": "Edited by import", "category": existing["category"]},
+        {"term": "Imported Term", "definition": "New", "category": "Core"},
+        {"term": "Missing category", "definition": "x"},
+        "not json",
+    )
+
+    report = (await api.post("/api/bulk/glossary/import", content=body, headers=NDJSON)).json()
+
+    assert (report["inserted"], report["updated"], report["failed"]) == (1, 1, 2)
+    assert [error["line"] for error in report["errors"]] == [3, 4]
+    assert (await server.db.glossary_terms.find_one({"term": existing["term"]}))["definition"] == "Edited by import"
+    created = await server.db.glossary_terms.find_one({"term": "Imported Term"})
+    assert await server.db.content_versions.count_documents({"content_id": created["term_id"]}) == 1
+    assert await server.db.audit_log.count_documents({"content_id": created["term_id"], "details.bulk_import": True}) == 1
+
+
+async def test_dry_run_writes_nothing(api, server):
+    before = await export(api, "glossary")
+    body = ndjson({"term": before[0]["term"], "definition": "Dry", "category": "Core"}, {"term": "Dry Term", "definition": "d", "category": "Core"})
+    versions = await server.db.content_versions.count_documents({})
+
+    report = (await api.post("/api/bulk/glossary/import", params={"dry_run": True}, content=body, headers=NDJSON)).json()
+
+    assert report["dry_run"] and (report["inserted"], report["updated"]) == (1, 1)
+    assert await export(api, "glossary") == before
+    assert await server.db.content_versions.count_documents({}) == versions
+
+
+async def test_refused_writes_are_reported_and_the_rest_keep_history(api, server):
+    existing = (await export(api, "glossary"))[0]
+    # Make the database refuse one of the new rows
+    await server.db.glossary_terms.create_index("definition", unique=True)
+    body = ndjson(
+        {"term": "Fine Term", "definition": "Unique definition", "category": "Core"},
+        {"term": "Clashing Term", "definition": existing["definition"], "category": "Core"},
+    )
+
+    report = (await api.post("/api/bulk/glossary/import", content=body, headers=NDJSON)).json()
+
+    assert (report["inserted"], report["failed"]) == (1, 1)
+    assert [error["line"] for error in report["errors"]] == [2]
+    fine = await server.db.glossary_terms.find_one({"term": "Fine Term"})
+    assert await server.db.content_versions.count_documents({"content_id": fine["term_id"]}) == 1
+    assert await server.db.audit_log.count_documents({"content_title": "Clashing Term"}) == 0
+    assert await server.db.glossary_terms.count_documents({"term": "Clashing Term"}) == 0
@@ -0,0 +1,138 @@
+"""
+Unit tests for the SSE change feed fan-out and resume (change_feed.py)
+"""
+import json
+
+import pytest
+
+from change_feed import ChangeFeedHub
+
+pytestmark = pytest.mark.anyio
+
+CONTENT_TYPES = {
+    "glossary": {"collection": "glossary_terms", "id_field": "term_id"},
+    "document": {"collection": "documents", "id_field": "doc_id"},
+}
+
+
+def event(n, content_type="glossary"):
+    return {"id": f"e{n}", "content_type": content_type, "collection": CONTENT_TYPES[content_type]["collection"], "content_id": f"c{n}"}
+
+
+def hub(**kwargs):
+    return ChangeFeedHub(None, CONTENT_TYPES, **kwargs)
+
+
+async def next_message(stream):
+    """The next message that is not a comment, parsed as (event name, id, data)"""
+    while True:
+        message = await stream.__anext__()
+        if not message.startswith(":"):
+            break
+    fields = dict(line.split(": ", 1) for line in message.strip().split("\n"))
+    return fields["event"], fields.get("id"), json.loads(fields["data"])
+
+
+class TestChangeFeedStream:
+    """Live delivery, replay and resets for one client"""
+
+    async def test_live_events_are_delivered_in_order(self):
+        feed = hub()
+        stream = feed.stream(None, None, keepalive_seconds=5)
+        assert await stream.__anext__() == ": connected\n\n"
+        feed.publish(event(1))
+        feed.publish(event(2))
+        assert [(await next_message(stream))[1] for _ in range(2)] == ["e1", "e2"]
+        await stream.aclose()
+        assert not feed.subscribers
+
+    async def test_content_type_filter(self):
+        feed = hub()
+        stream = feed.stream({"document"}, None, keepalive_seconds=5)
+        await stream.__anext__()
+        feed.publish(event(1, "glossary"))
+        feed.publish(event(2, "document"))
+        assert (await next_message(stream))[1] == "e2"
+        await stream.aclose()
+
+    async def test_reconnect_replays_buffer_once_while_events_arrive(self):
+        feed = hub()
+        for n in (1, 2):
+            feed.publish(event(n))
+        stream = feed.stream(None, "e1", keepalive_seconds=5)
+        assert await stream.__anext__() == ": connected\n\n"
+        # Published after subscribing but before the replay is read: buffered and queued
+        feed.publish(event(3))
+        assert [(await next_message(stream))[1] for _ in range(2)] == ["e2", "e3"]
+        feed.publish(event(4))
+        assert (await next_message(stream))[1] == "e4"
+        await stream.aclose()
+
+    async def test_reconnect_beyond_buffer_catches_up_once(self):
+        feed = hub()
+
+        async def catch_up(event_id):
+            assert event_id == "old"
+            # The live event 5 arrived while MongoDB was being read
+            feed.publish(event(5))
+            return [event(4), event(5)]
+
+        feed.catch_up = catch_up
+        stream = feed.stream(None, "old", keepalive_seconds=5)
+        await stream.__anext__()
+        assert [(await next_message(stream))[1] for _ in range(2)] == ["e4", "e5"]
+        feed.publish(event(6))
+        assert (await next_message(stream))[1] == "e6"
+        await stream.aclose()
+
+    async def test_unresumable_id_gets_reset(self):
+        resets = []
+        feed = hub(on_reset=resets.append)
+        feed.publish(event(1))
+
+        async def catch_up(event_id):
+            return None
+
+        feed.catch_up = catch_up
+        stream = feed.stream(None, "gone", keepalive_seconds=5)
+        await stream.__anext__()
+        assert await next_message(stream) == ("reset", "e1", {"reason": "resume_lost"})
+        assert resets == ["resume_lost"]
+        await stream.aclose()
+
+    async def test_slow_client_overflow_resets(self):
+        feed = hub(queue_size=2)
+        stream = feed.stream(None, None, keepalive_seconds=5)
+        await stream.__anext__()
+        for n in range(1, 5):
+            feed.publish(event(n))
+        assert await next_message(stream) == ("reset", "e4", {"reason": "overflow"})
+        feed.publish(event(5))
+        assert (await next_message(stream))[1] == "e5"
+        await stream.aclose()
+
+    async def test_keepalive_when_idle(self):
+        stream = hub().stream(None, None, keepalive_seconds=0.01)
+        await stream.__anext__()
+        assert await stream.__anext__() == ": keepalive\n\n"
+        await stream.aclose()
+
+
+class TestChangeFeedHub:
+    """Buffer and listeners"""
+
+    async def test_listeners_see_changed_collections(self):
+        feed = hub()
+        seen = []
+        feed.listeners.append(seen.append)
+        feed.publish(event(1, "document"))
+        feed.reset_all("resume_lost")
+        assert seen == [["documents"], ["glossary_terms", "documents"]]
+        assert not feed.buffer
+
+    async def test_buffer_is_bounded(self):
+        feed = hub(buffer_size=2)
+        for n in range(1, 4):
+            feed.publish(event(n))
+        assert feed.replay_after("e1") is None
+        assert [e["id"] for e in feed.replay_after("e2")] == ["e3"]
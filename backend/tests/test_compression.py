@@ -0,0 +1,113 @@
+"""
+Unit tests for Accept-Encoding negotiation and CompressionMiddleware (compression.py)
+"""
+import gzip
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+import compression
+from compression import CompressionMiddleware, negotiate_encoding
+
+pytestmark = pytest.mark.anyio
+
+brotli = pytest.importorskip("brotli")
+
+JSON_BODY = b'{"entries":[' + b",".join(b'{"term":"Quorum","n":%d}' % n for n in range(200)) + b"]}"
+
+
+def app_sending(body=JSON_BODY, status=200, headers=((b"content-type", b"application/json"),)):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": status, "headers": list(headers)})
+        await send({"type": "http.response.body", "body": body})
+    return CompressionMiddleware(app, minimum_size=1024)
+
+
+async def get(app, accept_encoding):
+    # Always set the header: httpx otherwise sends its own default
+    headers = {"Accept-Encoding": accept_encoding}
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://t") as client:
+        # Read the raw bytes; httpx would otherwise decode them
+        async with client.stream("GET", "/", headers=headers) as response:
+            return response, b"".join([chunk async for chunk in response.aiter_raw()])
+
+
+class TestNegotiateEncoding:
+    """Choosing between br, gzip and identity"""
+
+    @pytest.mark.parametrize("accept_encoding,expected", [
+        ("gzip, deflate, br", "br"),
+        ("gzip", "gzip"),
+        ("br;q=0.5, gzip", "gzip"),
+        ("br;q=0, gzip;q=0", None),
+        ("*", "br"),
+        ("*;q=0.2, br;q=0", "gzip"),
+        ("identity", None),
+        ("", None),
+        (None, None),
+    ])
+    def test_preference(self, accept_encoding, expected):
+        assert negotiate_encoding(accept_encoding) == expected
+
+    def test_gzip_only_without_brotli(self, monkeypatch):
+        monkeypatch.setattr(compression, "brotli", None)
+        assert negotiate_encoding("br, gzip") == "gzip"
+        assert negotiate_encoding("br") is None
+
+
+class TestCompressionMiddleware:
+    """Compressed bodies, and Vary on every variant of a compressible response"""
+
+    async def test_gzip(self):
+        response, body = await get(app_sending(), "gzip")
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.headers["vary"] == "Accept-Encoding"
+        assert int(response.headers["content-length"]) == len(body)
+        assert gzip.decompress(body) == JSON_BODY
+
+    async def test_brotli(self):
+        response, body = await get(app_sending(), "gzip, br")
+        assert response.headers["content-encoding"] == "br"
+        assert response.headers["vary"] == "Accept-Encoding"
+        assert brotli.decompress(body) == JSON_BODY
+
+    @pytest.mark.parametrize("accept_encoding", ["", "identity", "br;q=0, gzip;q=0"])
+    async def test_identity_response_still_varies(self, accept_encoding):
+        response, body = await get(app_sending(), accept_encoding)
+        assert "content-encoding" not in response.headers
+        assert response.headers["vary"] == "Accept-Encoding"
+        assert body == JSON_BODY
+
+    async def test_small_body_is_sent_as_is_and_varies(self):
+        response, body = await get(app_sending(body=b'{"ok":true}'), "gzip")
+        assert "content-encoding" not in response.headers
+        assert response.headers["vary"] == "Accept-Encoding"
+        assert body == b'{"ok":true}'
+
+    async def test_vary_is_merged_with_existing(self):
+        headers = ((b"content-type", b"application/json"), (b"vary", b"Cookie"))
+        response, _ = await get(app_sending(headers=headers), "")
+        assert response.headers["vary"] == "Cookie, Accept-Encoding"
+
+    async def test_not_modified_varies(self):
+        response, _ = await get(app_sending(body=b"", status=304, headers=((b"etag", b'"abc"'),)), "gzip")
+        assert response.status_code == 304
+        assert response.headers["vary"] == "Accept-Encoding"
+        assert response.headers["etag"] == '"abc"'
+
+    async def test_strong_etag_is_weakened_when_compressed(self):
+        headers = ((b"content-type", b"application/json"), (b"etag", b'"abc"'))
+        response, _ = await get(app_sending(headers=headers), "gzip")
+        assert response.headers["etag"] == 'W/"abc"'
+
+    @pytest.mark.parametrize("headers,vary", [
+        (((b"content-type", b"text/event-stream"),), None),
+        (((b"content-type", b"application/pdf"),), None),
+        (((b"content-type", b"text/plain"), (b"accept-ranges", b"bytes")), None),
+        (((b"content-type", b"application/json"), (b"content-encoding", b"br"), (b"vary", b"Accept-Encoding")), "Accept-Encoding"),
+    ])
+    async def test_untouched_responses(self, headers, vary):
+        response, body = await get(app_sending(headers=headers), "gzip")
+        assert body == JSON_BODY
+        assert response.headers.get_list("content-encoding") == [value.decode() for name, value in headers if name == b"content-encoding"]
+        assert response.headers.get("vary") == vary
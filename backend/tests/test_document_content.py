@@ -0,0 +1,146 @@
+"""
+Unit tests for offloaded document content (document_content.py)
+"""
+import hashlib
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from document_content import DocumentContentStore, update_operators
+
+pytestmark = pytest.mark.anyio
+
+CONTENT = "".join(chr(ord("a") + n % 26) for n in range(100))
+
+
+def store(inline_max_bytes=10, chunk_size=8):
+    return DocumentContentStore(AsyncMongoMockClient()["content_test"], inline_max_bytes, chunk_size)
+
+
+async def offloaded(content_store, content=CONTENT):
+    fields = {"content": content}
+    await content_store.prepare(fields)
+    return fields["content_hash"]
+
+
+class TestRead:
+    """Byte ranges over fixed-size chunks"""
+
+    @pytest.mark.parametrize("start,end", [
+        (0, 0), (0, 7), (7, 8), (8, 15), (3, 20), (15, 16), (0, 99), (96, 99), (99, 99),
+    ])
+    async def test_range_matches_slice(self, start, end):
+        content_store = store()
+        sha256 = await offloaded(content_store)
+        assert await content_store.read(sha256, start, end) == CONTENT.encode()[start:end + 1]
+
+    async def test_reads_only_spanned_chunks(self):
+        content_store = store()
+        sha256 = await offloaded(content_store)
+        await content_store.chunks.delete_many({"sha256": sha256, "n": {"$in": [0, 5]}})
+        assert await content_store.read(sha256, 8, 39) == CONTENT.encode()[8:40]
+        with pytest.raises(FileNotFoundError):
+            await content_store.read(sha256, 0, 8)
+
+    async def test_empty_range(self):
+        content_store = store()
+        assert await content_store.read("missing", 5, 4) == b""
+
+    async def test_identical_content_is_stored_once(self):
+        content_store = store()
+        await offloaded(content_store)
+        await offloaded(content_store)
+        assert await content_store.chunks.count_documents({}) == 13
+
+
+class TestPrepare:
+    """Row fields and the $unset for each transition between inline and offloaded"""
+
+    async def test_small_content_stays_inline(self):
+        fields = {"content": "short"}
+        unset = await store().prepare(fields)
+        assert fields == {"content": "short"}
+        assert unset == {"content_hash": "", "content_size": ""}
+
+    async def test_large_content_is_replaced_by_reference(self):
+        fields = {"content": CONTENT, "title": "T"}
+        unset = await store().prepare(fields)
+        assert fields == {"title": "T", "content_hash": hashlib.sha256(CONTENT.encode()).hexdigest(), "content_size": 100}
+        assert unset == {"content": ""}
+
+    async def test_threshold_counts_utf8_bytes(self):
+        fields = {"content": "é" * 6}
+        await store().prepare(fields)
+        assert fields["content_size"] == 12
+
+    async def test_reference_without_content_drops_inline_copy(self):
+        fields = {"content_hash": "abc", "content_size": 3}
+        assert await store().prepare(fields) == {"content": ""}
+        assert fields == {"content_hash": "abc", "content_size": 3}
+
+    async def test_no_content_fields(self):
+        assert await store().prepare({"title": "T"}) == {}
+
+    async def test_dry_run_writes_no_chunks(self):
+        content_store = store()
+        fields = {"content": CONTENT}
+        await content_store.prepare(fields, write=False)
+        assert "content_hash" in fields
+        assert await content_store.chunks.count_documents({}) == 0
+
+    async def test_pending_defers_chunks_to_the_caller(self):
+        content_store = store()
+        fields, pending = {"content": CONTENT}, {}
+        await content_store.prepare(fields, pending=pending)
+        assert pending == {fields["content_hash"]: CONTENT.encode()}
+        assert await content_store.chunks.count_documents({}) == 0
+        for sha256, data in pending.items():
+            await content_store.put(data, sha256)
+        assert (await content_store.read(fields["content_hash"], 0, 99)).decode() == CONTENT
+
+    async def test_zero_threshold_keeps_everything_inline(self):
+        fields = {"content": CONTENT}
+        await store(inline_max_bytes=0).prepare(fields)
+        assert fields == {"content": CONTENT}
+
+    async def test_switching_representation_round_trip(self):
+        content_store = store()
+        documents = content_store.db.documents
+        await documents.insert_one({"doc_id": "d", "content": "short"})
+        for content in (CONTENT, "tiny", CONTENT):
+            fields = {"content": content}
+            unset = await content_store.prepare(fields)
+            await documents.update_one({"doc_id": "d"}, update_operators(fields, unset))
+            row = await documents.find_one({"doc_id": "d"}, {"_id": 0})
+            assert await content_store.inline(dict(row)) == {"doc_id": "d", "content": content}
+            assert ("content" in row) != ("content_hash" in row)
+
+
+class TestOffloadInlineContent:
+    """Startup migration of large inline content"""
+
+    async def test_moves_large_rows_once(self):
+        content_store = store()
+        documents = content_store.db.documents
+        await documents.insert_many([{"doc_id": "big", "content": CONTENT}, {"doc_id": "small", "content": "short"}])
+        assert await content_store.offload_inline_content() == 1
+        big = await documents.find_one({"doc_id": "big"})
+        assert "content" not in big and big["content_size"] == 100
+        assert (await documents.find_one({"doc_id": "small"}))["content"] == "short"
+
+        # Recorded as done: a row written inline behind its back is not rescanned
+        await documents.insert_one({"doc_id": "late", "content": CONTENT})
+        assert await content_store.offload_inline_content() == 0
+
+    async def test_lower_threshold_rescans(self):
+        db = AsyncMongoMockClient()["content_test"]
+        await db.documents.insert_one({"doc_id": "d", "content": "x" * 20})
+        assert await DocumentContentStore(db, 50, 8).offload_inline_content() == 0
+        assert await DocumentContentStore(db, 10, 8).offload_inline_content() == 1
+
+    async def test_disabling_offload_forgets_marker(self):
+        db = AsyncMongoMockClient()["content_test"]
+        assert await DocumentContentStore(db, 10, 8).offload_inline_content() == 0
+        assert await DocumentContentStore(db, 0, 8).offload_inline_content() == 0
+        await db.documents.insert_one({"doc_id": "d", "content": CONTENT})
+        assert await DocumentContentStore(db, 10, 8).offload_inline_content() == 1
@@ -0,0 +1,87 @@
+"""
+API tests for ?fields= projections on read endpoints, on mongomock
+"""
+import pytest
+from fastapi import HTTPException
+
+pytestmark = pytest.mark.anyio
+
+
+class TestParseFields:
+    """Validation against the per-collection allow-lists"""
+
+    def test_none_or_blank_selects_everything(self, server):
+        assert server.parse_fields(None, "glossary_terms") is None
+        assert server.parse_fields("", "glossary_terms") is None
+
+    def test_keeps_request_order_without_duplicates(self, server):
+        assert server.parse_fields(" term , term_id,term", "glossary_terms") == ("term", "term_id")
+
+    def test_implied_fields_follow_their_field(self, server):
+        assert server.parse_fields("content,title", "documents") == ("content", "content_hash", "content_size", "title")
+
+    @pytest.mark.parametrize("fields", ["term,password", "_id", ",", " , "])
+    def test_disallowed_or_empty_is_400(self, server, fields):
+        with pytest.raises(HTTPException) as raised:
+            server.parse_fields(fields, "glossary_terms")
+        assert raised.value.status_code == 400
+
+    def test_select_fields_drops_handler_only_fields(self, server):
+        rows = [{"term": "A", "category": "core", "term_id": "t1"}, {"term_id": "t2"}]
+        assert server.select_fields(rows, ("term_id", "term")) == [{"term_id": "t1", "term": "A"}, {"term_id": "t2"}]
+        assert server.select_fields(rows, None) is rows
+
+
+class TestFieldsOnRoutes:
+    """Lists, single items and history"""
+
+    async def test_list_returns_only_selected_fields(self, api):
+        response = await api.get("/api/glossary", params={"fields": "term,term_id"})
+        assert response.status_code == 200
+        terms = response.json()["terms"]
+        assert terms and all(list(term) == ["term", "term_id"] for term in terms)
+
+    async def test_filters_still_apply_to_unselected_fields(self, api):
+        everything = (await api.get("/api/glossary")).json()["terms"]
+        category = everything[0]["category"]
+        selected = (await api.get("/api/glossary", params={"fields": "term_id", "category": category})).json()["terms"]
+        assert selected == [{"term_id": term["term_id"]} for term in everything if term["category"].lower() == category.lower()]
+
+    async def test_single_item(self, api):
+        brand_id = (await api.get("/api/brands")).json()["brands"][0]["brand_id"]
+        response = await api.get(f"/api/brands/{brand_id}", params={"fields": "name"})
+        assert response.status_code == 200
+        assert list(response.json()) == ["name"]
+
+    @pytest.mark.parametrize("path", ["/api/glossary", "/api/documents", "/api/pigpen", "/api/brands", "/api/architecture/components"])
+    @pytest.mark.parametrize("fields", ["password", "name,_id", ","])
+    async def test_disallowed_or_empty_selector_is_400(self, api, path, fields):
+        response = await api.get(path, params={"fields": fields})
+        assert response.status_code == 400
+        assert response.json()["detail"].startswith("Invalid fields for ")
+
+    async def test_history_fields(self, api, server):
+        await server.db.users.update_many({}, {"$set": {"role": "admin"}})
+        response = await api.get("/api/audit-log", params={"fields": "action,content_type"})
+        assert response.status_code == 200
+        entries = response.json()["entries"]
+        assert entries and all(set(entry) <= {"action", "content_type"} for entry in entries)
+        assert (await api.get("/api/audit-log", params={"fields": "user_email,session_token"})).status_code == 400
+
+
+class TestBootstrapFields:
+    """section.field selectors"""
+
+    @pytest.mark.parametrize("fields", [
+        "documents.",
+        "documents. ",
+        "documents.password",
+        "glossary.term",
+        "stats.total_documents",
+        "me.email",
+        "nosection",
+    ])
+    async def test_bad_selector_is_400(self, api, fields):
+        response = await api.get("/api/bootstrap", params={"include": "documents,stats,me", "fields": fields})
+        assert response.status_code == 400
+        assert response.json()["detail"].startswith(("Invalid field selector", "Invalid fields for "))
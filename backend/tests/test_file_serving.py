@@ -0,0 +1,64 @@
+"""
+Unit tests for byte ranges and download headers (file_serving.py)
+"""
+import pytest
+from fastapi import HTTPException
+
+from file_serving import content_disposition, parse_byte_range
+
+
+class TestParseByteRange:
+    """Range header parsing against a 1000-byte body"""
+
+    def test_no_header_sends_everything(self):
+        assert parse_byte_range(None, 1000) is None
+        assert parse_byte_range("items=0-10", 1000) is None
+
+    def test_explicit_range(self):
+        assert parse_byte_range("bytes=0-99", 1000) == (0, 99)
+        assert parse_byte_range("bytes=500-", 1000) == (500, 999)
+
+    def test_end_is_clamped_to_size(self):
+        assert parse_byte_range("bytes=900-5000", 1000) == (900, 999)
+
+    def test_suffix_range(self):
+        assert parse_byte_range("bytes=-100", 1000) == (900, 999)
+        assert parse_byte_range("bytes=-5000", 1000) == (0, 999)
+
+    def test_inverted_range_is_ignored(self):
+        assert parse_byte_range("bytes=500-100", 1000) is None
+
+    def test_malformed_and_multiple_ranges_are_ignored(self):
+        assert parse_byte_range("bytes=a-b", 1000) is None
+        assert parse_byte_range("bytes=0-1,5-6", 1000) is None
+
+    def test_start_past_end_of_body_is_unsatisfiable(self):
+        with pytest.raises(HTTPException) as error:
+            parse_byte_range("bytes=1000-", 1000)
+        assert error.value.status_code == 416
+        assert error.value.headers["Content-Range"] == "bytes */1000"
+
+    def test_empty_suffix_is_unsatisfiable(self):
+        with pytest.raises(HTTPException):
+            parse_byte_range("bytes=-0", 1000)
+
+
+class TestContentDisposition:
+    """Content-Disposition must stay encodable as latin-1"""
+
+    def test_ascii_filename(self):
+        assert content_disposition("spec.pdf") == 'inline; filename="spec.pdf"'
+
+    def test_non_ascii_filename_gets_rfc5987_name(self):
+        header = content_disposition("设计.pdf")
+        header.encode("latin-1")
+        assert 'filename="__.pdf"' in header
+        assert "filename*=UTF-8''%E8%AE%BE%E8%AE%A1.pdf" in header
+
+    def test_emoji_filename(self):
+        content_disposition("notes 📄.txt").encode("latin-1")
+
+    def test_line_breaks_and_quotes_are_stripped(self):
+        header = content_disposition('evil\r\nSet-Cookie: x=1".pdf', "attachment")
+        assert "\r" not in header and "\n" not in header
+        assert header.startswith('attachment; filename="evilSet-Cookie: x=1.pdf"')
@@ -0,0 +1,109 @@
+"""
+Unit tests for the upload janitor (janitor.py) on mongomock and local storage
+"""
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from janitor import collect_garbage
+from storage import LocalShardedStorage
+
+pytestmark = pytest.mark.anyio
+
+OLD = (datetime.now(timezone.utc) - timedelta(days=2)).isoformat()
+NEW = datetime.now(timezone.utc).isoformat()
+
+
+@pytest.fixture
+def db():
+    return AsyncMongoMockClient()["janitor_test"]
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return LocalShardedStorage(tmp_path)
+
+
+async def add_upload(db, storage, file_id, size, uploaded_at, user_id="user_a"):
+    await storage.put(file_id, b"x" * size)
+    await db.chat_files.insert_one({"file_id": file_id, "storage_key": file_id, "size": size, "uploaded_at": uploaded_at, "user_id": user_id})
+
+
+def janitor(db, storage, **kwargs):
+    async def delete_blob(file_doc):
+        return await storage.delete(file_doc["storage_key"])
+    return collect_garbage(db, delete_blob, grace_period=timedelta(hours=24), storage=storage, **kwargs)
+
+
+class TestJanitor:
+    """Orphans, quotas and unrecorded blobs"""
+
+    async def test_orphans_past_grace_are_deleted(self, db, storage):
+        await add_upload(db, storage, "old_orphan", 10, OLD)
+        await add_upload(db, storage, "old_attached", 10, OLD)
+        await add_upload(db, storage, "new_orphan", 10, NEW)
+        await db.chat_history.insert_one({"session_id": "s", "file_ids": ["old_attached"]})
+
+        report = await janitor(db, storage)
+
+        assert report["orphans_deleted"] == 1
+        remaining = {d["file_id"] for d in await db.chat_files.find({}).to_list(None)}
+        assert remaining == {"old_attached", "new_orphan"}
+        assert await storage.size("old_orphan") is None
+
+    async def test_quota_never_deletes_referenced_files(self, db, storage):
+        await add_upload(db, storage, "attached", 100, NEW)
+        await add_upload(db, storage, "pending", 50, NEW)
+        await db.chat_history.insert_one({"session_id": "s", "file_ids": ["attached"]})
+
+        report = await janitor(db, storage, user_quota_bytes=60)
+
+        assert report["quota_deleted"] == 1
+        assert await storage.size("attached") == 100
+        assert await storage.size("pending") is None
+        assert report["over_quota"] == [{"owner": "user_a", "bytes": 40}]
+
+    async def test_quota_deletes_oldest_unreferenced_first(self, db, storage):
+        await add_upload(db, storage, "first", 40, (datetime.now(timezone.utc) - timedelta(hours=2)).isoformat())
+        await add_upload(db, storage, "second", 40, NEW)
+
+        report = await janitor(db, storage, user_quota_bytes=50)
+
+        assert report["quota_deleted"] == 1
+        assert report["over_quota"] == []
+        assert await storage.size("first") is None
+        assert await storage.size("second") == 40
+
+    async def test_unrecorded_blobs_past_grace_are_swept(self, db, storage):
+        await add_upload(db, storage, "recorded", 10, OLD)
+        await db.chat_history.insert_one({"session_id": "s", "file_ids": ["recorded"]})
+        await storage.put("crashed_upload", b"partial")
+        await storage.put("in_flight_upload", b"new")
+        two_days_ago = time.time() - 2 * 86400
+        for key in ("recorded", "crashed_upload"):
+            os.utime(storage.path_for(key), (two_days_ago, two_days_ago))
+
+        report = await janitor(db, storage)
+
+        assert report["unrecorded_blobs_deleted"] == 1
+        assert await storage.size("crashed_upload") is None
+        assert await storage.size("in_flight_upload") == 3
+        assert await storage.size("recorded") == 10
+
+    async def test_blobs_of_queued_upload_jobs_are_kept(self, db, storage):
+        for key in ("queued_upload", "failed_upload"):
+            await storage.put(key, b"staged")
+            os.utime(storage.path_for(key), (time.time() - 2 * 86400,) * 2)
+        await db.upload_jobs.insert_many([
+            {"job_id": "j1", "file_id": "queued_upload", "status": "queued", "updated_at": OLD},
+            {"job_id": "j2", "file_id": "failed_upload", "status": "failed", "updated_at": OLD},
+        ])
+
+        report = await janitor(db, storage)
+
+        assert report["unrecorded_blobs_deleted"] == 1
+        assert await storage.size("queued_upload") == 6
+        assert await storage.size("failed_upload") is None
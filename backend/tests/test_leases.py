@@ -0,0 +1,30 @@
+"""
+Unit tests for maintenance-job leases (leases.py)
+"""
+from datetime import datetime
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+import leases
+
+pytestmark = pytest.mark.anyio
+
+
+class TestLease:
+    """One holder at a time, taken over once expired"""
+
+    async def test_holder_renews_and_others_are_refused(self, monkeypatch):
+        db = AsyncMongoMockClient()["lease_test"]
+        assert await leases.acquire_lease(db, "job", 60)
+        assert await leases.acquire_lease(db, "job", 60)
+        monkeypatch.setattr(leases, "HOLDER", "another-worker")
+        assert not await leases.acquire_lease(db, "job", 60)
+
+    async def test_expired_lease_is_taken_over(self, monkeypatch):
+        db = AsyncMongoMockClient()["lease_test"]
+        assert await leases.acquire_lease(db, "job", 60)
+        await db.leases.update_one({"_id": "job"}, {"$set": {"expires_at": datetime(2000, 1, 1)}})
+        monkeypatch.setattr(leases, "HOLDER", "another-worker")
+        assert await leases.acquire_lease(db, "job", 60)
+        assert (await db.leases.find_one({"_id": "job"}))["holder"] == "another-worker"
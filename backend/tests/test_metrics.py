@@ -0,0 +1,57 @@
+"""
+Unit tests for Prometheus metrics (metrics.py)
+"""
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from metrics import parse_networks, scrape_allowed
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+class TestScrapeAllowed:
+    """Who may read /metrics"""
+
+    def test_token_required_when_set(self):
+        assert scrape_allowed("Bearer s3cret", "10.0.0.5", "s3cret")
+        assert not scrape_allowed("Bearer wrong", "127.0.0.1", "s3cret")
+        assert not scrape_allowed(None, "127.0.0.1", "s3cret")
+
+    def test_closed_without_token_or_networks(self):
+        assert not scrape_allowed(None, "127.0.0.1", "")
+        assert not scrape_allowed(None, "::1", "")
+        assert not scrape_allowed("Bearer ", "10.0.0.5", "")
+
+    def test_configured_networks_only(self):
+        networks = parse_networks("10.0.5.0/24, 192.168.1.7")
+        assert scrape_allowed(None, "10.0.5.20", "", networks)
+        assert scrape_allowed(None, "192.168.1.7", "s3cret", networks)
+        assert not scrape_allowed(None, "127.0.0.1", "", networks)
+        assert not scrape_allowed(None, "testclient", "", networks)
+        assert not scrape_allowed(None, None, "", networks)
+        assert parse_networks(" , ") == []
+
+
+class TestMultiprocess:
+    """Samples from every worker reach one scrape"""
+
+    def run(self, code: str, multiproc_dir: Path) -> str:
+        env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(multiproc_dir)}
+        return subprocess.run(
+            [sys.executable, "-c", code], cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+        ).stdout
+
+    def test_scrape_sums_workers(self, tmp_path):
+        worker = "from metrics import HTTP_REQUESTS\nHTTP_REQUESTS.labels('GET', '/api/health', '200').inc(2)\n"
+        self.run(worker, tmp_path)
+        self.run(worker, tmp_path)
+        body = self.run("from metrics import render_metrics\nprint(render_metrics()[0].decode())", tmp_path)
+        assert 'gogarvis_http_requests_total{method="GET",route="/api/health",status="200"} 4.0' in body
+
+    def test_exited_workers_leave_live_gauges(self, tmp_path):
+        self.run("from metrics import CHAT_SESSIONS, mark_worker_exited\nCHAT_SESSIONS.set(3)\nmark_worker_exited()", tmp_path)
+        self.run("from metrics import CHAT_SESSIONS\nCHAT_SESSIONS.set(2)", tmp_path)
+        body = self.run("from metrics import render_metrics\nprint(render_metrics()[0].decode())", tmp_path)
+        assert "gogarvis_chat_sessions 2.0" in body
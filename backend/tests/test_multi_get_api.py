@@ -0,0 +1,65 @@
+"""
+API tests for fetching many items by id (/api/multi-get/{type}), on mongomock
+"""
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+pytestmark = pytest.mark.anyio
+
+
+async def term_ids(server, count):
+    return [term["term_id"] async for term in server.db.glossary_terms.find({"is_active": True}).limit(count)]
+
+
+async def test_items_in_request_order_with_missing_ids(api, server):
+    first, second, deleted = await term_ids(server, 3)
+    assert (await api.delete(f"/api/glossary/{deleted}")).status_code == 200
+
+    response = await api.post("/api/multi-get/glossary", json={"ids": [second, "nope", first, deleted, second]})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert [item["term_id"] for item in body["items"]] == [second, first]
+    # Unknown and deleted ids alike, each once
+    assert body["missing"] == ["nope", deleted]
+    listed = {term["term_id"]: term for term in (await api.get("/api/glossary")).json()["terms"]}
+    assert body["items"] == [listed[second], listed[first]]
+
+
+async def test_id_field_is_always_returned(api, server):
+    ids = await term_ids(server, 2)
+
+    response = await api.post("/api/multi-get/glossary", params={"fields": "term"}, json={"ids": ids})
+
+    assert response.status_code == 200
+    assert [list(item) for item in response.json()["items"]] == [["term_id", "term"]] * 2
+    explicit = await api.post("/api/multi-get/glossary", params={"fields": "term,term_id"}, json={"ids": ids})
+    assert [list(item) for item in explicit.json()["items"]] == [["term", "term_id"]] * 2
+
+
+async def test_empty_ids(api):
+    response = await api.post("/api/multi-get/brand", json={"ids": []})
+    assert response.json() == {"items": [], "missing": []}
+
+
+async def test_bad_requests_are_400(api, server):
+    assert (await api.post("/api/multi-get/users", json={"ids": ["u"]})).status_code == 400
+    assert (await api.post("/api/multi-get/glossary", params={"fields": "term,password"}, json={"ids": ["t"]})).status_code == 400
+    assert (await api.post("/api/multi-get/glossary", params={"fields": ","}, json={"ids": ["t"]})).status_code == 400
+    too_many = [f"t{n}" for n in range(server.MULTI_GET_MAX_IDS + 1)]
+    response = await api.post("/api/multi-get/glossary", json={"ids": too_many})
+    assert response.status_code == 400
+    assert response.json()["detail"] == f"At most {server.MULTI_GET_MAX_IDS} ids per request"
+
+
+async def test_versions_need_auth(api, server):
+    version_ids = [version["version_id"] async for version in server.db.content_versions.find().limit(2)]
+
+    response = await api.post("/api/multi-get/version", params={"fields": "change_type"}, json={"ids": [*version_ids, "gone"]})
+    assert response.status_code == 200
+    assert [item["version_id"] for item in response.json()["items"]] == version_ids
+    assert response.json()["missing"] == ["gone"]
+
+    async with AsyncClient(transport=ASGITransport(app=server.app), base_url="http://test") as anonymous:
+        assert (await anonymous.post("/api/multi-get/version", json={"ids": version_ids})).status_code == 401
+        assert (await anonymous.post("/api/multi-get/glossary", json={"ids": []})).status_code == 200
@@ -0,0 +1,117 @@
+"""
+Unit tests for the sampling profiler (profiler.py) and its admin routes
+"""
+import asyncio
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from profiler import Profiler, ProfilingMiddleware
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def busy_thread():
+    """A thread burning CPU in a recognisable function while the test runs"""
+    done = threading.Event()
+
+    def spin_for_profiler():
+        while not done.is_set():
+            sum(range(1000))
+
+    thread = threading.Thread(target=spin_for_profiler, name="busy")
+    thread.start()
+    yield
+    done.set()
+    thread.join()
+
+
+class TestProfiler:
+    """Timed sessions, request sessions and stopping"""
+
+    async def test_timed_profile_samples_busy_threads(self, busy_thread):
+        profiler = Profiler()
+        session = await profiler.profile_for(0.1, 0.005, memory=False)
+        assert session.status == "completed"
+        assert session.sampler.samples > 0
+        assert "spin_for_profiler" in session.render("collapsed")
+        speedscope = session.render("speedscope")["speedscope"]
+        assert speedscope["profiles"][0]["samples"]
+
+    async def test_only_one_profile_at_a_time(self):
+        profiler = Profiler()
+        running = asyncio.create_task(profiler.profile_for(0.2, 0.005, memory=False))
+        await asyncio.sleep(0.01)
+        with pytest.raises(RuntimeError):
+            profiler.arm("/x", 1, 0.005, memory=False, timeout=1)
+        await running
+
+    async def test_stop_finishes_early(self):
+        profiler = Profiler()
+        session = profiler.arm("/x", 5, 0.005, memory=True, timeout=60)
+        stopped = await profiler.stop(session.session_id)
+        assert stopped is session and session.status == "stopped"
+        assert profiler.request_session is None
+        assert isinstance(session.render("speedscope")["allocations"], list)
+        assert await profiler.stop("unknown") is None
+
+    async def test_request_session_times_out(self):
+        profiler = Profiler()
+        session = profiler.arm("/x", 5, 0.005, memory=False, timeout=0.01)
+        await asyncio.sleep(0.1)
+        assert session.status == "timed_out"
+        assert profiler.request_session is None
+
+    async def test_request_session_ends_after_count_matching_requests(self, busy_thread):
+        profiler = Profiler()
+
+        async def app(scope, receive, send):
+            await asyncio.sleep(0.02)
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b"ok"})
+
+        session = profiler.arm("GET /api/glossary*", 2, 0.002, memory=False, timeout=60)
+        async with AsyncClient(transport=ASGITransport(app=ProfilingMiddleware(app, profiler)), base_url="http://t") as client:
+            await client.get("/api/documents")
+            assert session.requests_profiled == 0
+            await client.get("/api/glossary")
+            await client.get("/api/glossary/categories")
+        assert session.requests_profiled == 2
+        assert session.status == "completed"
+        # Other threads count while a matching request is in flight
+        assert session.sampler.samples > 0
+
+
+class TestProfileRoutes:
+    """Admin routes on the API"""
+
+    @pytest.fixture
+    async def admin(self, api, server):
+        await server.db.users.update_many({}, {"$set": {"role": "admin"}})
+        return api
+
+    async def test_start_read_stop(self, admin):
+        started = await admin.post("/api/admin/profile/requests", params={"route": "/nothing", "count": 1})
+        assert started.status_code == 200
+        session_id = started.json()["session_id"]
+        assert (await admin.get(f"/api/admin/profile/{session_id}")).json()["status"] == "running"
+        stopped = await admin.delete(f"/api/admin/profile/{session_id}")
+        assert stopped.status_code == 200 and stopped.json()["status"] == "stopped"
+        assert (await admin.get(f"/api/admin/profile/{session_id}", params={"format": "collapsed"})).status_code == 200
+
+    async def test_unknown_session_is_404(self, admin):
+        assert (await admin.get("/api/admin/profile/unknown")).status_code == 404
+        assert (await admin.delete("/api/admin/profile/unknown")).status_code == 404
+
+    async def test_refused_with_several_workers(self, admin, server):
+        expires_at = datetime.now(timezone.utc) + timedelta(minutes=1)
+        await server.db.leases.insert_many([
+            {"_id": "upload-worker:a", "holder": "a", "expires_at": expires_at},
+            {"_id": "upload-worker:b", "holder": "b", "expires_at": expires_at},
+        ])
+        response = await admin.post("/api/admin/profile", params={"seconds": 0.1})
+        assert response.status_code == 409
+        assert "single API worker" in response.json()["detail"]
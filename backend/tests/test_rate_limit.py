@@ -0,0 +1,162 @@
+"""
+Unit tests for token-bucket rate limiting (rate_limit.py)
+"""
+import pytest
+from fastapi import FastAPI, HTTPException, Request
+from httpx import ASGITransport, AsyncClient
+from pymongo.errors import DuplicateKeyError
+
+import rate_limit
+from rate_limit import MemoryBucketStore, MongoBucketStore, RateLimiter, RateLimitMiddleware, parse_budgets, parse_rate
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(rate_limit.time, "monotonic", fake)
+    return fake
+
+
+def request(ip="10.0.0.1", forwarded=None):
+    headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+    return Request({"type": "http", "method": "POST", "path": "/", "headers": headers, "client": (ip, 1234)})
+
+
+class TestParsing:
+    """RATE_LIMITS syntax"""
+
+    def test_parse_rate(self):
+        assert parse_rate("20/minute") == (20, 20 / 60)
+        assert parse_rate(" 5 / seconds ") == (5, 5.0)
+
+    @pytest.mark.parametrize("rate", ["0/minute", "x/minute", "20/fortnight", "20"])
+    def test_invalid_rate(self, rate):
+        with pytest.raises(ValueError):
+            parse_rate(rate)
+
+    def test_parse_budgets(self):
+        assert parse_budgets("chat=30/minute, upload=10/hour,") == {"chat": (30, 0.5), "upload": (10, 10 / 3600)}
+
+
+class TestMemoryBucketStore:
+    """Refill and debit arithmetic"""
+
+    async def test_full_bucket_drains_then_refuses(self, clock):
+        store = MemoryBucketStore()
+        assert [(await store.take("k", 3, 1.0, 1))[0] for _ in range(4)] == [True, True, True, False]
+
+    async def test_refills_continuously_up_to_capacity(self, clock):
+        store = MemoryBucketStore()
+        await store.take("k", 4, 2.0, 4)
+        clock.now += 1
+        assert await store.take("k", 4, 2.0, 2) == (True, 0)
+        clock.now += 3600
+        assert await store.take("k", 4, 2.0, 1) == (True, 3)
+
+    async def test_refused_take_spends_nothing(self, clock):
+        store = MemoryBucketStore()
+        await store.take("k", 4, 1.0, 3)
+        assert await store.take("k", 4, 1.0, 2) == (False, 1)
+        assert await store.take("k", 4, 1.0, 1) == (True, 0)
+
+    async def test_keys_are_independent(self, clock):
+        store = MemoryBucketStore()
+        await store.take("a", 1, 1.0, 1)
+        assert (await store.take("b", 1, 1.0, 1))[0]
+
+
+class TestRateLimiter:
+    """Budgets, identities and 429s"""
+
+    def limiter(self, **kwargs):
+        return RateLimiter(MemoryBucketStore(), {"upload": (2, 1 / 30)}, **kwargs)
+
+    async def test_empty_bucket_raises_429_with_retry_after(self, clock):
+        limiter = self.limiter()
+        await limiter.check(request(), "upload", "u1", cost=2)
+        with pytest.raises(HTTPException) as e:
+            await limiter.check(request(), "upload", "u1")
+        assert e.value.status_code == 429
+        assert e.value.headers == {"Retry-After": "30"}
+
+    async def test_users_and_ips_have_separate_buckets(self, clock):
+        limiter = self.limiter()
+        await limiter.check(request(), "upload", "u1", cost=2)
+        await limiter.check(request(), "upload", "u2", cost=2)
+        await limiter.check(request("10.0.0.1"), "upload", cost=2)
+        await limiter.check(request("10.0.0.2"), "upload", cost=2)
+
+    async def test_cost_is_capped_at_capacity(self, clock):
+        await self.limiter().check(request(), "upload", "u1", cost=50)
+
+    async def test_zero_cost_and_unknown_budgets_are_free(self, clock):
+        limiter = self.limiter()
+        await limiter.check(request(), "upload", "u1", cost=2)
+        await limiter.check(request(), "upload", "u1", cost=0)
+        await limiter.check(request(), "chat", "u1")
+
+    async def test_forwarded_address_only_when_trusted(self):
+        assert self.limiter().client_ip(request(forwarded="1.2.3.4, 10.0.0.9")) == "10.0.0.1"
+        assert self.limiter(trust_forwarded=True).client_ip(request(forwarded="1.2.3.4, 10.0.0.9")) == "1.2.3.4"
+
+    async def test_store_errors_fail_open(self):
+        class BrokenStore:
+            async def take(self, *args):
+                raise RuntimeError("down")
+
+        await RateLimiter(BrokenStore(), {"upload": (1, 1.0)}).check(request(), "upload", "u1")
+
+
+class TestMongoBucketStore:
+    """Racing first requests on the upsert"""
+
+    async def test_duplicate_key_on_first_upsert_is_retried(self):
+        class RacingCollection:
+            calls = 0
+
+            async def find_one_and_update(self, *args, **kwargs):
+                self.calls += 1
+                if self.calls == 1:
+                    raise DuplicateKeyError("E11000 duplicate key error")
+                return {"allowed": True, "tokens": 4}
+
+        collection = RacingCollection()
+        assert await MongoBucketStore(collection).take("k", 5, 1.0, 1) == (True, 4)
+        assert collection.calls == 2
+
+
+class TestRateLimitMiddleware:
+    """Refusing before the body is read"""
+
+    async def test_empty_bucket_is_refused_before_the_route(self, clock):
+        app = FastAPI()
+        reached = []
+
+        @app.post("/upload")
+        async def upload():
+            reached.append(1)
+            return {}
+
+        async def identify(request):
+            return request.headers.get("x-user")
+
+        limiter = RateLimiter(MemoryBucketStore(), {"upload": (1, 1 / 60)})
+        app.add_middleware(RateLimitMiddleware, limiter=limiter, routes={("POST", "/upload"): "upload"}, identify=identify)
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://t") as client:
+            assert (await client.post("/upload", headers={"x-user": "u1"})).status_code == 200
+            refused = await client.post("/upload", headers={"x-user": "u1"}, content=b"x" * 1000)
+            assert (await client.post("/upload", headers={"x-user": "u2"})).status_code == 200
+            assert (await client.get("/upload")).status_code == 405
+        assert refused.status_code == 429
+        assert refused.headers["retry-after"] == "60"
+        assert len(reached) == 2
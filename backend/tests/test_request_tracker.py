@@ -0,0 +1,115 @@
+"""
+Unit tests for per-request MongoDB accounting and slow-command logging (request_tracker.py)
+"""
+import asyncio
+import itertools
+import logging
+import re
+import time
+from datetime import timedelta
+
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+from motor.frameworks.asyncio import run_on_executor
+from pymongo import monitoring
+
+from request_tracker import DbCommandTracker, DbRequestMiddleware, current_db_stats, filter_shape
+
+pytestmark = pytest.mark.anyio
+
+CONNECTION = ("db", 27017)
+request_ids = itertools.count(1)
+
+
+def run_command(tracker, command, milliseconds):
+    """Report one command to the listener the way pymongo does, on the calling thread"""
+    request_id = next(request_ids)
+    tracker.started(monitoring.CommandStartedEvent(command, "test", request_id, CONNECTION, request_id))
+    duration = timedelta(milliseconds=milliseconds)
+    tracker.succeeded(monitoring.CommandSucceededEvent(duration, {"ok": 1}, next(iter(command)), request_id, CONNECTION, request_id))
+
+
+def tracked_app(tracker, commands, server_timing=True):
+    """An app whose route runs its commands in Motor's executor threads"""
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: str):
+        loop = asyncio.get_running_loop()
+        for command, milliseconds in commands:
+            await run_on_executor(loop, run_command, tracker, command, milliseconds)
+        return {"round_trips": current_db_stats().round_trips}
+
+    return DbRequestMiddleware(app, server_timing=server_timing)
+
+
+async def get(app, path):
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://t") as client:
+        return await client.get(path)
+
+
+class TestDbRequestMiddleware:
+    """Round trips counted per request and reported in Server-Timing"""
+
+    async def test_counts_round_trips_of_a_known_route(self):
+        tracker = DbCommandTracker(slow_threshold_ms=0)
+        commands = [({"find": "items", "filter": {"item_id": "a"}}, 2), ({"find": "tags"}, 3), ({"count": "items"}, 5)]
+
+        response = await get(tracked_app(tracker, commands), "/items/a")
+
+        assert response.json() == {"round_trips": 3}
+        timing = re.fullmatch(r'db;dur=([\d.]+);desc="(\d+) round trips", app;dur=([\d.]+)', response.headers["server-timing"])
+        assert timing is not None
+        assert float(timing[1]) == 10.0 and timing[2] == "3"
+        assert float(timing[3]) >= 0
+
+    async def test_concurrent_requests_are_counted_apart(self):
+        tracker = DbCommandTracker(slow_threshold_ms=0)
+        one = tracked_app(tracker, [({"find": "items"}, 1)])
+        three = tracked_app(tracker, [({"find": "items"}, 1)] * 3)
+
+        responses = await asyncio.gather(*(get(app, "/items/a") for app in [one, three] * 5))
+
+        assert [response.json()["round_trips"] for response in responses] == [1, 3] * 5
+
+    async def test_header_can_be_disabled(self):
+        response = await get(tracked_app(DbCommandTracker(0), [({"find": "items"}, 1)], server_timing=False), "/items/a")
+        assert "server-timing" not in response.headers
+
+
+class TestSlowCommands:
+    """Commands over the threshold are logged with their filter shape and route"""
+
+    async def test_slow_command_is_logged_with_route_template(self, caplog):
+        tracker = DbCommandTracker(slow_threshold_ms=50)
+        commands = [({"find": "items", "filter": {"item_id": "secret", "tags": {"$in": ["a", "b"]}}}, 80), ({"find": "tags"}, 1)]
+
+        with caplog.at_level(logging.WARNING, logger="request_tracker"):
+            await get(tracked_app(tracker, commands), "/items/secret")
+
+        [record] = caplog.records
+        message = record.getMessage()
+        assert message.startswith("Slow MongoDB find on items (ok): 80.0ms")
+        assert "filter={'item_id': '?', 'tags': {'$in': ['?']}}" in message
+        assert message.endswith("route=GET /items/{item_id}")
+        assert "secret" not in message
+        assert not tracker._pending
+
+    async def test_commands_outside_a_request_are_background(self, caplog):
+        tracker = DbCommandTracker(slow_threshold_ms=1)
+        with caplog.at_level(logging.WARNING, logger="request_tracker"):
+            run_command(tracker, {"delete": "sessions", "deletes": [{"q": {"expires_at": {"$lt": time.time()}}}]}, 5)
+        assert caplog.records[0].getMessage().endswith("filter=[{'expires_at': {'$lt': '?'}}] route=background")
+
+    def test_filter_shape_hides_values(self):
+        assert filter_shape({"a": 1, "$or": [{"b": "x"}, {"b": "y"}, {"c": 2}]}) == {"a": "?", "$or": [{"b": "?"}, {"c": "?"}]}
+
+
+class TestApiServerTiming:
+    """The header on the real API"""
+
+    async def test_known_route_reports_db_time(self, api):
+        response = await api.get("/api/glossary")
+        assert response.status_code == 200
+        assert re.fullmatch(r'db;dur=[\d.]+;desc="\d+ round trips", app;dur=[\d.]+', response.headers["server-timing"])
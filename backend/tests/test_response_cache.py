@@ -0,0 +1,47 @@
+"""
+Unit tests for the orjson encoding of cached and raw JSON responses (response_cache.py)
+"""
+import json
+from datetime import datetime, timezone
+
+import pytest
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import JSONResponse
+
+from response_cache import json_bytes
+
+
+def previous_body(content) -> bytes:
+    """What the routes sent before orjson: jsonable_encoder and Starlette's JSONResponse"""
+    return JSONResponse(jsonable_encoder(content)).body
+
+
+class TestJsonBytes:
+    """json_bytes matches the previous output byte for byte"""
+
+    @pytest.mark.parametrize("content", [
+        {"created_at": datetime(2024, 5, 1, 12, 30, 15, 123456)},
+        {"created_at": datetime(2024, 5, 1, 12, 30, tzinfo=timezone.utc)},
+        {"created_at": datetime(2024, 5, 1, tzinfo=timezone.utc).isoformat()},
+        {"term": "Größe", "definition": "認証 — “quoted” ✓", "emoji": "🐖"},
+        {"entries": [{"term_id": "t1", "revision": 3, "is_active": True, "score": 0.5, "tags": [], "parent": None}], "total": 1},
+        [],
+        None,
+    ])
+    def test_same_bytes_as_json_response(self, content):
+        assert json_bytes(content) == previous_body(content)
+
+    def test_mongo_rows_without_id(self):
+        row = {"_id": ObjectId(), "doc_id": "d1", "title": "Spéc", "updated_at": datetime(2024, 1, 2, 3, 4, 5)}
+        projected = {key: value for key, value in row.items() if key != "_id"}
+        assert json_bytes(projected) == previous_body(projected)
+        assert json.loads(json_bytes(projected)) == {"doc_id": "d1", "title": "Spéc", "updated_at": "2024-01-02T03:04:05"}
+
+    def test_leaked_object_id_fails_loudly(self):
+        # jsonable_encoder would have turned it into a string; a leaked _id should not ship silently
+        with pytest.raises(TypeError):
+            json_bytes({"_id": ObjectId()})
+
+    def test_non_string_keys(self):
+        assert json_bytes({1: "a"}) == previous_body({1: "a"})
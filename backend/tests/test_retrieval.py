@@ -0,0 +1,95 @@
+"""
+Unit tests for the incremental spec index (retrieval.py) and its refresh
+"""
+import pytest
+
+from retrieval import SpecIndex
+
+pytestmark = pytest.mark.anyio
+
+
+def document(doc_id, content, revision=1):
+    return {"doc_id": doc_id, "title": doc_id.title(), "filename": f"{doc_id}.md", "revision": revision, "content": content}
+
+
+def passages(index):
+    """source_id -> [(rowid, text)] of the FTS rows, to tell rewritten rows from kept ones"""
+    with index._connect() as conn:
+        rows = conn.execute("SELECT rowid, source_id, text FROM passages ORDER BY rowid").fetchall()
+    by_source = {}
+    for rowid, source_id, text in rows:
+        by_source.setdefault(source_id, []).append((rowid, text))
+    return by_source
+
+
+class TestSpecIndexSync:
+    """Only changed sources are re-indexed; vanished ones are dropped"""
+
+    def test_edit_rewrites_only_that_document(self, tmp_path):
+        index = SpecIndex(tmp_path / "index.sqlite3")
+        documents = [document("alpha", "governance quorum rules"), document("beta", "treasury budget limits")]
+        assert index.sync(tmp_path / "docs", documents)["indexed"] == 2
+        before = passages(index)
+
+        documents[0] = document("alpha", "governance voting thresholds", revision=2)
+        report = index.sync(tmp_path / "docs", documents)
+
+        assert (report["indexed"], report["unchanged"], report["removed"]) == (1, 1, 0)
+        after = passages(index)
+        assert after["doc:beta"] == before["doc:beta"]
+        assert after["doc:alpha"] != before["doc:alpha"]
+        assert [text for _, text in after["doc:alpha"]] == ["governance voting thresholds"]
+        assert [p["source_id"] for p in index.search("thresholds")] == ["doc:alpha"]
+        assert index.search("quorum") == []
+
+    def test_deleted_document_is_removed(self, tmp_path):
+        index = SpecIndex(tmp_path / "index.sqlite3")
+        index.sync(tmp_path / "docs", [document("alpha", "governance quorum"), document("beta", "treasury budget")])
+
+        report = index.sync(tmp_path / "docs", [document("beta", "treasury budget")])
+
+        assert (report["indexed"], report["unchanged"], report["removed"]) == (0, 1, 1)
+        assert set(passages(index)) == {"doc:beta"}
+        assert set(index.document_versions()) == {"beta"}
+        assert index.search("quorum") == []
+
+    def test_same_content_new_revision_keeps_passages(self, tmp_path):
+        index = SpecIndex(tmp_path / "index.sqlite3")
+        index.sync(tmp_path / "docs", [document("alpha", "governance quorum")])
+        before = passages(index)
+
+        assert index.sync(tmp_path / "docs", [document("alpha", "governance quorum", revision=5)])["unchanged"] == 1
+
+        assert passages(index) == before
+        assert index.document_versions()["alpha"][1] == 5
+
+
+class TestRefreshSpecIndex:
+    """refresh_spec_index against the API's documents"""
+
+    @pytest.fixture
+    def index(self, server, tmp_path, monkeypatch):
+        index = SpecIndex(tmp_path / "index.sqlite3")
+        monkeypatch.setattr(server, "spec_index", index)
+        monkeypatch.setattr(server, "DOCS_PATH", tmp_path / "docs")
+        return index
+
+    async def test_edit_and_delete_through_the_api(self, api, server, index):
+        # Seeded documents are empty; give three of them passages
+        doc_ids = [doc["doc_id"] async for doc in server.db.documents.find({"is_active": True}).limit(3)]
+        for doc_id, topic in zip(doc_ids, ["quorum", "treasury", "ledger"]):
+            assert (await api.put(f"/api/documents/{doc_id}", json={"content": f"Section on {topic}"})).status_code == 200
+        await server.refresh_spec_index()
+        before = passages(index)
+        edited, deleted, untouched = (f"doc:{doc_id}" for doc_id in doc_ids)
+
+        await api.put(f"/api/documents/{doc_ids[0]}", json={"content": "Rewritten zeppelin section"})
+        assert (await api.delete(f"/api/documents/{doc_ids[1]}")).status_code == 200
+        report = await server.refresh_spec_index()
+
+        assert (report["indexed"], report["removed"]) == (1, 1)
+        after = passages(index)
+        assert after[untouched] == before[untouched]
+        assert [text for _, text in after[edited]] == ["Rewritten zeppelin section"]
+        assert deleted not in after and doc_ids[1] not in index.document_versions()
+        assert [p["source_id"] for p in index.search("zeppelin")] == [edited]
@@ -0,0 +1,119 @@
+"""
+Unit tests for content revisions and delta sync pages (revisions.py)
+"""
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from revisions import changes_since, next_revision, next_revisions, stamp_missing_revisions
+
+pytestmark = pytest.mark.anyio
+
+COLLECTIONS = {"glossary": "glossary_terms", "document": "documents"}
+OLD = "2026-01-01T00:00:00+00:00"
+SETTLED_BEFORE = "2026-01-02T00:00:00+00:00"
+RECENT = "2026-01-03T00:00:00+00:00"
+
+
+def fresh_db():
+    return AsyncMongoMockClient()["revisions_test"]
+
+
+async def catalog(db, recent=()):
+    """Glossary rows on odd revisions 1-9, documents on even revisions 2-10"""
+    for revision in range(1, 11):
+        collection = "glossary_terms" if revision % 2 else "documents"
+        await db[collection].insert_one({"id": revision, "revision": revision, "updated_at": RECENT if revision in recent else OLD})
+
+
+def revisions_of(page):
+    return sorted(row["revision"] for rows in page["changes"].values() for row in rows)
+
+
+class TestRevisions:
+    """The shared counter"""
+
+    async def test_reserves_consecutive_ranges(self):
+        db = fresh_db()
+        assert list(await next_revisions(db, 3)) == [1, 2, 3]
+        assert await next_revision(db) == 4
+        assert list(await next_revisions(db, 2)) == [5, 6]
+
+    async def test_stamps_only_unstamped_rows(self):
+        db = fresh_db()
+        await db.documents.insert_many([{"n": 1, "revision": 7}, {"n": 2}, {"n": 3}])
+        await db.glossary_terms.insert_one({"n": 4})
+        assert await stamp_missing_revisions(db, ["documents", "glossary_terms"], batch_size=1) == 3
+        rows = [row async for row in db.documents.find({}, {"_id": 0}).sort("n", 1)]
+        assert rows[0]["revision"] == 7
+        revisions = [row["revision"] for row in rows[1:]] + [(await db.glossary_terms.find_one())["revision"]]
+        assert sorted(revisions) == [1, 2, 3]
+        assert await stamp_missing_revisions(db, ["documents", "glossary_terms"]) == 0
+
+
+class TestChangesSince:
+    """Paging across collections by global revision"""
+
+    async def test_everything_since_zero(self):
+        db = fresh_db()
+        await catalog(db)
+        page = await changes_since(db, COLLECTIONS, 0, 100, SETTLED_BEFORE)
+        assert revisions_of(page) == list(range(1, 11))
+        assert page["revision"] == 10 and not page["has_more"]
+        assert [row["revision"] for row in page["changes"]["glossary"]] == [1, 3, 5, 7, 9]
+
+    async def test_pages_form_a_complete_prefix(self):
+        db = fresh_db()
+        await catalog(db)
+        seen, since = [], 0
+        while True:
+            page = await changes_since(db, COLLECTIONS, since, 3, SETTLED_BEFORE)
+            seen += revisions_of(page)
+            since = page["revision"]
+            if not page["has_more"]:
+                break
+        assert seen == list(range(1, 11))
+
+    async def test_limit_spans_collections(self):
+        db = fresh_db()
+        await catalog(db)
+        page = await changes_since(db, COLLECTIONS, 4, 3, SETTLED_BEFORE)
+        assert revisions_of(page) == [5, 6, 7]
+        assert page["revision"] == 7 and page["has_more"]
+
+    async def test_cursor_stops_before_unsettled_rows(self):
+        db = fresh_db()
+        await catalog(db, recent={6})
+        page = await changes_since(db, COLLECTIONS, 0, 100, SETTLED_BEFORE)
+        # Recent rows are returned, but the next call starts again from 5
+        assert revisions_of(page) == list(range(1, 11))
+        assert page["revision"] == 5
+        assert not page["has_more"]
+
+    async def test_unsettled_cursor_does_not_ask_for_more(self):
+        db = fresh_db()
+        await catalog(db, recent={2})
+        page = await changes_since(db, COLLECTIONS, 0, 3, SETTLED_BEFORE)
+        assert page["revision"] == 1 and not page["has_more"]
+
+    async def test_selected_types_only(self):
+        db = fresh_db()
+        await catalog(db)
+        page = await changes_since(db, {"document": "documents"}, 5, 100, SETTLED_BEFORE)
+        assert list(page["changes"]) == ["document"]
+        assert revisions_of(page) == [6, 8, 10]
+
+    async def test_nothing_new_keeps_cursor(self):
+        db = fresh_db()
+        await catalog(db)
+        page = await changes_since(db, COLLECTIONS, 10, 100, SETTLED_BEFORE)
+        assert page == {"revision": 10, "has_more": False, "changes": {"document": [], "glossary": []}}
+
+    async def test_deleted_rows_are_reduced_to_tombstones(self):
+        db = fresh_db()
+        await db.glossary_terms.insert_many([
+            {"term_id": "t1", "term": "kept", "is_active": True, "revision": 1, "updated_at": OLD},
+            {"term_id": "t2", "term": "gone", "definition": "secret", "is_active": False, "revision": 2, "updated_at": OLD},
+        ])
+        page = await changes_since(db, {"glossary": "glossary_terms"}, 0, 100, SETTLED_BEFORE, id_fields={"glossary": "term_id"})
+        assert page["changes"]["glossary"][0]["term"] == "kept"
+        assert page["changes"]["glossary"][1] == {"term_id": "t2", "is_active": False, "revision": 2}
@@ -0,0 +1,77 @@
+"""
+Unit tests for single-flight read coalescing (singleflight.py)
+"""
+import asyncio
+
+import pytest
+
+from singleflight import SingleFlight
+
+pytestmark = pytest.mark.anyio
+
+
+class TestSingleFlight:
+    """Concurrent callers of one key share a single run"""
+
+    async def test_concurrent_calls_share_one_run(self):
+        calls = []
+        seen = []
+        flights = SingleFlight(observe=lambda label, shared: seen.append((label, shared)))
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "result"
+
+        results = await asyncio.gather(*(flights.do("key", work, "docs") for _ in range(10)))
+        assert results == ["result"] * 10
+        assert len(calls) == 1
+        assert seen == [("docs", False)] + [("docs", True)] * 9
+
+    async def test_different_keys_run_separately(self):
+        async def work(value):
+            await asyncio.sleep(0.01)
+            return value
+
+        flights = SingleFlight()
+        assert await asyncio.gather(flights.do("a", lambda: work(1)), flights.do("b", lambda: work(2))) == [1, 2]
+
+    async def test_nothing_is_remembered_after_landing(self):
+        calls = []
+
+        async def work():
+            calls.append(1)
+            return len(calls)
+
+        flights = SingleFlight()
+        assert await flights.do("key", work) == 1
+        assert await flights.do("key", work) == 2
+        assert not flights._flights
+
+    async def test_exception_reaches_every_caller(self):
+        async def work():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        flights = SingleFlight()
+        results = await asyncio.gather(*(flights.do("key", work) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(result, ValueError) for result in results)
+        assert not flights._flights
+
+    async def test_cancelled_caller_does_not_cancel_others(self):
+        started = asyncio.Event()
+
+        async def work():
+            started.set()
+            await asyncio.sleep(0.02)
+            return "done"
+
+        flights = SingleFlight()
+        first = asyncio.create_task(flights.do("key", work))
+        await started.wait()
+        second = asyncio.create_task(flights.do("key", work))
+        await asyncio.sleep(0)
+        first.cancel()
+        assert await second == "done"
+        with pytest.raises(asyncio.CancelledError):
+            await first
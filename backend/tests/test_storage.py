@@ -0,0 +1,149 @@
+"""
+Unit tests for the upload storage backends (storage.py), with S3 mocked by moto
+"""
+import hashlib
+import os
+import time
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+import requests
+from moto import mock_aws
+from mongomock_motor import AsyncMongoMockClient
+
+from storage import BlobStorage, LocalShardedStorage, S3Storage, migrate_flat_uploads
+
+pytestmark = pytest.mark.anyio
+
+BUCKET = "gogarvis-test"
+
+
+@pytest.fixture
+def aws(monkeypatch):
+    for name, value in {
+        "AWS_ACCESS_KEY_ID": "testing", "AWS_SECRET_ACCESS_KEY": "testing", "AWS_DEFAULT_REGION": "us-east-1",
+    }.items():
+        monkeypatch.setenv(name, value)
+    with mock_aws():
+        yield
+
+
+@pytest.fixture(params=["local", "s3"])
+def storage(request, tmp_path):
+    if request.param == "local":
+        yield LocalShardedStorage(tmp_path / "uploads")
+        return
+    request.getfixturevalue("aws")
+    s3 = S3Storage(BUCKET, prefix="uploads", region="us-east-1")
+    s3.client.create_bucket(Bucket=BUCKET)
+    yield s3
+
+
+class TestBlobStorage:
+    """Behaviour every backend shares"""
+
+    def test_interface_is_abstract(self):
+        with pytest.raises(TypeError):
+            BlobStorage()
+
+    async def test_put_get_size(self, storage):
+        await storage.put("file-1", b"hello world")
+        assert await storage.get("file-1") == b"hello world"
+        assert await storage.size("file-1") == 11
+
+    async def test_put_replaces(self, storage):
+        await storage.put("file-1", b"old")
+        await storage.put("file-1", b"new contents")
+        assert await storage.get("file-1") == b"new contents"
+
+    async def test_missing_blob(self, storage):
+        with pytest.raises(FileNotFoundError):
+            await storage.get("missing")
+        assert await storage.size("missing") is None
+        assert await storage.delete("missing") is False
+
+    async def test_delete(self, storage):
+        await storage.put("file-1", b"data")
+        assert await storage.delete("file-1") is True
+        assert await storage.size("file-1") is None
+
+    async def test_list_keys_by_age(self, storage):
+        await storage.put("file-1", b"a")
+        await storage.put("file-2", b"b")
+        assert sorted(await storage.list_keys(time.time() + 60)) == ["file-1", "file-2"]
+        assert await storage.list_keys(time.time() - 3600) == []
+
+
+class TestLocalShardedStorage:
+    """Hash-prefix sharding on disk"""
+
+    async def test_sharded_path(self, tmp_path):
+        local = LocalShardedStorage(tmp_path)
+        await local.put("file-1", b"data")
+        digest = hashlib.sha256(b"file-1").hexdigest()
+        assert local.local_path("file-1") == tmp_path / digest[:2] / digest[2:4] / "file-1"
+        assert local.local_path("file-1").read_bytes() == b"data"
+        assert local.presigned_url("file-1", "a.txt", "text/plain") is None
+
+    async def test_list_keys_skips_temp_files(self, tmp_path):
+        local = LocalShardedStorage(tmp_path)
+        await local.put("file-1", b"data")
+        (local.local_path("file-1").parent / ".tmp-abc").write_bytes(b"partial")
+        assert await local.list_keys(time.time() + 60) == ["file-1"]
+
+
+class TestS3Storage:
+    """Keys under the prefix and presigned downloads"""
+
+    async def test_objects_live_under_prefix(self, aws):
+        s3 = S3Storage(BUCKET, prefix="/uploads/", region="us-east-1")
+        s3.client.create_bucket(Bucket=BUCKET)
+        s3.client.put_object(Bucket=BUCKET, Key="other/file-9", Body=b"x")
+        await s3.put("file-1", b"data")
+        assert s3.client.get_object(Bucket=BUCKET, Key="uploads/file-1")["Body"].read() == b"data"
+        assert await s3.list_keys(time.time() + 60) == ["file-1"]
+        assert s3.local_path("file-1") is None
+
+    async def test_presigned_url_serves_ranges(self, aws):
+        s3 = S3Storage(BUCKET, prefix="uploads", region="us-east-1")
+        s3.client.create_bucket(Bucket=BUCKET)
+        await s3.put("file-1", b"0123456789")
+        url = s3.presigned_url("file-1", "résumé.txt", "text/plain", expires_in=60)
+        params = parse_qs(urlparse(url).query)
+        assert params["response-content-type"] == ["text/plain"]
+        assert params["response-content-disposition"] == [
+            "inline; filename=\"r_sum_.txt\"; filename*=UTF-8''r%C3%A9sum%C3%A9.txt"
+        ]
+
+        full = requests.get(url)
+        assert full.status_code == 200 and full.content == b"0123456789"
+        partial = requests.get(url, headers={"Range": "bytes=2-5"})
+        assert partial.status_code == 206 and partial.content == b"2345"
+
+
+class TestMigrateFlatUploads:
+    """Moving the old {file_id}_{filename} layout into a backend"""
+
+    async def test_migrates_and_is_rerunnable(self, storage, tmp_path):
+        db = AsyncMongoMockClient()["storage_test"]
+        flat = tmp_path / "flat"
+        flat.mkdir()
+        (flat / "f1_a.txt").write_bytes(b"first")
+        (flat / "f2_b.txt").write_bytes(b"second!")
+        await db.chat_files.insert_many([
+            {"file_id": "f1", "path": str(flat / "f1_a.txt")},
+            {"file_id": "f2", "path": str(flat / "f2_b.txt")},
+            {"file_id": "f3", "path": str(flat / "f3_gone.txt")},
+            {"file_id": "f4", "storage_key": "f4"},
+        ])
+
+        report = await migrate_flat_uploads(db, storage, batch_size=1)
+        assert report == {"migrated": 2, "missing": 1, "bytes": 12}
+        assert await storage.get("f1") == b"first"
+        assert await storage.get("f2") == b"second!"
+        assert os.listdir(flat) == []
+        migrated = await db.chat_files.find_one({"file_id": "f1"}, {"_id": 0})
+        assert migrated == {"file_id": "f1", "storage_key": "f1"}
+        assert "storage_key" not in await db.chat_files.find_one({"file_id": "f3"})
+
+        assert await migrate_flat_uploads(db, storage) == {"migrated": 0, "missing": 1, "bytes": 0}
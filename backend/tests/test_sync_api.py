@@ -0,0 +1,63 @@
+"""
+API tests for version rollback and delta sync (GET /api/sync), on mongomock
+"""
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+CREATE = {
+    "glossary": ("/api/glossary", {"term": "Spec Lock", "definition": "original", "category": "core"}, "term_id", {"definition": "edited"}),
+    "pigpen": ("/api/pigpen", {"tai_d": "TAI-D-TEST", "name": "Tester", "capabilities": "original", "role": "r", "authority": "a", "category": "c"}, "operator_id", {"capabilities": "edited"}),
+}
+
+
+async def latest_revision(server):
+    # The sync cursor holds back just-written rows, so read the counter itself
+    return (await server.db.counters.find_one({"_id": "content_revision"}))["value"]
+
+
+async def synced_rows(api, content_type, since):
+    page = (await api.get("/api/sync", params={"since": since, "types": content_type})).json()
+    return page["changes"][content_type]
+
+
+@pytest.mark.parametrize("content_type", ["glossary", "pigpen"])
+async def test_rollback_reaches_sync(api, server, content_type):
+    path, body, id_field, edit = CREATE[content_type]
+    content_id = (await api.post(path, json=body)).json()[id_field]
+    assert (await api.put(f"{path}/{content_id}", json=edit)).status_code == 200
+    versions = (await api.get(f"/api/versions/{content_type}/{content_id}")).json()["versions"]
+    created = next(v for v in versions if v["change_type"] == "create")
+    before = await latest_revision(server)
+
+    response = await api.post(f"/api/versions/{content_type}/{content_id}/rollback/{created['version_id']}")
+
+    assert response.status_code == 200
+    rows = await synced_rows(api, content_type, before)
+    assert [row[id_field] for row in rows] == [content_id]
+    field = next(iter(edit))
+    assert rows[0][field] == "original"
+    assert rows[0]["revision"] > before
+
+
+async def test_rollback_of_missing_content_is_404(api, server):
+    content_id = (await api.post("/api/glossary", json=CREATE["glossary"][1])).json()["term_id"]
+    version = (await api.get(f"/api/versions/glossary/{content_id}")).json()["versions"][0]
+    await server.db.glossary_terms.delete_one({"term_id": content_id})
+    before = await latest_revision(server)
+
+    response = await api.post(f"/api/versions/glossary/{content_id}/rollback/{version['version_id']}")
+
+    assert response.status_code == 404
+    assert await latest_revision(server) == before
+
+
+async def test_deleted_rows_sync_as_tombstones(api, server):
+    path, body, id_field, _ = CREATE["glossary"]
+    content_id = (await api.post(path, json=body)).json()[id_field]
+    before = await latest_revision(server)
+    await api.delete(f"{path}/{content_id}")
+
+    rows = await synced_rows(api, "glossary", before)
+
+    assert rows == [{"term_id": content_id, "is_active": False, "revision": rows[0]["revision"]}]
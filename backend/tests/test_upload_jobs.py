@@ -0,0 +1,103 @@
+"""
+Unit tests for async upload job ownership and recovery (upload_jobs.py)
+"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+import upload_jobs
+from leases import HOLDER
+
+pytestmark = pytest.mark.anyio
+
+OLD = (datetime.now(timezone.utc) - timedelta(hours=1)).isoformat()
+NEW = datetime.now(timezone.utc).isoformat()
+
+
+@pytest.fixture
+def db():
+    return AsyncMongoMockClient()["upload_jobs_test"]
+
+
+async def add_job(db, job_id, worker=HOLDER, status="queued", updated_at=OLD, attempts=0):
+    job = {"job_id": job_id, "file_id": f"f-{job_id}", "filename": "a.txt", "status": status, "attempts": attempts, "updated_at": updated_at}
+    if worker is not None:
+        job["worker"] = worker
+    await db.upload_jobs.insert_one(job)
+
+
+async def live_worker(db, holder):
+    await db.leases.insert_one({"_id": upload_jobs.worker_lease(holder), "holder": holder, "expires_at": datetime.now(timezone.utc) + timedelta(minutes=1)})
+
+
+async def job(db, job_id):
+    return await db.upload_jobs.find_one({"job_id": job_id}, {"_id": 0})
+
+
+class TestRunningJobs:
+    """Only the owning worker starts and updates a job"""
+
+    async def test_start_job_once(self, db):
+        await add_job(db, "j1")
+        started = await upload_jobs.start_job(db, "j1")
+        assert started["file_id"] == "f-j1"
+        assert await upload_jobs.start_job(db, "j1") is None
+        assert (await job(db, "j1"))["status"] == "processing"
+        assert (await job(db, "j1"))["attempts"] == 1
+
+    async def test_other_workers_jobs_are_not_started(self, db):
+        await add_job(db, "j1", worker="other:1:x")
+        assert await upload_jobs.start_job(db, "j1") is None
+
+    async def test_updates_stop_after_a_takeover(self, db):
+        await add_job(db, "j1", status="processing")
+        await upload_jobs.update_job(db, "j1", pages_processed=2)
+        await db.upload_jobs.update_one({"job_id": "j1"}, {"$set": {"worker": "other:1:x"}})
+        await upload_jobs.update_job(db, "j1", status="failed")
+        assert (await job(db, "j1"))["status"] == "processing"
+        assert (await job(db, "j1"))["pages_processed"] == 2
+
+    async def test_heartbeat_holds_the_worker_lease(self, db):
+        assert await upload_jobs.heartbeat(db, 60)
+        assert (await db.leases.find_one({"_id": upload_jobs.worker_lease()}))["holder"] == HOLDER
+
+
+class TestClaimAbandonedJobs:
+    """Requeueing jobs of workers that stopped renewing their lease"""
+
+    async def test_requeues_jobs_of_dead_and_unknown_workers(self, db):
+        await add_job(db, "dead", worker="dead:1:x", status="processing", attempts=1)
+        await add_job(db, "legacy", worker=None)
+        claimed = await upload_jobs.claim_abandoned_jobs(db, 10, 90, 3)
+        assert sorted(claimed) == ["dead", "legacy"]
+        requeued = await job(db, "dead")
+        assert requeued["worker"] == HOLDER and requeued["status"] == "queued"
+        assert await upload_jobs.start_job(db, "dead") is not None
+
+    async def test_leaves_live_fresh_own_and_finished_jobs(self, db):
+        await live_worker(db, "alive:1:x")
+        await add_job(db, "alive", worker="alive:1:x")
+        await add_job(db, "fresh", worker="dead:1:x", updated_at=NEW)
+        await add_job(db, "mine")
+        await add_job(db, "done", worker="dead:1:x", status="completed")
+        assert await upload_jobs.claim_abandoned_jobs(db, 10, 90, 3) == []
+
+    async def test_expired_lease_counts_as_dead(self, db):
+        await db.leases.insert_one({"_id": upload_jobs.worker_lease("dead:1:x"), "holder": "dead:1:x", "expires_at": datetime.now(timezone.utc) - timedelta(minutes=1)})
+        await add_job(db, "j1", worker="dead:1:x")
+        assert await upload_jobs.claim_abandoned_jobs(db, 10, 90, 3) == ["j1"]
+
+    async def test_claims_at_most_limit_oldest_first(self, db):
+        for n in range(3):
+            await add_job(db, f"j{n}", worker="dead:1:x", updated_at=(datetime.now(timezone.utc) - timedelta(hours=3 - n)).isoformat())
+        assert await upload_jobs.claim_abandoned_jobs(db, 2, 90, 3) == ["j0", "j1"]
+        assert await upload_jobs.claim_abandoned_jobs(db, 0, 90, 3) == []
+        assert (await job(db, "j2"))["worker"] == "dead:1:x"
+
+    async def test_jobs_out_of_attempts_fail(self, db):
+        await add_job(db, "j1", worker="dead:1:x", status="processing", attempts=3)
+        assert await upload_jobs.claim_abandoned_jobs(db, 10, 90, 3) == []
+        failed = await job(db, "j1")
+        assert failed["status"] == "failed"
+        assert failed["error"] == "Upload processing was interrupted"
@@ -0,0 +1,54 @@
+"""
+API tests for async upload jobs, including takeover from a worker that died
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+OLD = (datetime.now(timezone.utc) - timedelta(hours=1)).isoformat()
+
+
+async def finished(api, job_id):
+    for _ in range(100):
+        job = (await api.get(f"/api/chat/upload/jobs/{job_id}")).json()
+        if job["status"] in ("completed", "failed"):
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"upload job {job_id} did not finish")
+
+
+async def test_async_upload_completes(api, server):
+    response = await api.post("/api/chat/upload", params={"mode": "async"}, files={"files": ("notes.txt", b"async notes")})
+    assert response.status_code == 202
+    job = await finished(api, response.json()["jobs"][0]["job_id"])
+    assert job["status"] == "completed"
+    assert job["result"]["extracted_text"] == "async notes"
+    assert "worker" not in job
+
+
+async def test_takeover_of_a_half_finished_job(api, server):
+    # The first worker stored the row, then died before marking the job completed
+    await server.storage.put("f-half", b"recovered notes")
+    await server.db.chat_files.insert_one({"file_id": "f-half", "filename": "r.txt", "storage_key": "f-half", "extracted_text": "recovered notes"})
+    await server.db.upload_jobs.insert_one({
+        "job_id": "half", "file_id": "f-half", "filename": "r.txt", "status": "processing",
+        "worker": "dead:1:x", "attempts": 1, "created_at": OLD, "updated_at": OLD,
+    })
+
+    await server.maintain_upload_jobs()
+    job = await finished(api, "half")
+
+    assert job["status"] == "completed"
+    assert job["attempts"] == 2
+    assert await server.db.chat_files.count_documents({"file_id": "f-half"}) == 1
+
+
+async def test_full_queue_refuses_async_uploads(api, server, monkeypatch):
+    monkeypatch.setattr(server, "UPLOAD_QUEUE_LIMIT", 1)
+    files = [("files", ("a.txt", b"a")), ("files", ("b.txt", b"b"))]
+    response = await api.post("/api/chat/upload", params={"mode": "async"}, files=files)
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == str(server.UPLOAD_JOB_HEARTBEAT_SECONDS)
@@ -0,0 +1,86 @@
+"""Durable state for async upload jobs.
+
+An async upload stages its bytes in blob storage under its file_id and records
+a job in `upload_jobs`; the worker reads the blob back once a processing slot
+is free, so queued jobs hold no file content in memory. Each job names the
+worker that queued it, and every worker renews an `upload-worker:<holder>`
+lease while it is alive. Jobs left queued or processing by a worker whose lease
+has expired are claimed by another worker and run again, up to a maximum
+number of attempts; after that they are marked failed.
+"""
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+from leases import HOLDER, acquire_lease
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATES = ("queued", "processing")
+TERMINAL_STATES = ("completed", "failed")
+# What status polls may see of a job
+PUBLIC_PROJECTION = {"_id": 0, "worker": 0}
+
+
+def worker_lease(holder: str = HOLDER) -> str:
+    return f"upload-worker:{holder}"
+
+
+async def heartbeat(db, ttl_seconds: float) -> bool:
+    """Renew this worker's lease so other workers leave its jobs alone"""
+    return await acquire_lease(db, worker_lease(), ttl_seconds)
+
+
+async def live_worker_count(db) -> int:
+    """API workers currently renewing their lease (every worker holds one)"""
+    return await db.leases.count_documents({"_id": {"$regex": "^upload-worker:"}, "expires_at": {"$gt": datetime.now(timezone.utc)}})
+
+
+async def update_job(db, job_id: str, **fields):
+    """Write job fields, unless another worker has taken the job over"""
+    fields["updated_at"] = datetime.now(timezone.utc).isoformat()
+    await db.upload_jobs.update_one({"job_id": job_id, "worker": HOLDER}, {"$set": fields})
+
+
+async def start_job(db, job_id: str) -> Optional[dict]:
+    """Move a queued job this worker owns to processing; None if it is not ours to run"""
+    return await db.upload_jobs.find_one_and_update(
+        {"job_id": job_id, "worker": HOLDER, "status": "queued"},
+        {"$set": {"status": "processing", "updated_at": datetime.now(timezone.utc).isoformat()}, "$inc": {"attempts": 1}},
+        projection={"_id": 0},
+    )
+
+
+async def claim_abandoned_jobs(db, limit: int, stale_after_seconds: float, max_attempts: int) -> List[str]:
+    """Requeue up to limit jobs whose worker stopped renewing its lease and
+    return their IDs; jobs out of attempts are marked failed instead"""
+    now = datetime.now(timezone.utc)
+    # A job written just before its worker's first heartbeat is not abandoned
+    stale = {
+        "status": {"$in": list(ACTIVE_STATES)},
+        "updated_at": {"$lt": (now - timedelta(seconds=stale_after_seconds)).isoformat()},
+    }
+    workers = [w for w in await db.upload_jobs.distinct("worker", stale) if w != HOLDER]
+    live = set(await db.leases.distinct("_id", {"_id": {"$in": [worker_lease(w) for w in workers]}, "expires_at": {"$gt": now}}))
+    # Jobs queued before workers were recorded have no worker at all
+    orphaned = {**stale, "worker": {"$in": [w for w in workers if worker_lease(w) not in live] + [None]}}
+
+    exhausted = await db.upload_jobs.update_many(
+        {**orphaned, "attempts": {"$gte": max_attempts}},
+        {"$set": {"status": "failed", "error": "Upload processing was interrupted", "updated_at": now.isoformat()}},
+    )
+    if exhausted.modified_count:
+        logger.warning(f"Gave up on {exhausted.modified_count} upload jobs interrupted {max_attempts} times")
+
+    claimed = []
+    while len(claimed) < limit:
+        job = await db.upload_jobs.find_one_and_update(
+            orphaned,
+            {"$set": {"worker": HOLDER, "status": "queued", "pages_processed": 0, "total_pages": None, "updated_at": now.isoformat()}},
+            projection={"_id": 0, "job_id": 1},
+            sort=[("updated_at", 1)],
+        )
+        if job is None:
+            break
+        claimed.append(job["job_id"])
+    return claimed